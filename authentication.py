@@ -1,16 +1,96 @@
+import asyncio
 import datetime
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
+
 import jwt
+from beanie import PydanticObjectId
 from fastapi import HTTPException, Security
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from passlib.context import CryptContext
 
 from config import settings
+from models.user import CurrentUser, User
+
+
+class IdentityCache:
+    """
+    Bounded LRU of verified tokens and the user each one belongs to.
+    An entry lives until the token's `exp`, capped at `ttl` seconds so that
+    changes made through another worker are picked up as well.
+    """
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+
+    def get(self, token: str) -> Optional[CurrentUser]:
+        entry = self._entries.get(token)
+        if entry is None:
+            return None
+        if entry[0] <= time.time():
+            del self._entries[token]
+            return None
+        self._entries.move_to_end(token)
+        return entry[1]
+
+    def set(self, token: str, user: CurrentUser, expires_at: float):
+        self._entries[token] = (min(expires_at, time.time() + self.ttl), user)
+        self._entries.move_to_end(token)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last = False)
+
+    def invalidate_user(self, user_id: PydanticObjectId):
+        for token in [token for token, (_, user) in self._entries.items() if user.id == user_id]:
+            del self._entries[token]
+
 
 class AuthHandler:
     security = HTTPBearer()
-    pwd_context = CryptContext(schemes = ["bcrypt"], deprecated = "auto")
+    # Hashes made with a different number of rounds are flagged for rehashing
+    pwd_context = CryptContext(schemes = ["bcrypt"], deprecated = "auto", bcrypt__rounds = settings.BCRYPT_ROUNDS)
+    hash_executor = ThreadPoolExecutor(max_workers = settings.AUTH_HASH_WORKERS, thread_name_prefix = "password-hash")
+    hash_capacity = settings.AUTH_HASH_WORKERS + settings.AUTH_HASH_QUEUE_SIZE
     secret = settings.SECRET_KEY
-    print(f"DEBUG: AuthHandler Secret Key loaded: '{secret}' (Length: {len(secret)})")
+
+    def __init__(self):
+        self.pending_hashes = 0
+        self.identities = IdentityCache(settings.AUTH_CACHE_SIZE, settings.AUTH_CACHE_TTL)
+
+    async def _run_hashing(self, func, *args):
+        """
+        Run a bcrypt call on the hashing pool. bcrypt releases the GIL, so
+        the event loop keeps serving other requests meanwhile. When the pool
+        and its queue are full the request is refused instead of piling up.
+        """
+        if self.pending_hashes >= self.hash_capacity:
+            raise HTTPException(
+                status_code = 503,
+                detail = "Too many authentication requests, please retry shortly",
+                headers = {"Retry-After": "1"}
+            )
+        self.pending_hashes += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.hash_executor, func, *args)
+        finally:
+            self.pending_hashes -= 1
+
+    async def hash_password(self, password: str) -> str:
+        return await self._run_hashing(self.get_password_hash, password)
+
+    async def verify_and_update_password(
+        self,
+        plain_password: str,
+        hashed_password: str
+    ) -> Tuple[bool, Optional[str]]:
+        """
+        Verify a password and, when its hash was made with outdated settings
+        (e.g. a different BCRYPT_ROUNDS), also return a fresh hash to store.
+        """
+        return await self._run_hashing(self.pwd_context.verify_and_update, plain_password, hashed_password)
 
     def get_password_hash(self, password: str) -> str:
         return self.pwd_context.hash(password)
@@ -32,19 +112,18 @@ class AuthHandler:
             "iat": datetime.datetime.now(datetime.timezone.utc),
             "sub": {"user_id": user_id, "username": username},
         }
-
-        print(f"DEBUG: Encoding with secret (length {len(self.secret)}): '{self.secret[:5]}...{self.secret[-5:]}'")
         return jwt.encode(payload, self.secret, algorithm="HS256")
 
     def decode_token(self, token: str):
+        return self.decode_payload(token)["sub"]
+
+    def decode_payload(self, token: str) -> dict:
         try:
-            print(f"DEBUG: Decoding with secret (length {len(self.secret)}): '{self.secret[:5]}...{self.secret[-5:]}'")
-            payload = jwt.decode(
+            return jwt.decode(
                 token,
                 self.secret,
                 algorithms=["HS256"]
             )
-            return payload["sub"]
         except jwt.ExpiredSignatureError:
             raise HTTPException(
                 status_code=401,
@@ -62,4 +141,41 @@ class AuthHandler:
     ) -> dict:
         return self.decode_token(auth.credentials)
 
+    async def current_user(
+        self,
+        auth: HTTPAuthorizationCredentials = Security(security)
+    ) -> CurrentUser:
+        """
+        Dependency returning the authenticated user. Verified tokens are cached,
+        so a repeat request skips the JWT check and the user lookup.
+        """
+        token = auth.credentials
+        if (user := self.identities.get(token)) is not None:
+            return user
+
+        payload = self.decode_payload(token)
+        try:
+            user_id = PydanticObjectId(payload["sub"]["user_id"])
+        except (KeyError, TypeError, ValueError):
+            raise HTTPException(status_code=401, detail="Invalid token")
+
+        record = await User.get(user_id)
+        if record is None:
+            raise HTTPException(status_code=401, detail="User no longer exists")
+        # Tokens issued before the last password change are revoked
+        if record.password_changed_at and payload.get("iat", 0) < int(
+                record.password_changed_at.replace(tzinfo=datetime.timezone.utc).timestamp()):
+            raise HTTPException(status_code=401, detail="Token has been revoked")
+
+        user = CurrentUser(id=record.id, username=record.username)
+        self.identities.set(token, user, payload["exp"])
+        return user
+
+    def password_changed(self, user_id: PydanticObjectId):
+        """
+        Call after a user's password (and password_changed_at) is updated so
+        cached tokens of that user are checked against the database again.
+        """
+        self.identities.invalidate_user(user_id)
+
 auth_handler = AuthHandler()
\ No newline at end of file
@@ -0,0 +1,121 @@
+"""
+Dashboard benchmark: GET /analytics/dashboard against the calls the
+dashboard used to make for one page load.
+
+  separate  rollups.violation_counts, geo_distribution and timeline, plus a
+            count of open cases per status and per priority through
+            case_list_filter, all issued concurrently as the browser did
+  combined  services.dashboard.dashboard: one $facet over the rollups and
+            one $group over the cases
+
+The analytics cache is bypassed. For each approach the best wall time over
+`--rounds` is printed, with the commands sent and the index keys and
+documents MongoDB examined (from serverStatus, so run it on an otherwise
+idle mongod, typically filled by scripts.seed).
+
+    python -m scripts.seed --cases 1000000 --reports 2000000
+    python -m benchmarks.dashboard --rounds 10 --country Syria
+"""
+import argparse
+import asyncio
+import time
+from datetime import date
+
+from pymongo import monitoring
+
+from config import BaseConfig
+from database import init_db
+from models.case import Case
+from services import rollups
+from services.dashboard import dashboard
+from services.queries import case_list_filter
+
+STATUSES = ["new", "under_investigation", "resolved"]
+PRIORITIES = ["low", "medium", "high"]
+
+
+class CommandCounter(monitoring.CommandListener):
+    def __init__(self):
+        self.commands = 0
+
+    def started(self, event):
+        if event.command_name in ("aggregate", "count", "find", "getMore"):
+            self.commands += 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+async def separate(args):
+    counts = [
+        Case.get_motor_collection().count_documents(case_list_filter(
+            start_date = args.start_date, country = args.country, region = args.region, **{field: value}
+        ))
+        for field, values in (("status", STATUSES), ("priority", PRIORITIES)) for value in values
+    ]
+    await asyncio.gather(
+        rollups.violation_counts(),
+        rollups.geo_distribution(args.country, args.region),
+        rollups.timeline(args.granularity, args.start_date),
+        *counts,
+    )
+
+
+async def combined(args):
+    await dashboard(args.granularity, args.start_date, None, args.country, args.region)
+
+
+async def examined(client) -> tuple:
+    status = await client.admin.command("serverStatus")
+    executor = status["metrics"]["queryExecutor"]
+    return executor["scanned"], executor["scannedObjects"]
+
+
+async def measure(client, counter: CommandCounter, rounds: int, run) -> dict:
+    timings = []
+    keys_before, documents_before = await examined(client)
+    commands_before = counter.commands
+    for _ in range(rounds):
+        started = time.perf_counter()
+        await run()
+        timings.append(time.perf_counter() - started)
+    keys_after, documents_after = await examined(client)
+    return {
+        "ms": min(timings) * 1000,
+        "commands": (counter.commands - commands_before) / rounds,
+        "keys": (keys_after - keys_before) / rounds,
+        "documents": (documents_after - documents_before) / rounds,
+    }
+
+
+async def main(args):
+    counter = CommandCounter()
+    client, _ = await init_db(BaseConfig(), wait_for_indexes = True, event_listeners = [counter])
+    try:
+        # Warm the caches and plan cache of both approaches first
+        await separate(args)
+        await combined(args)
+        results = {
+            "separate": await measure(client, counter, args.rounds, lambda: separate(args)),
+            "combined": await measure(client, counter, args.rounds, lambda: combined(args)),
+        }
+    finally:
+        client.close()
+
+    print(f"{'':<10}{'best ms':>10}{'commands':>10}{'keys':>12}{'documents':>12}")
+    for name, result in results.items():
+        print(f"{name:<10}{result['ms']:>10.1f}{result['commands']:>10.0f}{result['keys']:>12.0f}{result['documents']:>12.0f}")
+    print(f"combined is {results['separate']['ms'] / results['combined']['ms']:.1f}x faster")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Compare the combined dashboard aggregation with separate calls")
+    parser.add_argument("--rounds", type = int, default = 10)
+    parser.add_argument("--granularity", choices = ["year", "month", "day"], default = "month")
+    parser.add_argument("--start-date", type = date.fromisoformat, default = None)
+    parser.add_argument("--country", default = None)
+    parser.add_argument("--region", default = None)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,251 @@
+"""
+End-to-end load benchmark against a running API, typically on a local
+mongod filled by scripts.seed.
+
+Every scenario below is sent `--requests` times by `--concurrency` workers.
+Latency percentiles and throughput are printed per endpoint and can be
+saved as a JSON baseline; a later run given --compare diffs against it and
+exits with status 1 when an endpoint's p95 regressed beyond --tolerance.
+
+    python -m scripts.seed --cases 1000000 --reports 2000000 --victims 500000
+    uvicorn main:app --workers 4
+    python -m benchmarks.load --concurrency 32 --requests 2000 --output baseline.json
+    python -m benchmarks.load --concurrency 32 --requests 2000 --compare baseline.json
+
+Write scenarios (PATCH on cases and victims) only run with --writes and need
+a user, created on first use from --username/--password.
+"""
+import argparse
+import asyncio
+import json
+import platform
+import random
+import statistics
+import sys
+import time
+from datetime import date, datetime, timedelta
+from typing import Callable, Dict, List, Optional
+
+import httpx
+
+
+SEARCH_WORDS = ["detained", "checkpoint", "journalist", "shelling", "abducted", "tortured", "market", "school", "missing"]
+
+
+def percentile(samples, q):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class Scenario:
+    def __init__(self, name: str, method: str, url: Callable[[], str],
+                 body: Optional[Callable[[], dict]] = None, writes: bool = False):
+        self.name = name
+        self.method = method
+        self.url = url
+        self.body = body
+        self.writes = writes
+
+
+class Sample:
+    """Ids and filter values taken from the data set, used to build requests."""
+
+    def __init__(self, cases: List[dict], individual_ids: List[str], report_ids: List[str]):
+        self.case_ids = [case["_id"] for case in cases]
+        self.case_numbers = [case["case_id"] for case in cases]
+        self.countries = [case["location"]["country"] for case in cases]
+        self.points = [case["location"]["coordinates"]["coordinates"] for case in cases]
+        self.individual_ids = individual_ids or ["missing"]
+        self.report_ids = report_ids or ["missing"]
+
+    def case_id(self) -> str:
+        return random.choice(self.case_ids)
+
+    def case_number(self) -> str:
+        return random.choice(self.case_numbers)
+
+    def country(self) -> str:
+        return random.choice(self.countries)
+
+    def point(self) -> List[float]:
+        return random.choice(self.points)
+
+    def individual_id(self) -> str:
+        return random.choice(self.individual_ids)
+
+    def report_id(self) -> str:
+        return random.choice(self.report_ids)
+
+
+def scenarios(sample: Sample) -> List[Scenario]:
+    today = date.today()
+    month_ago = today - timedelta(days = 30)
+    return [
+        Scenario("cases.list", "GET", lambda: "/cases/?limit=50"),
+        Scenario("cases.list_filtered", "GET",
+                 lambda: f"/cases/?country={sample.country()}&status=under_investigation&limit=50"),
+        Scenario("cases.near", "GET",
+                 lambda: "/cases/?near_lng={}&near_lat={}&radius_km=25&limit=50".format(*sample.point())),
+        Scenario("cases.get", "GET", lambda: f"/cases/{sample.case_number()}"),
+        Scenario("cases.history", "GET", lambda: f"/cases/{sample.case_id()}/history"),
+        Scenario("reports.list", "GET",
+                 lambda: f"/reports/?country={sample.country()}&status=new&start_date={month_ago}&end_date={today}"),
+        Scenario("reports.violations", "GET", lambda: "/reports/analytics/violations"),
+        Scenario("reports.similar", "GET", lambda: f"/reports/{sample.report_id()}/similar"),
+        Scenario("victims.get", "GET", lambda: f"/victims/{sample.individual_id()}"),
+        Scenario("victims.by_case", "GET", lambda: f"/victims/case/{sample.case_id()}"),
+        Scenario("analytics.violations", "GET", lambda: "/analytics/violations"),
+        Scenario("analytics.geodata", "GET", lambda: f"/analytics/geodata?country={sample.country()}"),
+        Scenario("analytics.timeline", "GET", lambda: "/analytics/timeline?granularity=month"),
+        Scenario("analytics.dashboard", "GET", lambda: f"/analytics/dashboard?country={sample.country()}"),
+        Scenario("search.words", "GET", lambda: f"/search/?q={random.choice(SEARCH_WORDS)}+{random.choice(SEARCH_WORDS)}"),
+        Scenario("search.filtered", "GET",
+                 lambda: f"/search/?q={random.choice(SEARCH_WORDS)}&country={sample.country()}&status=new"),
+        Scenario("cases.update", "PATCH", lambda: f"/cases/{sample.case_id()}",
+                 body = lambda: {"priority": random.choice(["low", "medium", "high"])}, writes = True),
+        Scenario("victims.update_risk", "PATCH", lambda: f"/victims/{sample.individual_id()}/risk",
+                 body = lambda: {"level": random.choice(["low", "medium", "high"])}, writes = True),
+    ]
+
+
+async def load_sample(client: httpx.AsyncClient, size: int) -> Sample:
+    response = await client.get(f"/cases/?limit={size}")
+    response.raise_for_status()
+    cases = response.json()
+    if not cases:
+        raise SystemExit("No cases found; seed the database first (python -m scripts.seed)")
+
+    individual_ids = []
+    for case in random.sample(cases, min(20, len(cases))):
+        victims = await client.get(f"/victims/case/{case['_id']}")
+        if victims.status_code == 200:
+            individual_ids.extend(victim["individual_id"] for victim in victims.json())
+
+    week_ago = date.today() - timedelta(days = 7)
+    reports = await client.get(f"/reports/?start_date={week_ago}&fields=report_id")
+    report_ids = [report["report_id"] for report in reports.json()[:size]] if reports.status_code == 200 else []
+    return Sample(cases, individual_ids, report_ids)
+
+
+async def authenticate(client: httpx.AsyncClient, username: str, password: str):
+    credentials = {"username": username, "password": password}
+    response = await client.post("/users/login", json = credentials)
+    if response.status_code == 401:
+        await client.post("/users/register", json = credentials)
+        response = await client.post("/users/login", json = credentials)
+    response.raise_for_status()
+    client.headers["Authorization"] = f"Bearer {response.json()['token']}"
+
+
+async def run_scenario(client: httpx.AsyncClient, scenario: Scenario, requests: int, concurrency: int) -> dict:
+    latencies = []
+    errors = 0
+    remaining = requests
+
+    async def worker():
+        nonlocal remaining, errors
+        while remaining > 0:
+            remaining -= 1
+            started = time.perf_counter()
+            try:
+                response = await client.request(
+                    scenario.method, scenario.url(), json = scenario.body() if scenario.body else None
+                )
+                failed = response.status_code >= 400
+            except httpx.HTTPError:
+                failed = True
+            latencies.append((time.perf_counter() - started) * 1000)
+            errors += failed
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(statistics.median(latencies), 2),
+        "p95_ms": round(percentile(latencies, 0.95), 2),
+        "p99_ms": round(percentile(latencies, 0.99), 2),
+    }
+
+
+def compare(baseline: dict, results: Dict[str, dict], tolerance: float) -> List[str]:
+    regressions = []
+    print(f"\n{'endpoint':<24}{'p95 base':>10}{'p95 now':>10}{'change':>9}{'rps base':>10}{'rps now':>10}")
+    for name, current in results.items():
+        previous = baseline.get("endpoints", {}).get(name)
+        if previous is None:
+            print(f"{name:<24}{'-':>10}{current['p95_ms']:>10}{'new':>9}")
+            continue
+        change = current["p95_ms"] / previous["p95_ms"] - 1 if previous["p95_ms"] else 0.0
+        flag = ""
+        if change > tolerance:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(f"{name:<24}{previous['p95_ms']:>10}{current['p95_ms']:>10}{change:>+9.1%}"
+              f"{previous['throughput_rps']:>10}{current['throughput_rps']:>10}{flag}")
+    return regressions
+
+
+async def main(args):
+    async with httpx.AsyncClient(base_url = args.base_url, timeout = args.timeout,
+                                 limits = httpx.Limits(max_connections = args.concurrency)) as client:
+        sample = await load_sample(client, args.sample_size)
+        if args.writes:
+            await authenticate(client, args.username, args.password)
+
+        results = {}
+        for scenario in scenarios(sample):
+            if scenario.writes and not args.writes:
+                continue
+            if args.only and not any(scenario.name.startswith(prefix) for prefix in args.only):
+                continue
+            await run_scenario(client, scenario, args.warmup, args.concurrency)
+            results[scenario.name] = await run_scenario(client, scenario, args.requests, args.concurrency)
+            result = results[scenario.name]
+            print(f"{scenario.name:<24} p50 {result['p50_ms']:>8} ms  p95 {result['p95_ms']:>8} ms  "
+                  f"p99 {result['p99_ms']:>8} ms  {result['throughput_rps']:>8} req/s  errors {result['errors']}")
+
+    report = {
+        "meta": {
+            "base_url": args.base_url,
+            "concurrency": args.concurrency,
+            "requests": args.requests,
+            "writes": args.writes,
+            "python": platform.python_version(),
+            "host": platform.node(),
+            "recorded_at": datetime.utcnow().isoformat(timespec = "seconds"),
+        },
+        "endpoints": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent = 2)
+        print(f"Baseline written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(json.load(f), results, args.tolerance)
+        if regressions:
+            print(f"p95 regressed by more than {args.tolerance:.0%}: {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Load test every router and report latency percentiles")
+    parser.add_argument("--base-url", default = "http://127.0.0.1:8000")
+    parser.add_argument("--concurrency", type = int, default = 16)
+    parser.add_argument("--requests", type = int, default = 1000, help = "Requests per endpoint")
+    parser.add_argument("--warmup", type = int, default = 50, help = "Unmeasured requests per endpoint")
+    parser.add_argument("--timeout", type = float, default = 30)
+    parser.add_argument("--sample-size", type = int, default = 500, help = "Cases sampled for ids and filters")
+    parser.add_argument("--only", nargs = "*", help = "Scenario name prefixes to run, e.g. cases analytics")
+    parser.add_argument("--writes", action = "store_true", help = "Also run the PATCH scenarios")
+    parser.add_argument("--username", default = "loadtest")
+    parser.add_argument("--password", default = "loadtest-password")
+    parser.add_argument("--output", help = "Write the results to this JSON baseline file")
+    parser.add_argument("--compare", help = "Baseline file to diff the results against")
+    parser.add_argument("--tolerance", type = float, default = 0.2, help = "Allowed relative p95 increase")
+    asyncio.run(main(parser.parse_args()))
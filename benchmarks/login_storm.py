@@ -0,0 +1,80 @@
+"""
+Login storm benchmark for password hashing.
+
+Runs a burst of concurrent password verifications the way login_user does,
+once with bcrypt called inline on the event loop (the old behaviour) and
+once through AuthHandler's hashing pool, while a probe coroutine stands in
+for the non-auth endpoints and records how late the event loop serves it.
+
+    python -m benchmarks.login_storm --logins 200 --concurrency 50
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from fastapi import HTTPException
+
+from authentication import auth_handler
+
+
+def percentile(samples, q):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+async def probe(stop: asyncio.Event, delays: list, interval: float = 0.005):
+    """A cheap request every few ms; its extra delay is event loop stall."""
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        delays.append((time.perf_counter() - started - interval) * 1000)
+
+
+async def storm(mode: str, password: str, hashed: str, logins: int, concurrency: int) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    rejected = 0
+
+    async def login():
+        nonlocal rejected
+        async with semaphore:
+            if mode == "inline":
+                auth_handler.verify_password(password, hashed)
+                await asyncio.sleep(0)
+            else:
+                try:
+                    await auth_handler.verify_and_update_password(password, hashed)
+                except HTTPException:
+                    rejected += 1
+
+    stop = asyncio.Event()
+    delays = []
+    probe_task = asyncio.create_task(probe(stop, delays))
+    started = time.perf_counter()
+    await asyncio.gather(*(login() for _ in range(logins)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await probe_task
+
+    return {
+        "mode": mode,
+        "logins_per_second": round((logins - rejected) / elapsed, 1),
+        "rejected_503": rejected,
+        "probe_samples": len(delays),
+        "probe_p50_ms": round(statistics.median(delays), 2) if delays else None,
+        "probe_p99_ms": round(percentile(delays, 0.99), 2) if delays else None,
+    }
+
+
+async def main(args):
+    password = "benchmark-password"
+    hashed = auth_handler.get_password_hash(password)
+    for mode in ("inline", "offloaded"):
+        print(await storm(mode, password, hashed, args.logins, args.concurrency))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Compare inline and offloaded bcrypt under a login storm")
+    parser.add_argument("--logins", type = int, default = 200)
+    parser.add_argument("--concurrency", type = int, default = 50)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,86 @@
+"""
+Instrumentation overhead benchmark for the /metrics middleware and the
+MongoDB command listener.
+
+Serves a trivial endpoint in-process with and without MetricsMiddleware,
+alternating rounds so both see the same machine state, and times the
+listener's started/succeeded pair on its own. A near-empty endpoint is the
+worst case: real handlers spend most of their time in MongoDB, which makes
+the relative overhead smaller still.
+
+    python -m benchmarks.metrics_overhead --requests 5000 --rounds 5
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from types import SimpleNamespace
+
+import httpx
+from fastapi import FastAPI
+
+from services.metrics import MetricsMiddleware, MongoCommandMetrics
+
+
+def build_app(instrumented: bool) -> FastAPI:
+    app = FastAPI()
+    if instrumented:
+        app.add_middleware(MetricsMiddleware)
+
+    @app.get("/cases/{id}")
+    async def get_case(id: str):
+        return {"id": id, "title": "benchmark", "status": "open"}
+
+    return app
+
+
+async def requests_per_second(app: FastAPI, requests: int) -> float:
+    transport = httpx.ASGITransport(app = app)
+    async with httpx.AsyncClient(transport = transport, base_url = "http://bench") as client:
+        started = time.perf_counter()
+        for i in range(requests):
+            await client.get(f"/cases/{i}")
+        return requests / (time.perf_counter() - started)
+
+
+def listener_cost_us(commands: int) -> float:
+    listener = MongoCommandMetrics()
+    started_event = SimpleNamespace(connection_id = ("localhost", 27017), request_id = 0,
+                                    command_name = "find", command = {"find": "cases"})
+    finished_event = SimpleNamespace(connection_id = ("localhost", 27017), request_id = 0,
+                                     command_name = "find", duration_micros = 750)
+    started = time.perf_counter()
+    for request_id in range(commands):
+        started_event.request_id = finished_event.request_id = request_id
+        listener.started(started_event)
+        listener.succeeded(finished_event)
+    return (time.perf_counter() - started) / commands * 1e6
+
+
+async def main(args):
+    plain, instrumented = build_app(False), build_app(True)
+    await requests_per_second(plain, 200)
+    await requests_per_second(instrumented, 200)
+
+    results = {"plain": [], "instrumented": []}
+    for _ in range(args.rounds):
+        results["plain"].append(await requests_per_second(plain, args.requests))
+        results["instrumented"].append(await requests_per_second(instrumented, args.requests))
+
+    plain_rps = statistics.median(results["plain"])
+    instrumented_rps = statistics.median(results["instrumented"])
+    print({
+        "plain_rps": round(plain_rps, 1),
+        "instrumented_rps": round(instrumented_rps, 1),
+        "middleware_us_per_request": round((1 / instrumented_rps - 1 / plain_rps) * 1e6, 1),
+        "middleware_overhead_pct": round((plain_rps / instrumented_rps - 1) * 100, 2),
+        "listener_us_per_command": round(listener_cost_us(args.commands), 2),
+    })
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Measure the cost of request and MongoDB metrics")
+    parser.add_argument("--requests", type = int, default = 5000)
+    parser.add_argument("--rounds", type = int, default = 5)
+    parser.add_argument("--commands", type = int, default = 100000)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,89 @@
+"""
+Serialization benchmark for large list responses.
+
+Builds `--cases` synthetic cases with the seed generator and encodes them as
+a GET /cases/ response would be, three ways:
+
+  response_model  FastAPI's path for `response_model = List[Case]`: dump,
+                  re-validate, serialize, then json.dumps in JSONResponse
+  models          services.serialization.models_response on the loaded
+                  Case documents (pydantic-core straight to bytes)
+  raw             services.serialization.dumps on the raw BSON documents,
+                  as the `fields` projection and NDJSON paths do
+
+plus the cost of loading the raw documents into Case instances, which the
+raw path avoids. Beanie is initialised against DB_URL/DB_NAME from the
+environment, but nothing is read or written.
+
+    python -m benchmarks.serialization --cases 10000 --rounds 5
+"""
+import argparse
+import asyncio
+import json
+import time
+from typing import List
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+
+from config import BaseConfig
+from database import init_db
+from models.case import Case
+from scripts.seed import Generator
+from services.serialization import dumps, models_response, orjson
+
+
+def best_of(rounds: int, encode) -> float:
+    timings = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        encode()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+async def best_of_async(rounds: int, encode) -> float:
+    timings = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        await encode()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+async def main(args):
+    await init_db(BaseConfig())
+
+    generator = Generator(seed = 7, years = 5)
+    documents = [generator.case(number, [])[0] for number in range(args.cases)]
+    cases: List[Case] = [Case.model_validate(document) for document in documents]
+
+    field = create_response_field(name = "Response_list_cases", type_ = List[Case])
+
+    async def response_model_path() -> bytes:
+        content = await serialize_response(field = field, response_content = cases, is_coroutine = True)
+        return JSONResponse(content).body
+
+    before = await response_model_path()
+    after = models_response(Case, cases).body
+    assert json.loads(before) == json.loads(after), "models_response differs from the response_model output"
+
+    seconds = {
+        "response_model": await best_of_async(args.rounds, response_model_path),
+        "models": best_of(args.rounds, lambda: models_response(Case, cases).body),
+        "raw": best_of(args.rounds, lambda: dumps(documents)),
+        "validate_raw": best_of(args.rounds, lambda: [Case.model_validate(document) for document in documents]),
+    }
+
+    print(f"{args.cases} cases, {len(after) / 1e6:.1f} MB of JSON, orjson {'on' if orjson else 'off'}")
+    for name, elapsed in seconds.items():
+        print(f"{name:<16}{elapsed * 1000:>10.1f} ms{args.cases / elapsed:>12.0f} cases/s"
+              f"{seconds['response_model'] / elapsed:>8.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Compare JSON encoding paths for list responses")
+    parser.add_argument("--cases", type = int, default = 10000)
+    parser.add_argument("--rounds", type = int, default = 5)
+    asyncio.run(main(parser.parse_args()))
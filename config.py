@@ -9,11 +9,64 @@ class BaseConfig(BaseSettings):
     #JWT Security
     SECRET_KEY: str
 
+    #Password hashing
+    BCRYPT_ROUNDS: int = 12
+    AUTH_HASH_WORKERS: int = 2
+    AUTH_HASH_QUEUE_SIZE: int = 32
+
+    #Authenticated identity cache
+    AUTH_CACHE_SIZE: int = 10000
+    AUTH_CACHE_TTL: float = 300
+
     #Cloudinary
     CLOUDINARY_SECRET_KEY: Optional[str] = None
     CLOUDINARY_API_KEY: Optional[str] = None
     CLOUDINARY_CLOUD_NAME: Optional[str] = None
 
+    #Evidence storage: 'cloudinary' or 'local'
+    EVIDENCE_STORAGE: str = "cloudinary"
+    EVIDENCE_LOCAL_PATH: str = "evidence_files"
+    EVIDENCE_BASE_URL: str = "/evidence"
+    EVIDENCE_UPLOAD_CONCURRENCY: int = 4
+    EVIDENCE_CHUNK_SIZE: int = 6 * 1024 * 1024
+
+    #Evidence processing queue
+    EVIDENCE_WORKERS: int = 2
+    EVIDENCE_MAX_ATTEMPTS: int = 5
+    EVIDENCE_RETRY_DELAY: float = 2
+    EVIDENCE_JOB_LEASE: float = 600
+    EVIDENCE_POLL_INTERVAL: float = 5
+
+    #Metrics (/metrics, Prometheus text format)
+    METRICS_ENABLED: bool = True
+
+    #Query profiling. The slow-query log (0 disables it) is cheap enough for
+    #production; PROFILE_QUERIES is meant for development and staging
+    SLOW_QUERY_MS: float = 200
+    PROFILE_QUERIES: bool = False
+    PROFILE_N_PLUS_ONE_THRESHOLD: int = 3
+    PROFILE_EXPLAIN_SAMPLE_RATE: float = 0.0
+
+    #Pagination
+    DEFAULT_PAGE_SIZE: int = 50
+    MAX_PAGE_SIZE: int = 500
+
+    #Search: 'mongo' (text indexes) or 'memory' (in-process index, single worker)
+    SEARCH_BACKEND: str = "mongo"
+    SEARCH_MAX_RESULTS: int = 1000
+
+    #Bulk ingest
+    INGEST_CHUNK_SIZE: int = 1000
+    INGEST_MAX_ERRORS: int = 1000
+
+    #Bulk case status changes: most cases one request may change
+    BULK_STATUS_MAX_CASES: int = 10000
+
+    #Analytics cache
+    ANALYTICS_CACHE_TTL: float = 30
+    ANALYTICS_CACHE_SIZE: int = 1024
+    CACHE_URL: Optional[str] = None
+
     model_config = SettingsConfigDict(
         env_file = ".env",
         extra = "ignore"
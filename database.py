@@ -0,0 +1,63 @@
+from typing import Any, Awaitable, Callable, TypeVar
+
+from motor import motor_asyncio
+from beanie import init_beanie
+
+from config import BaseConfig
+from models.case import Case, CaseStatusHistory
+from models.user import User
+from models.incident import IncidentReport
+from models.victim import Individual
+from models.rollup import IncidentRollup, CaseFlowRollup, CaseBacklog, CaseBacklogSnapshot
+from models.job import EvidenceJob
+from models.blob import EvidenceBlob
+from models.similarity import SimilaritySignature
+from services.indexes import deferred_index_builds, build_indexes
+
+DOCUMENT_MODELS = [Case, CaseStatusHistory, User, IncidentReport, Individual, IncidentRollup, EvidenceJob, EvidenceBlob, SimilaritySignature,
+                   CaseFlowRollup, CaseBacklog, CaseBacklogSnapshot]
+
+async def init_db(settings: BaseConfig, wait_for_indexes: bool = False, event_listeners: list = ()):
+    """
+    Connect to MongoDB and initialize Beanie. Returns the client and the
+    declared indexes, which are only built here when wait_for_indexes is set.
+    `event_listeners` are pymongo monitoring listeners attached to the client.
+    """
+    client = motor_asyncio.AsyncIOMotorClient(settings.DB_URL, event_listeners = list(event_listeners))
+    with deferred_index_builds(DOCUMENT_MODELS) as declared_indexes:
+        await init_beanie(
+            database=client[settings.DB_NAME],
+            document_models=DOCUMENT_MODELS
+        )
+    if wait_for_indexes:
+        await build_indexes(declared_indexes)
+    return client, declared_indexes
+
+
+T = TypeVar("T")
+
+_transactions_supported = None
+
+async def supports_transactions(client: motor_asyncio.AsyncIOMotorClient) -> bool:
+    """Transactions need a replica set or a sharded cluster."""
+    global _transactions_supported
+    if _transactions_supported is None:
+        hello = await client.admin.command("hello")
+        _transactions_supported = "setName" in hello or hello.get("msg") == "isdbgrid"
+    return _transactions_supported
+
+async def run_in_transaction(callback: Callable[[Any], Awaitable[T]]) -> T:
+    """
+    Await callback(session) inside a transaction when the deployment supports
+    transactions, and callback(None) on a standalone server. The transaction
+    is retried, callback included, on TransientTransactionError and the
+    commit on UnknownTransactionCommitResult, so write conflicts between
+    concurrent requests are not reported as errors. The callback must not
+    have effects outside the session.
+    """
+    client = Case.get_motor_collection().database.client
+    if not await supports_transactions(client):
+        return await callback(None)
+
+    async with await client.start_session() as session:
+        return await session.with_transaction(callback)
@@ -1,33 +1,49 @@
+import asyncio
 from contextlib import asynccontextmanager
-import motor
-from motor import motor_asyncio
-from beanie import init_beanie
 from fastapi import FastAPI, Depends
+from fastapi.responses import PlainTextResponse
 from config import BaseConfig
 
-from models.case import Case, CaseStatusHistory
-from models.user import User
-from models.incident import IncidentReport
-from models.victim import Individual
+from database import DOCUMENT_MODELS, init_db
 
 from routers import cases as  cases_router
 from routers import users as users_router
 from routers import incidents as incidents_router
 from routers import victims as victims_router
 from routers.analytics import router as analytics_router
+from routers import admin as admin_router
+from routers import jobs as jobs_router
+from routers import exports as exports_router
+from routers import search as search_router
+from services.indexes import build_indexes
+from services.jobs import evidence_queue
+from services.metrics import MetricsMiddleware, mongo_listener, registry
+from services.profiler import QueryProfilingMiddleware, query_explainer, query_profiler
+from services.rollups import ensure_rollups
+from services.search import search_backend
+from services.storage import EvidenceFiles
 
 settings = BaseConfig()
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    app.db_client = motor.motor_asyncio.AsyncIOMotorClient(settings.DB_URL)
-    await init_beanie(
-        database=app.db_client[settings.DB_NAME],
-        document_models=[Case, CaseStatusHistory, User, IncidentReport, Individual]
-    )
+    listeners = [mongo_listener] if settings.METRICS_ENABLED else []
+    if settings.PROFILE_QUERIES or settings.SLOW_QUERY_MS:
+        listeners.append(query_profiler)
+    app.db_client, declared_indexes = await init_db(settings, event_listeners=listeners)
+    app.document_models = DOCUMENT_MODELS
     print("Database Connected")
+    # Index builds on large collections can take minutes; don't hold up startup
+    app.index_build = asyncio.create_task(build_indexes(declared_indexes))
+    app.search_build = asyncio.create_task(search_backend.rebuild())
+    app.rollup_build = asyncio.create_task(ensure_rollups())
+    evidence_queue.start()
     yield
 
+    await evidence_queue.stop()
+    app.index_build.cancel()
+    app.search_build.cancel()
+    app.rollup_build.cancel()
     app.db_client.close()
     print("Database Disconnected & Closed")
 
@@ -37,12 +53,34 @@ app = FastAPI(
     lifespan=lifespan
 )
 
+if settings.METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+if settings.PROFILE_QUERIES:
+    app.add_middleware(
+        QueryProfilingMiddleware,
+        get_client=lambda: app.db_client,
+        n_plus_one_threshold=settings.PROFILE_N_PLUS_ONE_THRESHOLD,
+        explainer=query_explainer,
+    )
+
 app.include_router(cases_router.router, tags = ["Cases"], prefix = "/cases")
 app.include_router(users_router.router, tags = ["Users"], prefix = "/users")
 app.include_router(incidents_router.router, tags = ["Incidents"], prefix = "/reports")
 app.include_router(victims_router.router, tags=["Victims"], prefix="/victims")
 app.include_router(analytics_router, prefix="/analytics", tags=["Analytics"])
+app.include_router(admin_router.router, tags=["Admin"], prefix="/admin")
+app.include_router(jobs_router.router, tags=["Jobs"], prefix="/jobs")
+app.include_router(exports_router.router, tags=["Export"], prefix="/export")
+app.include_router(search_router.router, tags=["Search"], prefix="/search")
+
+if settings.EVIDENCE_STORAGE == "local":
+    app.mount(settings.EVIDENCE_BASE_URL, EvidenceFiles(directory=settings.EVIDENCE_LOCAL_PATH, check_dir=False), name="evidence")
 
 @app.get("/")
 async def root():
-    return {"message": "Welcome to the Human Rights Monitor."}
\ No newline at end of file
+    return {"message": "Welcome to the Human Rights Monitor."}
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus scrape endpoint."""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
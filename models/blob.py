@@ -0,0 +1,22 @@
+from beanie import Document
+from pydantic import Field
+from datetime import datetime
+from pymongo import ASCENDING, IndexModel
+
+class EvidenceBlob(Document):
+    """
+    A stored evidence file, addressed by the SHA-256 of its content and shared
+    by every evidence entry that uploaded the same bytes.
+    """
+    sha256: str
+    size: int
+    type: str
+    url: str
+    ref_count: int = Field(default = 0, description = "Number of ready evidence entries of live documents pointing at this file")
+    created_at: datetime = Field(default_factory = datetime.utcnow)
+
+    class Settings:
+        name = "evidence_blobs"
+        indexes = [
+            IndexModel([("sha256", ASCENDING)], unique = True),
+        ]
@@ -1,7 +1,9 @@
-from beanie import Document, PydanticObjectId
+from beanie import Document, Granularity, PydanticObjectId, TimeSeriesConfig
+from pymongo import ASCENDING, DESCENDING, GEOSPHERE, TEXT, IndexModel
 from pydantic import BaseModel, Field
 from typing import List, Optional
-from datetime import datetime
+from datetime import date, datetime
+from uuid import uuid4
 
 class Location(BaseModel):
     country: str
@@ -13,13 +15,21 @@ class Perpetrator(BaseModel):
     type: str
 
 class Evidence(BaseModel):
+    evidence_id: str = Field(default_factory = lambda: uuid4().hex)
     type: str = Field(description = "Type of evidence, e.g., 'photo', 'video', 'pdf'")
-    url: str
+    url: Optional[str] = Field(None, description = "Set once the file has been stored")
     description: Optional[str] = None
     date_captured: datetime = Field(default_factory = datetime.utcnow)
+    status: str = Field(default = "ready", description = "Can be 'pending', 'ready', 'failed'")
+    job_id: Optional[PydanticObjectId] = None
+    sha256: Optional[str] = Field(None, description = "SHA-256 of the file content")
+    size: Optional[int] = Field(None, description = "File size in bytes")
+
+# Fields of the text index used by /search, with their relative weights
+CASE_TEXT_WEIGHTS = {"title": 10, "perpetrators.name": 5, "description": 1}
 
 class Case(Document):
-    case_id: str = Field(..., unique = True, description = "Unique human-readable case identifier")
+    case_id: str = Field(..., description = "Unique human-readable case identifier")
     title: str = Field(..., max_length = 100)
     description: Optional[str] = Field(None, max_length = 500)
     violation_types: List[str]
@@ -30,12 +40,41 @@ class Case(Document):
     date_reported: datetime = Field(default_factory = datetime.utcnow)
     victims: Optional[List[PydanticObjectId]] = None
     perpetrators: Optional[List[Perpetrator]] = None
-    created_by: PydanticObjectId
+    # Set from the authenticated user when the case is created
+    created_by: Optional[PydanticObjectId] = None
     is_archived: bool = Field(default = False, description = "Whether the case is archived or not")
     evidence: Optional[List[Evidence]] = Field(default=[])
 
     class Settings:
         name = "cases"
+        indexes = [
+            IndexModel([("case_id", ASCENDING)], unique = True),
+            IndexModel([("is_archived", ASCENDING), ("date_occurred", DESCENDING), ("_id", DESCENDING)]),
+            IndexModel([("is_archived", ASCENDING), ("status", ASCENDING), ("priority", ASCENDING),
+                        ("date_occurred", DESCENDING), ("_id", DESCENDING)]),
+            IndexModel([("is_archived", ASCENDING), ("priority", ASCENDING),
+                        ("date_occurred", DESCENDING), ("_id", DESCENDING)]),
+            IndexModel([("is_archived", ASCENDING), ("location.country", ASCENDING), ("location.region", ASCENDING),
+                        ("date_occurred", DESCENDING), ("_id", DESCENDING)]),
+            IndexModel([("violation_types", ASCENDING), ("is_archived", ASCENDING),
+                        ("date_occurred", DESCENDING), ("_id", DESCENDING)]),
+            IndexModel([("location.coordinates", GEOSPHERE)]),
+            IndexModel([(field, TEXT) for field in CASE_TEXT_WEIGHTS],
+                       weights = CASE_TEXT_WEIGHTS, name = "case_text"),
+            # Only cases in the middle of a bulk status change carry the marker
+            IndexModel([("status_transition.batch", ASCENDING)], sparse = True),
+        ]
+
+class CaseSummary(BaseModel):
+    """Fields returned for fields=summary, e.g. for the map view."""
+    id: Optional[PydanticObjectId] = Field(None, alias = "_id")
+    case_id: str
+    title: str
+    status: str
+    priority: str
+    violation_types: List[str]
+    location: Location
+    date_occurred: datetime
 
 class UpdateCase(BaseModel):
     title: Optional[str] = None
@@ -43,16 +82,58 @@ class UpdateCase(BaseModel):
     violation_types: Optional[List[str]] = None
     status: Optional[str] = None
     priority: Optional[str] = None
+    victims: Optional[List[PydanticObjectId]] = None
 
     class Config:
         orm_mode = True
 
 class CaseStatusHistory(Document):
+    """
+    One status change of a case, stored in a time-series collection with the
+    case as metadata. The country, violation types and report date are
+    copied from the case so that services.case_metrics needs no lookups.
+    """
     case_id: PydanticObjectId
     previous_status: str
     new_status: str
     changed_at: datetime = Field(default_factory = datetime.utcnow)
     changed_by: PydanticObjectId
+    country: Optional[str] = None
+    violation_types: List[str] = Field(default = [])
+    opened_at: Optional[datetime] = Field(None, description = "When the case was reported")
+    seconds_in_previous_status: Optional[float] = None
 
     class Settings:
-        name = "case_status_history"
\ No newline at end of file
+        name = "case_status_history"
+        timeseries = TimeSeriesConfig(time_field = "changed_at", meta_field = "case_id", granularity = Granularity.hours)
+        indexes = [
+            IndexModel([("case_id", ASCENDING), ("changed_at", ASCENDING)]),
+        ]
+
+class CaseFilter(BaseModel):
+    """The filters of GET /cases/, to select the cases of a bulk status change."""
+    status: Optional[str] = None
+    priority: Optional[str] = None
+    violation_type: Optional[str] = None
+    start_date: Optional[date] = None
+    end_date: Optional[date] = None
+    country: Optional[str] = None
+    region: Optional[str] = None
+
+class BulkStatusUpdate(BaseModel):
+    new_status: str
+    case_ids: Optional[List[PydanticObjectId]] = Field(None, description = "Cases to change; or give `filter`")
+    filter: Optional[CaseFilter] = Field(None, description = "Change every open case matching these filters")
+
+class StatusTransitionOutcome(BaseModel):
+    id: PydanticObjectId
+    case_id: Optional[str] = None
+    outcome: str = Field(..., description = "'updated', 'unchanged' (already in the new status) or 'not_found'")
+    previous_status: Optional[str] = None
+
+class BulkStatusResult(BaseModel):
+    new_status: str
+    updated: int = 0
+    unchanged: int = 0
+    not_found: int = 0
+    outcomes: List[StatusTransitionOutcome] = Field(default = [])
@@ -1,14 +1,21 @@
 from beanie import Document, PydanticObjectId
+from pymongo import ASCENDING, DESCENDING, GEOSPHERE, TEXT, IndexModel
 from pydantic import BaseModel, Field
 from typing import List, Optional
 from datetime import datetime
+from uuid import uuid4
 
 from models.case import Location
 
 class Evidence(BaseModel):
+    evidence_id: str = Field(default_factory = lambda: uuid4().hex)
     type: str = Field(description = "Type of evidence: 'photo', 'video' or else.")
-    url: str
+    url: Optional[str] = Field(None, description = "Set once the file has been stored")
     description: Optional[str] = None
+    status: str = Field(default = "ready", description = "Can be 'pending', 'ready', 'failed'")
+    job_id: Optional[PydanticObjectId] = None
+    sha256: Optional[str] = Field(None, description = "SHA-256 of the file content")
+    size: Optional[int] = Field(None, description = "File size in bytes")
 
 class ReporterContact(BaseModel):
     email: Optional[str] = None
@@ -21,8 +28,11 @@ class IncidentDetails(BaseModel):
     description: str
     violation_types: List[str]
 
+# Fields of the text index used by /search, with their relative weights
+REPORT_TEXT_WEIGHTS = {"incident_details.description": 1}
+
 class IncidentReport(Document):
-    report_id: str = Field(..., unique = True)
+    report_id: str
     reporter_type: str = "victim"
     anonymous: bool = False
     contact_info: Optional[ReporterContact] = None
@@ -34,6 +44,33 @@ class IncidentReport(Document):
 
     class Settings:
         name = "incident_reports"
+        indexes = [
+            IndexModel([("report_id", ASCENDING)], unique = True),
+            IndexModel([("incident_details.date", DESCENDING)]),
+            IndexModel([("status", ASCENDING), ("incident_details.date", DESCENDING)]),
+            IndexModel([("incident_details.location.country", ASCENDING),
+                        ("incident_details.location.region", ASCENDING),
+                        ("incident_details.date", DESCENDING)]),
+            IndexModel([("incident_details.violation_types", ASCENDING)]),
+            IndexModel([("incident_details.location.coordinates", GEOSPHERE)]),
+            IndexModel([(field, TEXT) for field in REPORT_TEXT_WEIGHTS],
+                       weights = REPORT_TEXT_WEIGHTS, name = "report_text"),
+        ]
+
+
+class IncidentSummaryDetails(BaseModel):
+    date: datetime
+    location: Location
+    violation_types: List[str]
+
+class IncidentReportSummary(BaseModel):
+    """Fields returned for fields=summary; leaves out contact details, descriptions and evidence."""
+    id: Optional[PydanticObjectId] = Field(None, alias = "_id")
+    report_id: str
+    reporter_type: str
+    status: str
+    incident_details: IncidentSummaryDetails
+    created_at: datetime
 
 
 class UpdateIncidentReport(BaseModel):
@@ -41,4 +78,17 @@ class UpdateIncidentReport(BaseModel):
 
 class ViolationTypeAnalytics(BaseModel):
     id: str = Field(alias = "_id")
-    count: int
\ No newline at end of file
+    count: int
+
+class BulkIngestError(BaseModel):
+    line: int
+    report_id: Optional[str] = None
+    error: str
+
+class BulkIngestResult(BaseModel):
+    received: int = 0
+    inserted: int = 0
+    duplicates: int = 0
+    invalid: int = 0
+    errors: List[BulkIngestError] = Field(default = [])
+    errors_truncated: bool = False
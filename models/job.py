@@ -0,0 +1,47 @@
+from beanie import Document, PydanticObjectId
+from pydantic import BaseModel, Field
+from typing import Optional
+from datetime import datetime
+from pymongo import ASCENDING, IndexModel
+
+class EvidenceJob(Document):
+    """
+    Durable record of an evidence file waiting to be moved to evidence storage.
+    The file itself is spooled in GridFS until the upload succeeds.
+    """
+    target: str = Field(description = "Collection holding the evidence entry: 'cases' or 'incident_reports'")
+    target_id: PydanticObjectId
+    evidence_id: str
+    file_id: PydanticObjectId
+    sha256: Optional[str] = None
+    size: Optional[int] = None
+    filename: Optional[str] = None
+    content_type: Optional[str] = None
+    folder: str
+    status: str = Field(default = "pending", description = "Can be 'pending', 'running', 'done', 'failed'")
+    attempts: int = 0
+    last_error: Optional[str] = None
+    next_attempt_at: datetime = Field(default_factory = datetime.utcnow)
+    locked_until: Optional[datetime] = None
+    created_at: datetime = Field(default_factory = datetime.utcnow)
+    finished_at: Optional[datetime] = None
+
+    class Settings:
+        name = "evidence_jobs"
+        indexes = [
+            IndexModel([("status", ASCENDING), ("next_attempt_at", ASCENDING)]),
+            IndexModel([("status", ASCENDING), ("locked_until", ASCENDING)]),
+        ]
+
+class EvidenceJobStatus(BaseModel):
+    id: PydanticObjectId = Field(alias = "_id")
+    target: str
+    target_id: PydanticObjectId
+    evidence_id: str
+    filename: Optional[str] = None
+    status: str
+    attempts: int
+    last_error: Optional[str] = None
+    next_attempt_at: datetime
+    created_at: datetime
+    finished_at: Optional[datetime] = None
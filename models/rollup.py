@@ -0,0 +1,120 @@
+from beanie import Document
+from pydantic import BaseModel, Field
+from typing import Any, Dict, List, Optional
+from datetime import date, datetime
+from pymongo import ASCENDING, IndexModel
+
+class IncidentRollup(Document):
+    """
+    Pre-aggregated count of incident reports for one day and place.
+
+    Buckets with a violation_type count reports per violation type, while the
+    bucket with violation_type=None counts every report once.
+    """
+    violation_type: Optional[str] = None
+    country: str
+    region: str
+    day: datetime
+    total: int = 0
+    coordinates: Optional[dict] = Field(None, description = "Coordinates of the first report seen for this bucket")
+
+    class Settings:
+        name = "incident_rollups"
+        indexes = [
+            IndexModel([("violation_type", ASCENDING), ("country", ASCENDING),
+                        ("region", ASCENDING), ("day", ASCENDING)], unique = True),
+            IndexModel([("violation_type", ASCENDING), ("day", ASCENDING)]),
+            # The dashboard filters on place and date across all violation types
+            IndexModel([("country", ASCENDING), ("region", ASCENDING), ("day", ASCENDING)]),
+            IndexModel([("day", ASCENDING)]),
+        ]
+
+class CaseFlowRollup(Document):
+    """
+    Status changes of cases in one week (starting on Monday) and country.
+
+    `entered` counts cases moving into `status` and `left` cases moving out of
+    it, with the time they had spent in it. For 'resolved', the time from the
+    report of the case to its resolution is kept as well. Durations are
+    summed and counted in log-scale histograms (see services.case_metrics)
+    keyed by bucket number. As with IncidentRollup, rows with a
+    violation_type count cases per violation type and the row with
+    violation_type=None counts every case once.
+    """
+    week: datetime
+    country: str
+    violation_type: Optional[str] = None
+    status: str
+    entered: int = 0
+    left: int = 0
+    seconds_in_status: float = 0
+    in_status_histogram: Dict[str, int] = Field(default = {})
+    resolution_seconds: float = 0
+    resolution_histogram: Dict[str, int] = Field(default = {})
+
+    class Settings:
+        name = "case_flow_rollups"
+        indexes = [
+            IndexModel([("week", ASCENDING), ("country", ASCENDING), ("violation_type", ASCENDING),
+                        ("status", ASCENDING)], unique = True),
+            IndexModel([("violation_type", ASCENDING), ("status", ASCENDING), ("week", ASCENDING)]),
+        ]
+
+class CaseBacklog(Document):
+    """Current number of open cases in a status and country; `seq` counts the changes."""
+    country: str
+    status: str
+    open_cases: int = 0
+    seq: int = 0
+
+    class Settings:
+        name = "case_backlog"
+        indexes = [
+            IndexModel([("country", ASCENDING), ("status", ASCENDING)], unique = True),
+        ]
+
+class CaseBacklogSnapshot(Document):
+    """
+    Number of open cases in a status and country at the end of `day`, written
+    on every change. Days without a change have no snapshot; the backlog then
+    is that of the last snapshot before.
+    """
+    day: datetime
+    country: str
+    status: str
+    open_cases: int = 0
+    seq: int = 0
+
+    class Settings:
+        name = "case_backlog_snapshots"
+        indexes = [
+            IndexModel([("country", ASCENDING), ("status", ASCENDING), ("day", ASCENDING)], unique = True),
+            IndexModel([("day", ASCENDING)]),
+        ]
+
+class DurationStats(BaseModel):
+    count: int = 0
+    mean_hours: Optional[float] = None
+    p50_hours: Optional[float] = None
+    p90_hours: Optional[float] = None
+    p95_hours: Optional[float] = None
+
+class TimeInStatus(DurationStats):
+    status: str
+
+class CaseThroughput(BaseModel):
+    week: date
+    country: str
+    violation_type: str
+    entered: Dict[str, int] = Field(description = "Cases moved into each status")
+
+class BacklogPoint(BaseModel):
+    day: date
+    counts: Dict[str, int] = Field(description = "Open cases per status at the end of the period")
+
+class Dashboard(BaseModel):
+    violations: List[Dict[str, Any]] = Field(description = "As /analytics/violations")
+    geodata: List[Dict[str, Any]] = Field(description = "As /analytics/geodata")
+    timeline: List[Dict[str, Any]] = Field(description = "As /analytics/timeline")
+    case_status: Dict[str, int] = Field(description = "Open cases per status")
+    case_priority: Dict[str, int] = Field(description = "Open cases per priority")
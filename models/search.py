@@ -0,0 +1,24 @@
+from beanie import PydanticObjectId
+from pydantic import BaseModel, Field
+from typing import Dict, List, Optional
+from datetime import datetime
+
+class SearchHit(BaseModel):
+    collection: str = Field(description = "'cases' or 'reports'")
+    id: PydanticObjectId
+    ref: str = Field(description = "case_id or report_id")
+    title: Optional[str] = None
+    status: str
+    country: Optional[str] = None
+    date: Optional[datetime] = None
+    score: float
+    highlights: Dict[str, List[str]] = Field(
+        default = {}, description = "Matching snippets per field, with the matched words in <mark> tags"
+    )
+
+class SearchResults(BaseModel):
+    query: str
+    offset: int
+    limit: int
+    has_more: bool
+    hits: List[SearchHit] = Field(default = [])
@@ -0,0 +1,40 @@
+from beanie import Document, PydanticObjectId
+from pydantic import BaseModel, Field
+from typing import List, Optional
+from datetime import datetime
+from pymongo import ASCENDING, IndexModel
+
+class SimilaritySignature(Document):
+    """
+    MinHash signature of the text of one incident report or case, with its
+    LSH band keys. Documents sharing a band key are near-duplicate candidates.
+    """
+    kind: str = Field(description = "'report' or 'case'")
+    source_id: PydanticObjectId
+    ref: str = Field(description = "report_id or case_id")
+    bands: List[int]
+    signature: bytes
+    date: datetime
+    coordinates: Optional[dict] = None
+
+    class Settings:
+        name = "similarity_signatures"
+        indexes = [
+            IndexModel([("source_id", ASCENDING), ("kind", ASCENDING)], unique = True),
+            IndexModel([("bands", ASCENDING), ("date", ASCENDING)]),
+        ]
+
+class SimilarRecord(BaseModel):
+    kind: str = Field(description = "'report' or 'case'")
+    id: PydanticObjectId
+    ref: str
+    similarity: float = Field(description = "Estimated Jaccard similarity of the texts")
+    days_apart: float
+    distance_km: Optional[float] = None
+    score: float = Field(description = "Similarity discounted by time and distance")
+
+class SimilarRecords(BaseModel):
+    report_id: str
+    similar_reports: List[SimilarRecord] = Field(default = [])
+    candidate_cases: List[SimilarRecord] = Field(default = [])
+    truncated: bool = Field(default = False, description = "More candidates matched than were compared")
@@ -1,16 +1,23 @@
 from beanie import Document, PydanticObjectId
+from pymongo import ASCENDING, IndexModel
 from pydantic import BaseModel, Field
 from typing import Optional
 from datetime import datetime
 
 class User(Document):
-    username: str = Field(..., unique = True, min_length = 3, max_length = 50, description = "Unique username")
+    username: str = Field(..., min_length = 3, max_length = 50, description = "Unique username")
     password: str
-    email: Optional[str] = Field(None, unique = True)
+    email: Optional[str] = None
     created_at: datetime = Field(default_factory = datetime.utcnow)
+    password_changed_at: Optional[datetime] = None
 
     class Settings:
         name = "users"
+        indexes = [
+            IndexModel([("username", ASCENDING)], unique = True),
+            IndexModel([("email", ASCENDING)], unique = True,
+                       partialFilterExpression = {"email": {"$type": "string"}}),
+        ]
 
 class Login(BaseModel):
     username: str
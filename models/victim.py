@@ -1,4 +1,5 @@
 from beanie import Document, PydanticObjectId
+from pymongo import ASCENDING, IndexModel
 from pydantic import BaseModel, Field
 from typing import List, Optional
 from datetime import datetime
@@ -25,7 +26,7 @@ class UpdateVictimRisk(BaseModel):
     protection_needed: Optional[bool] = None
 
 class Individual(Document):
-    individual_id: str = Field(..., unique=True)
+    individual_id: str
     type: str = Field(default="victim", description="Can be 'victim' or 'witness'")
     anonymous: bool = False
     pseudonym: Optional[str] = None
@@ -39,3 +40,16 @@ class Individual(Document):
 
     class Settings:
         name = "individuals"
+        indexes = [
+            IndexModel([("individual_id", ASCENDING)], unique = True),
+            IndexModel([("cases_involved", ASCENDING)]),
+        ]
+
+class IndividualSummary(BaseModel):
+    """Fields returned for fields=summary; leaves out contact details and demographics."""
+    id: Optional[PydanticObjectId] = Field(None, alias = "_id")
+    individual_id: str
+    type: str
+    anonymous: bool
+    pseudonym: Optional[str] = None
+    risk_assessment: RiskAssessment
@@ -0,0 +1,31 @@
+from fastapi import APIRouter, Depends, Request
+from typing import List, Dict, Any
+
+from authentication import auth_handler
+from models.user import CurrentUser
+from services.cache import analytics_cache
+from services.indexes import index_report
+
+router = APIRouter()
+
+@router.get("/indexes",
+    response_description = "Report missing and unused indexes",
+    response_model = List[Dict[str, Any]]
+)
+async def get_index_report(request: Request,
+                           current_user: CurrentUser = Depends(auth_handler.current_user)):
+    """
+    List, per collection, the declared indexes that are missing and the
+    existing indexes that have never been used since the server started.
+    """
+    return await index_report(request.app.document_models)
+
+@router.get("/cache",
+    response_description = "Analytics cache statistics",
+    response_model = Dict[str, Any]
+)
+async def get_cache_stats(current_user: CurrentUser = Depends(auth_handler.current_user)):
+    """
+    Hit, miss and eviction counters of the analytics result cache.
+    """
+    return analytics_cache.stats()
@@ -1,9 +1,12 @@
-from fastapi import APIRouter, HTTPException, status
+from fastapi import APIRouter, HTTPException, Query, status
 from typing import List, Optional, Dict, Any
-from datetime import date, datetime
+from datetime import date, timedelta
 
-from models.case import Case
-from models.incident import IncidentReport, ViolationTypeAnalytics
+from models.incident import ViolationTypeAnalytics
+from models.rollup import BacklogPoint, CaseThroughput, Dashboard, DurationStats, TimeInStatus
+from services import case_metrics, rollups
+from services.dashboard import dashboard
+from services.cache import analytics_cache, cached
 
 router = APIRouter()
 
@@ -11,68 +14,29 @@ router = APIRouter()
             response_description = "Get a count of reports by violation type",
             response_model = List[ViolationTypeAnalytics]
             )
+@cached(analytics_cache)
 async def get_reports_by_violation_type():
     """
     Performs an aggregation to count incident reports grouped by violation type.
     This provides insights into the most common types of human rights violations.
+    Counts are read from the incident rollups, not from the reports themselves.
     """
-    pipeline = [
-        {"$unwind": "$incident_details.violation_types"},
-        {"$group": {
-            "_id": "$incident_details.violation_types",
-            "count": {"$sum": 1}
-        }},
-        {"$sort": {"count": -1}}
-    ]
-
-    analytics_result = await IncidentReport.aggregate(pipeline).to_list()
+    analytics_result = await rollups.violation_counts()
     return analytics_result
 
 @router.get("/geodata",
             response_description="Get geographical distribution of incident reports",
             response_model=List[Dict[str, Any]]
 )
+@cached(analytics_cache)
 async def get_incident_geodata(country: Optional[str] = None, region: Optional[str] = None):
     """
     Retrieves aggregated geographical data for incident reports,
     showing counts per country/region, suitable for map visualizations.
-    Filters can be applied by country and region.
-    """
-    pipeline = []
-
-    match_criteria = {}
-    if country:
-        match_criteria["incident_details.location.country"] = country
-    if region:
-        match_criteria["incident_details.location.region"] = region
-
-    if match_criteria:
-        pipeline.append({"$match": match_criteria})
-
-    pipeline.append({
-        "$group": {
-            "_id": {
-                "country": "$incident_details.location.country",
-                "region": "$incident_details.location.region",
-                "coordinates": "$incident_details.location.coordinates" # Include coordinates if available
-            },
-            "count": {"$sum": 1}
-        }
-    })
-
-    pipeline.append({
-        "$project": {
-            "country": "$_id.country",
-            "region": "$_id.region",
-            "coordinates": "$_id.coordinates",
-            "count": 1,
-            "_id": 0 # Exclude default _id
-        }
-    })
-
-    pipeline.append({"$sort": {"count": -1, "country": 1, "region": 1}})
-
-    geodata_result = await IncidentReport.aggregate(pipeline).to_list()
+    Filters can be applied by country and region. Each region is placed on
+    the map at the coordinates of its first report.
+    """
+    geodata_result = await rollups.geo_distribution(country, region)
     return geodata_result
 
 
@@ -80,6 +44,7 @@ async def get_incident_geodata(country: Optional[str] = None, region: Optional[s
             response_description="Get incident reports trend over time",
             response_model=List[Dict[str, Any]]
             )
+@cached(analytics_cache)
 async def get_incident_timeline(
         granularity: str = "month",  # 'year', 'month', 'day'
         start_date: Optional[date] = None,
@@ -96,56 +61,120 @@ async def get_incident_timeline(
             detail="Invalid granularity. Must be 'year', 'month', or 'day'."
         )
 
-    pipeline = []
-
-    date_match_criteria = {}
-    if start_date:
-        date_match_criteria["$gte"] = datetime.combine(start_date, datetime.min.time())
-    if end_date:
-        date_match_criteria["$lte"] = datetime.combine(end_date, datetime.max.time())
-
-    if date_match_criteria:
-        pipeline.append({"$match": {"incident_details.date": date_match_criteria}})
-
-    group_id = {}
-    if granularity == "year":
-        group_id["year"] = {"$year": "$incident_details.date"}
-    elif granularity == "month":
-        group_id["year"] = {"$year": "$incident_details.date"}
-        group_id["month"] = {"$month": "$incident_details.date"}
-    elif granularity == "day":
-        group_id["year"] = {"$year": "$incident_details.date"}
-        group_id["month"] = {"$month": "$incident_details.date"}
-        group_id["day"] = {"$dayOfMonth": "$incident_details.date"}
-
-    pipeline.append({
-        "$group": {
-            "_id": group_id,
-            "count": {"$sum": 1}
-        }
-    })
-
-    sort_stage = {"_id.year": 1}
-    if granularity == "month":
-        sort_stage["_id.month"] = 1
-    elif granularity == "day":
-        sort_stage["_id.month"] = 1
-        sort_stage["_id.day"] = 1
-
-    pipeline.append({"$sort": sort_stage})
-    pipeline.append({
-        "$project": {
-            "period": {
-                "$concat": [
-                    {"$toString": "$_id.year"},
-                    {"$cond": {"if": {"$ne": ["$_id.month", None]}, "then": {"$concat": ["-", {"$toString": "$_id.month"}]}, "else": ""}},
-                    {"$cond": {"if": {"$ne": ["$_id.day", None]}, "then": {"$concat": ["-", {"$toString": "$_id.day"}]}, "else": ""}}
-                ]
-            },
-            "count": 1,
-            "_id": 0
-        }
-    })
-
-    timeline_result = await IncidentReport.aggregate(pipeline).to_list()
+    timeline_result = await rollups.timeline(granularity, start_date, end_date)
     return timeline_result
+
+
+@router.get("/dashboard",
+            response_description = "All dashboard panels in one response",
+            response_model = Dashboard
+            )
+@cached(analytics_cache)
+async def get_dashboard(
+        granularity: str = "month",  # 'year', 'month', 'day'
+        start_date: Optional[date] = None,
+        end_date: Optional[date] = None,
+        country: Optional[str] = None,
+        region: Optional[str] = None
+):
+    """
+    Violation counts, geographical distribution and timeline of incident
+    reports, and open cases per status and priority, for one date range and
+    place. Replaces the separate /violations, /geodata, /timeline and case
+    list calls with one aggregation over the rollups and one over the cases.
+    Unlike those routes, every panel honours every filter.
+    """
+    if granularity not in ["year", "month", "day"]:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid granularity. Must be 'year', 'month', or 'day'."
+        )
+
+    return await dashboard(granularity, start_date, end_date, country, region)
+
+
+@router.get("/cases/resolution",
+            response_description = "Time from report to resolution of cases",
+            response_model = DurationStats
+            )
+@cached(analytics_cache)
+async def get_case_resolution_times(
+        start_date: Optional[date] = None,
+        end_date: Optional[date] = None,
+        country: Optional[str] = None,
+        violation_type: Optional[str] = None
+):
+    """
+    Mean and percentiles of the time from report to resolution, in hours, of
+    the cases resolved in the weeks from start_date to end_date. Percentiles
+    are read from log-scale histograms and are approximate (about 10%).
+    """
+    return await case_metrics.resolution_times(start_date, end_date, country, violation_type)
+
+
+@router.get("/cases/time-in-status",
+            response_description = "Time cases spend in each status",
+            response_model = List[TimeInStatus]
+            )
+@cached(analytics_cache)
+async def get_case_time_in_status(
+        start_date: Optional[date] = None,
+        end_date: Optional[date] = None,
+        country: Optional[str] = None,
+        violation_type: Optional[str] = None
+):
+    """
+    Mean and percentiles of the time cases spent in each status, in hours,
+    for the cases that left it in the weeks from start_date to end_date.
+    """
+    return await case_metrics.time_in_status(start_date, end_date, country, violation_type)
+
+
+@router.get("/cases/throughput",
+            response_description = "Cases entering each status per week",
+            response_model = List[CaseThroughput]
+            )
+@cached(analytics_cache)
+async def get_case_throughput(
+        start_date: Optional[date] = None,
+        end_date: Optional[date] = None,
+        country: Optional[str] = None,
+        violation_type: Optional[str] = None
+):
+    """
+    Number of cases entering each status (so opened as 'new' and closed as
+    'resolved') per week, country and violation type. Weeks start on Monday.
+    """
+    return await case_metrics.throughput(start_date, end_date, country, violation_type)
+
+
+@router.get("/cases/backlog",
+            response_description = "Open cases per status over time",
+            response_model = List[BacklogPoint]
+            )
+@cached(analytics_cache)
+async def get_case_backlog(
+        start_date: Optional[date] = Query(None, description = "Defaults to 90 days before end_date"),
+        end_date: Optional[date] = Query(None, description = "Defaults to today"),
+        granularity: str = "day",  # 'day', 'week'
+        country: Optional[str] = None
+):
+    """
+    Number of open (not archived) cases in each status at the end of every
+    day or week from start_date to end_date, read from backlog snapshots
+    written as statuses change.
+    """
+    if granularity not in ["day", "week"]:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid granularity. Must be 'day' or 'week'."
+        )
+    end_date = end_date or date.today()
+    start_date = start_date or end_date - timedelta(days = 90)
+    if start_date > end_date or (end_date - start_date).days > 3660:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="start_date must be before end_date and at most ten years earlier."
+        )
+    return await case_metrics.backlog(start_date, end_date, granularity, country)
+
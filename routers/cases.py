@@ -1,34 +1,44 @@
 from beanie import PydanticObjectId
-from beanie.odm.operators.find.comparison import In
-from fastapi import APIRouter, Body, HTTPException, status, UploadFile, File, Form
+from beanie.odm.queries.update import UpdateResponse
+from fastapi import APIRouter, Body, Depends, HTTPException, status, UploadFile, File, Form, Query
+from fastapi.responses import StreamingResponse
+from pymongo import ReturnDocument
 from typing import List, Optional
 from datetime import date
 
-from models.case import Case, UpdateCase, CaseStatusHistory, Evidence, Location, Perpetrator
-from models.victim import Individual
+from models.case import (Case, CaseSummary, UpdateCase, CaseStatusHistory, Evidence, Location, Perpetrator,
+                         BulkStatusUpdate, BulkStatusResult)
 from models.user import CurrentUser
 from authentication import auth_handler
+from services.cache import analytics_cache
+from services.fields import FieldSelection, sparse_response
+from services.geo import GeoFilter
+from services.pagination import encode_cursor, stream_ndjson
+from services.queries import CASE_SORT, case_list_filter
+from services.search import CASES, search_backend
+from services import case_metrics, similarity, transitions
+from services.serialization import models_response
+from services.blobs import referenced_hashes, release_blobs, retain_blobs
+from services.jobs import discard_spooled, enqueue_evidence, prepare_evidence, reset_client_evidence
+from services.links import apply_victim_links, missing_individuals
 
 from config import BaseConfig
-import cloudinary
-import cloudinary.uploader
+from database import run_in_transaction
 
 router = APIRouter()
 
 settings = BaseConfig()
-cloudinary.config(
-    cloud_name=settings.CLOUDINARY_CLOUD_NAME,
-    api_key=settings.CLOUDINARY_API_KEY,
-    api_secret=settings.CLOUDINARY_SECRET_KEY,
-)
+
+case_fields = FieldSelection(Case, CaseSummary, always = ("_id", "date_occurred"))
 
 @router.post("/",
     response_description = "Add new case",
     response_model = Case,
     status_code = status.HTTP_201_CREATED
 )
-async def create_case(case: Case = Body(...)):
-    case.created_by = PydanticObjectId("66688d98ba2785d91dfc33a9")
+async def create_case(case: Case = Body(...),
+                      current_user: CurrentUser = Depends(auth_handler.current_user)):
+    case.created_by = current_user.id
 
     existing_case = await Case.find_one(Case.case_id == case.case_id)
     if existing_case:
@@ -37,24 +47,25 @@ async def create_case(case: Case = Body(...)):
             detail = f"Case with ID {case.case_id} already exists."
         )
 
-    if case.victims:
-        for victim_id in case.victims:
-            individual = await Individual.get(victim_id)
-            if not individual:
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail=f"Victim with ID {victim_id} not found. Cannot link to non-existent victim."
-                )
-
-    await case.create()
-
-    if case.victims:
-        for victim_id in case.victims:
-            individual = await Individual.get(victim_id)
-            if individual:
-                if case.id not in individual.cases_involved:
-                    individual.cases_involved.append(case.id)
-                    await individual.save()
+    if case.victims and (missing := await missing_individuals(case.victims)):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Victim(s) with ID {', '.join(sorted(map(str, missing)))} not found. Cannot link to non-existent victim."
+        )
+
+    case.evidence = reset_client_evidence(case.evidence)
+
+    async def write(session):
+        await case.create(session = session)
+        if case.victims:
+            await apply_victim_links({case.id: case.victims}, session = session)
+
+    await run_in_transaction(write)
+
+    await similarity.record_cases([case])
+    await case_metrics.record_opened([case])
+    await analytics_cache.invalidate()
+    search_backend.index(CASES, [case.model_dump(by_alias = True)])
     return case
 
 @router.get("/{case_id}",
@@ -82,133 +93,219 @@ async def list_cases(status: Optional[str] = None,
                      start_date: Optional[date] = None,
                      end_date: Optional[date] = None,
                      country: Optional[str] = None,
-                     region: Optional[str] = None):
-    """List all cases in the database with filtering"""
-    search_filter = []
-    search_filter.append(Case.is_archived == False)
-
-    if status:
-        search_filter.append(Case.status == status)
-
-    if priority:
-        search_filter.append(Case.priority == priority)
-
-    if violation_type:
-        search_filter.append(In(Case.violation_types, [violation_type]))
-
-    if start_date:
-        search_filter.append(Case.date_occurred >= start_date)
-
-    if end_date:
-        search_filter.append(Case.date_occurred <= end_date)
-
-    if country:
-        search_filter.append(Case.location.country == country)
-
-    if region:
-        search_filter.append(Case.location.region == region)
+                     region: Optional[str] = None,
+                     geo: GeoFilter = Depends(),
+                     limit: int = Query(settings.DEFAULT_PAGE_SIZE, ge = 1, le = settings.MAX_PAGE_SIZE),
+                     cursor: Optional[str] = None,
+                     stream: bool = False,
+                     projection: Optional[dict] = Depends(case_fields)):
+    """
+    List cases in the database with filtering, newest first.
+
+    Results are paginated with an opaque keyset cursor: pass the value of the
+    `X-Next-Cursor` response header as `cursor` to fetch the following page.
+    With `stream=true` every matching case after the cursor is written as
+    NDJSON while it is read from the database.
+    Cases can also be restricted to a radius, polygon or bounding box.
+    With `fields` only the selected fields are read and returned (`_id` and
+    `date_occurred` always are).
+    """
+    search_filter = case_list_filter(
+        status = status, priority = priority, violation_type = violation_type,
+        start_date = start_date, end_date = end_date, country = country, region = region,
+        geo = geo, cursor = cursor
+    )
 
-    cases = await Case.find(*search_filter).to_list()
-    return cases
+    if stream:
+        motor_cursor = Case.get_motor_collection().find(search_filter, projection, sort = CASE_SORT)
+        return StreamingResponse(stream_ndjson(motor_cursor), media_type = "application/x-ndjson")
+
+    if projection is not None:
+        documents = await Case.get_motor_collection().find(
+            search_filter, projection, sort = CASE_SORT, limit = limit + 1
+        ).to_list(None)
+        headers = {}
+        if len(documents) > limit:
+            documents = documents[:limit]
+            headers["X-Next-Cursor"] = encode_cursor(documents[-1]["date_occurred"], documents[-1]["_id"])
+        return sparse_response(documents, headers)
+
+    query = Case.find(search_filter).sort("-date_occurred", "-_id")
+    cases = await query.limit(limit + 1).to_list()
+    headers = {}
+    if len(cases) > limit:
+        cases = cases[:limit]
+        headers["X-Next-Cursor"] = encode_cursor(cases[-1].date_occurred, cases[-1].id)
+    return models_response(Case, cases, headers)
 
 @router.patch("/{id}",
     response_description = "Update a case and log status change",
     response_model = Case
 )
 async def update_case(id: PydanticObjectId,
-                      update_data: UpdateCase
+                      update_data: UpdateCase,
+                      current_user: CurrentUser = Depends(auth_handler.current_user)
 ):
     """
     Update a case by its ID. If the status is changed, a log is created in the case_status_history collection.
-    """
-    case = await Case.get(id)
-    if not case:
-        raise HTTPException(status_code = 404, detail = f"Case with ID {id} is not found")
 
-    previous_status = case.status
+    The update is a single find-one-and-update; the previous status and
+    victims are taken from the pre-image it returns, so concurrent changes
+    are logged against the status they actually replaced. The log is written
+    after the transaction, which cannot include the time-series history.
+    """
     update_dict = update_data.model_dump(exclude_unset=True)
 
-    if "victims" in update_dict and update_dict["victims"] is not None:
-        new_victim_ids = set(update_dict["victims"])
-        existing_victim_ids = set(str(v_id) for v_id in case.victims) if case.victims else set()
-
-        victims_to_add = new_victim_ids - existing_victim_ids
-        victims_to_remove = existing_victim_ids - new_victim_ids
-
-        for victim_id_str in victims_to_add:
-            try:
-                victim_oid = PydanticObjectId(victim_id_str)
-            except Exception:
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail=f"Invalid format for victim ID: {victim_id_str}"
-                )
-            individual = await Individual.get(victim_oid)
-            if not individual:
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail=f"Victim with ID {victim_id_str} not found. Cannot link non-existent victim."
-                )
-            if case.id not in individual.cases_involved:
-                individual.cases_involved.append(case.id)
-                await individual.save()
-
-        for victim_id_str in victims_to_remove:
-            try:
-                victim_oid = PydanticObjectId(victim_id_str)
-            except Exception:
-                continue
-            individual = await Individual.get(victim_oid)
-            if individual and case.id in individual.cases_involved:
-                individual.cases_involved.remove(case.id)
-                await individual.save()
-
-    if len(update_dict) >= 1:
-        await case.update({"$set": update_dict})
-        new_status = update_dict.get("status")
-        if new_status and new_status != previous_status:
-            history_log = CaseStatusHistory(
-                case_id = case.id,
-                previous_status = previous_status,
-                new_status = new_status,
-                changed_by = case.created_by
+    if len(update_dict) == 0:
+        if (case := await Case.get(id)) is not None:
+            return case
+        raise HTTPException(status_code = 404, detail = f"Case with ID {id} not found")
+
+    if update_dict.get("victims") and (missing := await missing_individuals(update_dict["victims"])):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Victim(s) with ID {', '.join(sorted(map(str, missing)))} not found. Cannot link non-existent victim."
+        )
+
+    async def write(session):
+        previous_case = await Case.find_one(Case.id == id).update(
+            {"$set": update_dict},
+            session = session,
+            response_type = UpdateResponse.OLD_DOCUMENT
+        )
+        if previous_case is None:
+            raise HTTPException(status_code = 404, detail = f"Case with ID {id} is not found")
+
+        if "victims" in update_dict and update_dict["victims"] is not None:
+            new_victim_ids = set(update_dict["victims"])
+            existing_victim_ids = set(previous_case.victims) if previous_case.victims else set()
+            await apply_victim_links(
+                {id: new_victim_ids - existing_victim_ids},
+                {id: existing_victim_ids - new_victim_ids},
+                session = session
+            )
+        return previous_case
+
+    previous_case = await run_in_transaction(write)
+
+    # $set only replaces the given top-level fields, so the post-image is the
+    # pre-image with the update applied
+    updated_case = previous_case.model_copy(update = update_dict)
+    new_status = update_dict.get("status")
+    if new_status and new_status != previous_case.status:
+        await case_metrics.log_status_changes([CaseStatusHistory(
+            case_id = id,
+            previous_status = previous_case.status,
+            new_status = new_status,
+            changed_by = current_user.id,
+            country = updated_case.location.country,
+            violation_types = updated_case.violation_types,
+            opened_at = updated_case.date_reported
+        )], backlog = not previous_case.is_archived)
+
+    await analytics_cache.invalidate()
+    if "title" in update_dict or "description" in update_dict:
+        await similarity.record_cases([updated_case])
+    search_backend.index(CASES, [updated_case.model_dump(by_alias = True)])
+    return updated_case
+
+@router.post("/status",
+    response_description = "Change the status of many cases at once",
+    response_model = BulkStatusResult
+)
+async def bulk_update_status(update: BulkStatusUpdate,
+                             current_user: CurrentUser = Depends(auth_handler.current_user)
+):
+    """
+    Move a list of cases, or every open case matching `filter` (the filters
+    of GET /cases/), to `new_status`. All cases are updated with one bulk
+    write and their status history rows with one insert once it has
+    committed, instead of a PATCH per case. Returns the outcome for each
+    case: 'updated' with the status it left, 'unchanged' when it already had
+    the new status, or 'not_found'.
+    """
+    if (update.case_ids is None) == (update.filter is None):
+        raise HTTPException(
+            status_code = status.HTTP_400_BAD_REQUEST,
+            detail = "Give either case_ids or filter."
+        )
+
+    limit = settings.BULK_STATUS_MAX_CASES
+    async def write(session):
+        if update.filter is not None:
+            case_ids = await transitions.select_cases(
+                case_list_filter(**update.filter.model_dump()), update.new_status, limit, session = session
+            )
+        else:
+            case_ids = update.case_ids
+        if len(case_ids) > limit:
+            raise HTTPException(
+                status_code = status.HTTP_400_BAD_REQUEST,
+                detail = f"More than {limit} cases selected; narrow the filter or split the list."
             )
-            await history_log.create()
+        return await transitions.transition_cases(case_ids, update.new_status, session = session)
 
-    if (updated_case := await Case.get(id)) is not None:
-        return updated_case
+    result, changed = await run_in_transaction(write)
 
-    raise HTTPException(status_code = 404, detail = f"Case with ID {id} not found")
+    if changed:
+        await case_metrics.log_status_changes(transitions.history_rows(changed, update.new_status, current_user.id))
+        await analytics_cache.invalidate()
+        search_backend.index(CASES, changed)
+    return result
 
 @router.delete("/{id}",
     response_description = "Archiving a case",
     status_code = status.HTTP_204_NO_CONTENT
 )
-async def archive_case(id: PydanticObjectId
-                       # Security dependency removed
+async def archive_case(id: PydanticObjectId,
+                       current_user: CurrentUser = Depends(auth_handler.current_user)
 ):
-    """Archiving a case by ID"""
-    case = await Case.get(id)
-    if not case:
-        raise HTTPException(
-            status_code = status.HTTP_404_NOT_FOUND,
-            detail = f"Case with ID {id} not found."
+    """
+    Archiving a case by ID. The flag is set with one atomic update, so
+    evidence the queue finishes or a status change made meanwhile is kept,
+    and only the request that actually archived the case releases its blob
+    references and takes it out of the backlog.
+    """
+    async def write(session):
+        document = await Case.get_motor_collection().find_one_and_update(
+            {"_id": id, "is_archived": False}, {"$set": {"is_archived": True}},
+            return_document = ReturnDocument.AFTER, session = session
         )
+        if document is None:
+            return None
+        archived = Case.model_validate(document)
+        await release_blobs(referenced_hashes(archived.evidence), session = session)
+        return archived
+
+    case = await run_in_transaction(write)
+    if case is None:
+        if await Case.get(id) is None:
+            raise HTTPException(
+                status_code = status.HTTP_404_NOT_FOUND,
+                detail = f"Case with ID {id} not found."
+            )
+        # Already archived
+        return
 
-    case.is_archived = True
-    await case.save()
+    await case_metrics.record_archived(case)
+    await analytics_cache.invalidate()
+    search_backend.remove(CASES, [case.id])
     return
 
 @router.get("/archived/",
     response_description = "List all archived cases",
     response_model = List[Case]
 )
-async def list_archived_cases():
+async def list_archived_cases(projection: Optional[dict] = Depends(case_fields)):
     """
     Retrieve all cases that have been archived (soft-deleted).
     """
+    if projection is not None:
+        documents = await Case.get_motor_collection().find({"is_archived": True}, projection).to_list(None)
+        return sparse_response(documents)
+
     archived_cases = await Case.find(Case.is_archived == True).to_list()
-    return archived_cases
+    return models_response(Case, archived_cases)
 
 @router.post("/{id}/attachments",
     response_description = "Add a new evidence file to a case",
@@ -217,30 +314,34 @@ async def list_archived_cases():
 async def add_evidence_to_case(
     id: PydanticObjectId,
     evidence_file: UploadFile = File(...),
-    description: Optional[str] = Form(None)
+    description: Optional[str] = Form(None),
+    current_user: CurrentUser = Depends(auth_handler.current_user)
 ):
     """
-    Upload an evidence file and attach it to an existing case.
+    Upload an evidence file and attach it to an existing case. A file that was
+    uploaded before is linked straight away; otherwise the entry is 'pending'
+    until the evidence queue has stored it.
     """
 
     case = await Case.get(id)
     if not case:
         raise HTTPException(status_code=404, detail=f"Case with ID {id} not found")
 
-    # 2. Upload the file to Cloudinary
-    upload_result = cloudinary.uploader.upload(
-        evidence_file.file,
-        resource_type = "auto",
-        folder = "case_attachments"
+    new_evidence, spooled_file = await prepare_evidence(
+        evidence_file, Evidence, description = description or evidence_file.filename
     )
 
-    new_evidence = Evidence(
-        type = upload_result.get("resource_type", "raw"),
-        url = upload_result.get("secure_url"),
-        description = description or evidence_file.filename
-    )
+    async def write(session):
+        await case.update({"$push": {"evidence": new_evidence.model_dump()}}, session = session)
+        await retain_blobs(referenced_hashes([new_evidence]), session = session)
 
-    await case.update({"$push": {"evidence": new_evidence.model_dump()}})
+    try:
+        await run_in_transaction(write)
+    except Exception:
+        await discard_spooled(spooled_file)
+        raise
+    if spooled_file:
+        await enqueue_evidence(spooled_file, Case, case.id, new_evidence, folder = "case_attachments")
 
     updated_case = await Case.get(id)
     return updated_case
@@ -259,6 +360,6 @@ async def get_case_history(id: PydanticObjectId):
 
     history = await CaseStatusHistory.find(
         CaseStatusHistory.case_id == id
-    ).to_list()
+    ).sort(+CaseStatusHistory.changed_at).to_list()
 
-    return history
\ No newline at end of file
+    return models_response(CaseStatusHistory, history)
\ No newline at end of file
@@ -0,0 +1,63 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import StreamingResponse
+from typing import Optional
+
+from authentication import auth_handler
+from models.user import CurrentUser
+from services.export import CASES, EXPORTERS, REPORTS, REPORTS_WITH_CONTACTS, parquet_supported
+
+router = APIRouter()
+
+def _export_response(spec, query: dict, file_format: str, name: str) -> StreamingResponse:
+    if file_format not in EXPORTERS:
+        raise HTTPException(
+            status_code = status.HTTP_400_BAD_REQUEST,
+            detail = f"Invalid format. Must be one of: {', '.join(EXPORTERS)}."
+        )
+    if file_format == "parquet" and not parquet_supported():
+        raise HTTPException(
+            status_code = status.HTTP_501_NOT_IMPLEMENTED,
+            detail = "Parquet export needs the 'pyarrow' package on the server."
+        )
+
+    exporter, media_type = EXPORTERS[file_format]
+    return StreamingResponse(
+        exporter(spec, query),
+        media_type = media_type,
+        headers = {"Content-Disposition": f'attachment; filename="{name}.{file_format}"'}
+    )
+
+@router.get("/cases",
+    response_description = "Export cases as CSV, GeoJSON or Parquet"
+)
+async def export_cases(file_format: str = Query("csv", alias = "format"),
+                       include_archived: bool = False,
+                       current_user: CurrentUser = Depends(auth_handler.current_user)):
+    """
+    Stream every case straight from the database, flattened to one row per
+    case (location and perpetrators become plain columns).
+    """
+    query = {} if include_archived else {"is_archived": False}
+    return _export_response(CASES, query, file_format, "cases")
+
+@router.get("/reports",
+    response_description = "Export incident reports as CSV, GeoJSON or Parquet"
+)
+async def export_reports(file_format: str = Query("csv", alias = "format"),
+                         status: Optional[str] = None,
+                         country: Optional[str] = None,
+                         include_contacts: bool = Query(False, description = "Add the reporters' contact details"),
+                         current_user: CurrentUser = Depends(auth_handler.current_user)):
+    """
+    Stream every incident report straight from the database. The CSV layout
+    is the one accepted by POST /reports/bulk. Contact details are left out
+    unless include_contacts is set, and are never exported for anonymous
+    reporters.
+    """
+    query = {}
+    if status:
+        query["status"] = status
+    if country:
+        query["incident_details.location.country"] = country
+    spec = REPORTS_WITH_CONTACTS if include_contacts else REPORTS
+    return _export_response(spec, query, file_format, "reports")
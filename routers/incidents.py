@@ -1,26 +1,34 @@
-from fastapi import APIRouter, Form, File, UploadFile, HTTPException, status, Depends
+from beanie.odm.queries.update import UpdateResponse
+from pymongo.errors import DuplicateKeyError
+from fastapi import APIRouter, Form, File, UploadFile, HTTPException, status, Depends, Query, Request
 from typing import List, Optional
 from datetime import date, datetime
 import json
 
-from models.incident import IncidentReport, Evidence, UpdateIncidentReport, ViolationTypeAnalytics
+from models.incident import IncidentReport, IncidentReportSummary, Evidence, UpdateIncidentReport, ViolationTypeAnalytics, BulkIngestResult
+from models.similarity import SimilarRecords
 from models.user import CurrentUser
 from authentication import auth_handler
+from services.fields import FieldSelection, sparse_response
+from services.geo import GeoFilter
+from services.queries import report_list_filter
+from services import rollups, similarity
+from services.cache import analytics_cache, cached
+from services.ingest import ingest_reports
+from services.blobs import referenced_hashes, retain_blobs
+from services.jobs import discard_spooled, enqueue_evidence, prepare_evidence, reset_client_evidence
+from services.search import REPORTS, search_backend
+from services.serialization import models_response
 
-import cloudinary
-import cloudinary.uploader
 from config import BaseConfig
+from database import run_in_transaction
 
 settings = BaseConfig()
 
-cloudinary.config(
-    cloud_name = settings.CLOUDINARY_CLOUD_NAME,
-    api_key = settings.CLOUDINARY_API_KEY,
-    api_secret = settings.CLOUDINARY_SECRET_KEY,
-)
-
 router = APIRouter()
 
+report_fields = FieldSelection(IncidentReport, IncidentReportSummary)
+
 @router.post("/",
              response_description = "Submit a new incident report with evidence",
              response_model = IncidentReport,
@@ -32,6 +40,8 @@ async def create_incident_report(
 ):
     """
     Create a new incident report, accepting report details as a JSON string.
+    An attached evidence file is stored in the background; its entry stays
+    'pending' until then and can be followed on /jobs/{job_id}.
     """
     try:
         report = IncidentReport.model_validate_json(report_data)
@@ -44,26 +54,67 @@ async def create_incident_report(
             detail = f"Incident Report with ID {report.report_id} already exists."
         )
 
+    report.evidence = reset_client_evidence(report.evidence)
+    new_evidence, spooled_file = None, None
     if evidence_file:
-        upload_result = cloudinary.uploader.upload(
-            evidence_file.file,
-            resource_type = "auto",
-            folder = "incident_reports"
-        )
-        new_evidence = Evidence(
-            type = upload_result.get("resource_type", "raw"),
-            url = upload_result.get("secure_url"),
-            description = evidence_file.filename
+        # New files are uploaded by the evidence queue once the report is saved
+        new_evidence, spooled_file = await prepare_evidence(
+            evidence_file, Evidence, description = evidence_file.filename
         )
         if report.evidence:
             report.evidence.append(new_evidence)
         else:
             report.evidence = [new_evidence]
 
-    await report.create()
+    async def write(session):
+        await report.create(session = session)
+        await retain_blobs(referenced_hashes([new_evidence] if new_evidence else []), session = session)
+
+    try:
+        await run_in_transaction(write)
+    except DuplicateKeyError:
+        # Another request stored the same report_id since the check above
+        await discard_spooled(spooled_file)
+        raise HTTPException(
+            status_code = status.HTTP_409_CONFLICT,
+            detail = f"Incident Report with ID {report.report_id} already exists."
+        )
+    except Exception:
+        await discard_spooled(spooled_file)
+        raise
+    await rollups.record_report(report)
+    await similarity.record_reports([report])
+    await analytics_cache.invalidate()
+    search_backend.index(REPORTS, [report.model_dump(by_alias = True)])
+    if spooled_file:
+        await enqueue_evidence(spooled_file, IncidentReport, report.id, new_evidence, folder = "incident_reports")
     return report
 
 
+@router.post("/bulk",
+             response_description = "Bulk import incident reports from NDJSON or CSV",
+             response_model = BulkIngestResult
+             )
+async def bulk_ingest_reports(
+        request: Request,
+        file_format: Optional[str] = Query(None, alias = "format", description = "'ndjson' or 'csv'; defaults from the Content-Type"),
+        chunk_size: int = Query(settings.INGEST_CHUNK_SIZE, ge = 1, le = 10000),
+        current_user: CurrentUser = Depends(auth_handler.current_user)
+):
+    """
+    Import many incident reports in one request. The body is read as a stream,
+    one NDJSON object or CSV row per report (CSV needs a header row and uses
+    ';' between violation types). Reports whose report_id already exists are
+    skipped, and every rejected line is listed in the result.
+    """
+    if file_format is None:
+        file_format = "csv" if "csv" in request.headers.get("content-type", "") else "ndjson"
+    if file_format not in ("ndjson", "csv"):
+        raise HTTPException(status_code = 400, detail = "Invalid format. Must be 'ndjson' or 'csv'.")
+
+    return await ingest_reports(request.stream(), file_format, chunk_size)
+
+
 @router.get("/",
             response_description = "List all incident reports",
             response_model = List[IncidentReport]
@@ -72,26 +123,47 @@ async def list_incident_reports(
         status: Optional[str] = None,
         country: Optional[str] = None,
         start_date: Optional[date] = None,
-        end_date: Optional[date] = None
+        end_date: Optional[date] = None,
+        geo: GeoFilter = Depends(),
+        projection: Optional[dict] = Depends(report_fields)
 ):
     """
-    Retrieve incident reports with optional filtering.
+    Retrieve incident reports with optional filtering, including by
+    radius, polygon or bounding box around the incident location.
+    With `fields` only the selected fields are read and returned.
     """
-    search_criteria = []
-    if status:
-        search_criteria.append(IncidentReport.status == status)
-
-    if country:
-        search_criteria.append(IncidentReport.incident_details.location.country == country)
-
-    if start_date:
-        search_criteria.append(IncidentReport.incident_details.date >= start_date)
-
-    if end_date:
-        search_criteria.append(IncidentReport.incident_details.date <= end_date)
+    search_criteria = report_list_filter(
+        status = status, country = country, start_date = start_date, end_date = end_date, geo = geo
+    )
+    if projection is not None:
+        documents = await IncidentReport.get_motor_collection().find(search_criteria, projection).to_list(None)
+        return sparse_response(documents)
+    reports = await IncidentReport.find(search_criteria).to_list()
+    return models_response(IncidentReport, reports)
+
+
+@router.get("/{report_id}/similar",
+            response_description = "Likely duplicates of a report and cases it may belong to",
+            response_model = SimilarRecords
+            )
+async def get_similar_reports(
+        report_id: str,
+        days: int = Query(30, ge = 0, le = 365, description = "Largest difference between incident dates"),
+        max_km: Optional[float] = Query(50, gt = 0, le = 1000, description = "Largest distance between incident locations"),
+        min_similarity: float = Query(0.5, ge = 0.1, le = 1, description = "Smallest estimated Jaccard similarity of the texts"),
+        limit: int = Query(10, ge = 1, le = 100),
+):
+    """
+    Near-duplicates of an incident report, to help triage: other reports and
+    open cases with a similar description, close in time and place, best
+    matches first. The score is the text similarity discounted by up to half
+    for the time and again for the distance between the two incidents.
+    """
+    report = await IncidentReport.find_one(IncidentReport.report_id == report_id)
+    if report is None:
+        raise HTTPException(status_code = 404, detail = f"Incident Report {report_id} not found")
 
-    reports = await IncidentReport.find(*search_criteria).to_list()
-    return reports
+    return await similarity.similar_to_report(report, days, max_km, min_similarity, limit)
 
 
 @router.patch("/{report_id}",
@@ -101,6 +173,7 @@ async def list_incident_reports(
 async def update_report_status(
         report_id: str,
         update_data: UpdateIncidentReport,
+        current_user: CurrentUser = Depends(auth_handler.current_user)
 ):
     """
     Update the status of a report (e.g., from 'new' to 'verified').
@@ -108,16 +181,17 @@ async def update_report_status(
     update_dict = update_data.model_dump(exclude_unset=True)
 
     if len(update_dict) >= 1:
-        updated_report = await IncidentReport.find_one(
+        report = await IncidentReport.find_one(
             IncidentReport.report_id == report_id
-        ).update({"$set": update_dict})
-
-        if updated_report:
-            if (report := await IncidentReport.find_one(IncidentReport.report_id == report_id)) is not None:
-                return report
+        ).update({"$set": update_dict}, response_type = UpdateResponse.NEW_DOCUMENT)
+        if report is not None:
+            await analytics_cache.invalidate()
+            search_backend.index(REPORTS, [report.model_dump(by_alias = True)])
+    else:
+        report = await IncidentReport.find_one(IncidentReport.report_id == report_id)
 
-    if (existing_report := await IncidentReport.find_one(IncidentReport.report_id == report_id)) is not None:
-        return existing_report
+    if report is not None:
+        return report
 
     raise HTTPException(status_code = 404, detail = f"Incident Report {report_id} not found")
 
@@ -126,18 +200,10 @@ async def update_report_status(
             response_description = "Get a count of reports by violation type",
             response_model = List[ViolationTypeAnalytics]
             )
+@cached(analytics_cache)
 async def get_reports_by_violation_type():
     """
     Performs an aggregation to count incident reports grouped by violation type.
     """
-    pipeline = [
-        {"$unwind": "$incident_details.violation_types"},
-        {"$group": {
-            "_id": "$incident_details.violation_types",
-            "count": {"$sum": 1}
-        }},
-        {"$sort": {"count": -1}}
-    ]
-
-    analytics_result = await IncidentReport.aggregate(pipeline).to_list()
-    return analytics_result
\ No newline at end of file
+    analytics_result = await rollups.violation_counts()
+    return analytics_result
@@ -0,0 +1,23 @@
+from beanie import PydanticObjectId
+from fastapi import APIRouter, HTTPException, status
+
+from models.job import EvidenceJob, EvidenceJobStatus
+
+router = APIRouter()
+
+@router.get("/{job_id}",
+    response_description = "Get the status of an evidence upload",
+    response_model = EvidenceJobStatus
+)
+async def get_evidence_job(job_id: PydanticObjectId):
+    """
+    Follow the background upload of an evidence file by the job_id found on
+    its evidence entry.
+    """
+    job = await EvidenceJob.get(job_id)
+    if not job:
+        raise HTTPException(
+            status_code = status.HTTP_404_NOT_FOUND,
+            detail = f"Evidence job with ID {job_id} not found."
+        )
+    return job
@@ -0,0 +1,47 @@
+from fastapi import APIRouter, HTTPException, Query
+from typing import List, Optional
+
+from models.search import SearchResults
+from services.search import SOURCES, search
+
+from config import BaseConfig
+
+settings = BaseConfig()
+
+router = APIRouter()
+
+@router.get("/",
+    response_description = "Ranked search results across cases and incident reports",
+    response_model = SearchResults
+)
+async def search_records(
+        q: str = Query(..., min_length = 1, description = 'Words to look for; "quoted phrases" must match and -words exclude'),
+        collections: List[str] = Query(list(SOURCES), description = "'cases' and/or 'reports'"),
+        status: Optional[str] = None,
+        country: Optional[str] = None,
+        violation_type: Optional[str] = None,
+        offset: int = Query(0, ge = 0),
+        limit: int = Query(20, ge = 1, le = 100),
+):
+    """
+    Full-text search over case titles, descriptions and perpetrator names and
+    over incident report descriptions, best matches first. Filters are applied
+    within the search. Each hit carries highlighted extracts of the fields
+    that matched; `has_more` tells whether another page follows.
+    """
+    unknown = sorted(set(collections) - set(SOURCES))
+    if unknown:
+        raise HTTPException(
+            status_code = 400,
+            detail = f"Unknown collections: {', '.join(unknown)}."
+        )
+    if offset + limit > settings.SEARCH_MAX_RESULTS:
+        raise HTTPException(
+            status_code = 400,
+            detail = f"Only the first {settings.SEARCH_MAX_RESULTS} results can be paged through; refine the query."
+        )
+
+    return await search(
+        q, list(dict.fromkeys(collections)), offset, limit,
+        status = status, country = country, violation_type = violation_type
+    )
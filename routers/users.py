@@ -16,7 +16,7 @@ async def register_user(new_user: User = Body(...)):
             detail="Username is already taken."
         )
 
-    new_user.password = auth_handler.get_password_hash(new_user.password)
+    new_user.password = await auth_handler.hash_password(new_user.password)
 
     await new_user.create()
     return CurrentUser(id=new_user.id, username=new_user.username)
@@ -26,11 +26,20 @@ async def register_user(new_user: User = Body(...)):
 async def login_user(login_details: Login = Body(...)):
     user = await User.find_one(User.username == login_details.username)
 
-    if (user is None) or (not auth_handler.verify_password(login_details.password, user.password)):
+    if user is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid username and/or password"
         )
 
+    valid, new_hash = await auth_handler.verify_and_update_password(login_details.password, user.password)
+    if not valid:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid username and/or password"
+        )
+    if new_hash:
+        await user.set({User.password: new_hash})
+
     token = auth_handler.encode_token(str(user.id), user.username)
     return {'token': token}
\ No newline at end of file
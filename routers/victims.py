@@ -1,18 +1,26 @@
-from fastapi import APIRouter, Body, HTTPException, status
-from typing import List
+from fastapi import APIRouter, Body, Depends, HTTPException, status
+from typing import List, Optional
 
-from models.victim import Individual, UpdateVictimRisk
+from models.victim import Individual, IndividualSummary, UpdateVictimRisk
 from models.case import Case
+from models.user import CurrentUser
+from authentication import auth_handler
 from beanie import PydanticObjectId
+from beanie.odm.queries.update import UpdateResponse
+from services.fields import FieldSelection, sparse_response
+from services.serialization import models_response
 
 router = APIRouter()
 
+victim_fields = FieldSelection(Individual, IndividualSummary)
+
 @router.post("/",
     response_description = "Add a new victim or witness",
     response_model = Individual,
     status_code = status.HTTP_201_CREATED
 )
-async def add_victim(victim: Individual = Body(...)):
+async def add_victim(victim: Individual = Body(...),
+                     current_user: CurrentUser = Depends(auth_handler.current_user)):
     """
     Add a new victim/witness.
     """
@@ -44,7 +52,8 @@ async def get_victim(victim_id: str):
     response_description = "Update the risk assessment for a victim or witness",
     response_model = Individual
 )
-async def update_victim_risk(victim_id: str, risk_data: UpdateVictimRisk):
+async def update_victim_risk(victim_id: str, risk_data: UpdateVictimRisk,
+                             current_user: CurrentUser = Depends(auth_handler.current_user)):
     """
     Update the risk assessment fields for a specific individual.
     """
@@ -54,16 +63,14 @@ async def update_victim_risk(victim_id: str, risk_data: UpdateVictimRisk):
     }
 
     if len(update_dict) >= 1:
-        updated_victim = await Individual.find_one(
+        victim = await Individual.find_one(
             Individual.individual_id == victim_id
-        ).update({"$set": update_dict})
-
-        if updated_victim:
-            if (victim := await Individual.find_one(Individual.individual_id == victim_id)) is not None:
-                return victim
+        ).update({"$set": update_dict}, response_type = UpdateResponse.NEW_DOCUMENT)
+    else:
+        victim = await Individual.find_one(Individual.individual_id == victim_id)
 
-    if (existing_victim := await Individual.find_one(Individual.individual_id == victim_id)) is not None:
-        return existing_victim
+    if victim is not None:
+        return victim
 
     raise HTTPException(status_code = 404, detail = f"Individual with ID {victim_id} not found")
 
@@ -71,11 +78,14 @@ async def update_victim_risk(victim_id: str, risk_data: UpdateVictimRisk):
     response_description = "List victims linked to a case",
     response_model = List[Individual]
 )
-async def list_victims_linked_to_case(case_id: PydanticObjectId):
+async def list_victims_linked_to_case(case_id: PydanticObjectId,
+                                      projection: Optional[dict] = Depends(victim_fields)):
     """
     Retrieve a list of victims or witnesses linked to a specific case by its ID.
+    With `fields` only the selected fields are read and returned.
     """
-    case = await Case.get(case_id)
+    # Only the victim ids of the case are needed
+    case = await Case.get_motor_collection().find_one({"_id": case_id}, {"victims": 1})
 
     if not case:
         raise HTTPException(
@@ -83,9 +93,13 @@ async def list_victims_linked_to_case(case_id: PydanticObjectId):
             detail = f"Case with ID {case_id} not found."
         )
 
-    if not case.victims:
+    if not case.get("victims"):
         return []
 
-    linked_victims = await Individual.find({"_id": {"$in": case.victims}}).to_list()
+    if projection is not None:
+        documents = await Individual.get_motor_collection().find({"_id": {"$in": case["victims"]}}, projection).to_list(None)
+        return sparse_response(documents)
+
+    linked_victims = await Individual.find({"_id": {"$in": case["victims"]}}).to_list()
 
-    return linked_victims
\ No newline at end of file
+    return models_response(Individual, linked_victims)
\ No newline at end of file
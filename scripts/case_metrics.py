@@ -0,0 +1,40 @@
+"""
+Maintenance commands for the case workflow metrics under /analytics/cases.
+
+    python -m scripts.case_metrics migrate-history
+    python -m scripts.case_metrics rebuild
+
+migrate-history moves a status history kept in a regular collection, as
+stored before it became a time-series collection, into the new layout; run
+rebuild afterwards.
+"""
+import argparse
+import asyncio
+
+from config import BaseConfig
+from database import init_db
+from services.case_metrics import migrate_history, rebuild_case_metrics
+
+
+async def main(args):
+    client, _ = await init_db(BaseConfig(), wait_for_indexes = True)
+    try:
+        if args.command == "migrate-history":
+            copied = await migrate_history(args.batch_size)
+            if copied is None:
+                print("The status history already is a time-series collection")
+            else:
+                print(f"Copied {copied} status history rows into the time-series collection")
+        else:
+            counts = await rebuild_case_metrics(args.batch_size)
+            print(f"Case metrics rebuilt from {counts['cases']} cases: "
+                  f"{counts['flows']} flow rollups, {counts['snapshots']} backlog snapshots")
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Migrate the case status history or rebuild the case metrics")
+    parser.add_argument("command", choices = ["migrate-history", "rebuild"])
+    parser.add_argument("--batch-size", type = int, default = 1000)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,39 @@
+"""
+Export cases or incident reports to a file.
+
+    python -m scripts.export cases --format csv -o cases.csv
+    python -m scripts.export reports --format parquet -o reports.parquet
+"""
+import argparse
+import asyncio
+
+from config import BaseConfig
+from database import init_db
+from services.export import CASES, EXPORTERS, REPORTS, REPORTS_WITH_CONTACTS
+
+
+async def main(args):
+    client, _ = await init_db(BaseConfig())
+    try:
+        if args.collection == "cases":
+            spec = CASES
+        else:
+            spec = REPORTS_WITH_CONTACTS if args.include_contacts else REPORTS
+        query = {"is_archived": False} if args.collection == "cases" and not args.include_archived else {}
+        exporter, _ = EXPORTERS[args.format]
+        with open(args.output, "wb") as target:
+            async for chunk in exporter(spec, query):
+                target.write(chunk)
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Export cases or incident reports")
+    parser.add_argument("collection", choices = ["cases", "reports"])
+    parser.add_argument("--format", choices = list(EXPORTERS), default = "csv")
+    parser.add_argument("-o", "--output", required = True)
+    parser.add_argument("--include-archived", action = "store_true", help = "Also export archived cases")
+    parser.add_argument("--include-contacts", action = "store_true",
+                        help = "Add reporter contact details (never for anonymous reports)")
+    asyncio.run(main(parser.parse_args()))
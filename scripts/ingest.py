@@ -0,0 +1,39 @@
+"""
+Bulk import incident reports from an NDJSON or CSV file.
+
+    python -m scripts.ingest reports.ndjson
+    python -m scripts.ingest reports.csv --chunk-size 5000
+"""
+import argparse
+import asyncio
+
+from config import BaseConfig
+from database import init_db
+from services.ingest import ingest_reports
+
+READ_SIZE = 1024 * 1024
+
+
+async def read_chunks(path: str):
+    with open(path, "rb") as source:
+        while chunk := source.read(READ_SIZE):
+            yield chunk
+
+
+async def main(args):
+    settings = BaseConfig()
+    client, _ = await init_db(settings, wait_for_indexes = True)
+    try:
+        file_format = args.format or ("csv" if args.path.lower().endswith(".csv") else "ndjson")
+        result = await ingest_reports(read_chunks(args.path), file_format, args.chunk_size or settings.INGEST_CHUNK_SIZE)
+        print(result.model_dump_json(indent = 2))
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Bulk import incident reports")
+    parser.add_argument("path")
+    parser.add_argument("--format", choices = ["ndjson", "csv"], help = "Defaults from the file extension")
+    parser.add_argument("--chunk-size", type = int, help = "Reports per insert_many")
+    asyncio.run(main(parser.parse_args()))
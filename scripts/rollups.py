@@ -0,0 +1,39 @@
+"""
+Maintenance commands for the incident analytics rollups.
+
+The API builds the rollups on startup when they are empty; rebuild replaces
+them from the incident reports at any time, and reconcile corrects buckets
+that drifted.
+
+    python -m scripts.rollups rebuild
+    python -m scripts.rollups reconcile [--dry-run]
+"""
+import argparse
+import asyncio
+
+from config import BaseConfig
+from database import init_db
+from services.rollups import rebuild_rollups, reconcile_rollups
+
+
+async def main(args):
+    client, _ = await init_db(BaseConfig(), wait_for_indexes = True)
+    try:
+        if args.command == "rebuild":
+            await rebuild_rollups()
+            print("Rollups rebuilt")
+        else:
+            drift = await reconcile_rollups(apply = not args.dry_run)
+            for bucket in drift:
+                print(bucket)
+            action = "found" if args.dry_run else "fixed"
+            print(f"{len(drift)} drifted bucket(s) {action}")
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Rebuild or reconcile the incident analytics rollups")
+    parser.add_argument("command", choices = ["rebuild", "reconcile"])
+    parser.add_argument("--dry-run", action = "store_true", help = "Only report drifted buckets (reconcile)")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,404 @@
+"""
+Generate synthetic cases, incident reports, victims/witnesses and case status
+history for load testing.
+
+Countries, regions and violation types follow skewed (Zipf-like)
+distributions, cases carry one to several violation types, a minority of
+individuals is linked to many cases, and every location has GeoJSON
+coordinates near its country. Synthetic documents use 'SYN-' identifiers
+and the SEED_USER id, so --reset removes them without touching real data.
+
+    python -m scripts.seed --cases 1000000 --reports 2000000 --victims 500000
+    python -m scripts.seed --reset
+"""
+import argparse
+import asyncio
+import random
+import time
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Iterator, List
+
+from bson import ObjectId
+from pymongo import UpdateOne
+
+from config import BaseConfig
+from database import init_db
+from models.case import Case, CaseStatusHistory
+from models.incident import IncidentReport
+from models.victim import Individual
+from services.case_metrics import rebuild_case_metrics
+from services.rollups import rebuild_rollups
+from services.similarity import rebuild_signatures
+
+SEED_USER = ObjectId("5eed00000000000000000000")
+
+# (country, approximate centre as [lng, lat], regions)
+COUNTRIES = [
+    ("Syria", [38.3, 35.0], ["Aleppo", "Idlib", "Damascus", "Homs", "Deir ez-Zor", "Daraa"]),
+    ("Yemen", [47.5, 15.6], ["Sanaa", "Taiz", "Hodeidah", "Aden", "Marib"]),
+    ("Palestine", [35.0, 31.9], ["Gaza", "Hebron", "Nablus", "Jenin", "Ramallah", "Jerusalem"]),
+    ("Sudan", [30.2, 15.5], ["Khartoum", "North Darfur", "South Kordofan", "Blue Nile"]),
+    ("Myanmar", [96.0, 21.9], ["Rakhine", "Kachin", "Shan", "Sagaing", "Yangon"]),
+    ("Ukraine", [31.2, 48.4], ["Donetsk", "Kharkiv", "Kherson", "Zaporizhzhia", "Kyiv"]),
+    ("Afghanistan", [67.7, 33.9], ["Kabul", "Kandahar", "Herat", "Helmand"]),
+    ("DR Congo", [23.7, -2.9], ["North Kivu", "South Kivu", "Ituri", "Kinshasa"]),
+    ("Ethiopia", [40.5, 9.1], ["Tigray", "Amhara", "Oromia", "Afar"]),
+    ("Colombia", [-74.3, 4.6], ["Cauca", "Antioquia", "Choco", "Narino"]),
+    ("Iraq", [43.7, 33.2], ["Nineveh", "Baghdad", "Anbar", "Basra"]),
+    ("Mali", [-4.0, 17.6], ["Mopti", "Gao", "Timbuktu"]),
+]
+
+VIOLATION_TYPES = [
+    "arbitrary_detention", "attack_on_civilians", "forced_displacement", "torture",
+    "extrajudicial_killing", "enforced_disappearance", "property_destruction",
+    "sexual_violence", "freedom_of_expression", "child_recruitment",
+]
+
+PERPETRATOR_TYPES = ["state_forces", "armed_group", "militia", "police", "unknown"]
+REPORTER_TYPES = ["victim", "witness", "organization", "journalist"]
+STATUS_PATH = ["new", "under_investigation", "resolved"]
+REPORT_STATUSES = ["new", "verified", "linked_to_case"]
+# Phrases for free-text descriptions, so that text search has realistic vocabulary
+ACTIONS = {
+    "arbitrary_detention": ["was detained without charge", "was arrested during a night raid", "was held at a checkpoint"],
+    "attack_on_civilians": ["was injured by shelling", "was wounded in an airstrike", "came under fire"],
+    "forced_displacement": ["was forced to leave their home", "was evicted by armed men", "fled after threats"],
+    "torture": ["was beaten in custody", "was tortured during interrogation", "was held in stress positions"],
+    "extrajudicial_killing": ["was shot dead", "was killed after being detained", "was found dead after an arrest"],
+    "enforced_disappearance": ["has been missing since an arrest", "disappeared after being taken away", "was abducted"],
+    "property_destruction": ["saw their house demolished", "lost their shop to arson", "had farmland burned"],
+    "sexual_violence": ["was sexually assaulted", "was subjected to sexual violence in detention", "was harassed by guards"],
+    "freedom_of_expression": ["was threatened over social media posts", "was arrested for reporting", "had equipment confiscated"],
+    "child_recruitment": ["was recruited at fourteen", "was taken from school by fighters", "was forced to carry weapons"],
+}
+SUBJECTS = ["A teacher", "A local journalist", "A farmer", "A student", "A nurse", "A human rights activist",
+            "A taxi driver", "A lawyer", "A shopkeeper", "A mother of three", "An elderly man", "A teenage boy"]
+PLACES = ["near the central market", "at a military checkpoint", "outside the hospital", "in a residential area",
+          "on the main road", "near a school", "in a displacement camp", "at the border crossing", "in the old city"]
+SOURCES = ["Neighbours witnessed the incident.", "The family filed a complaint.", "Photos were shared with the team.",
+           "Two witnesses confirmed the account.", "Local authorities denied involvement.", "A medical report is available."]
+
+OCCUPATIONS = ["teacher", "journalist", "farmer", "student", "nurse", "activist", "driver", "lawyer", None]
+
+
+def zipf_weights(count: int, exponent: float = 1.1) -> List[float]:
+    return [1 / (rank ** exponent) for rank in range(1, count + 1)]
+
+
+class Generator:
+    def __init__(self, seed: int, years: int):
+        self.rng = random.Random(seed)
+        self.now = datetime.utcnow().replace(microsecond = 0)
+        self.span = timedelta(days = 365 * years)
+        self.country_weights = zipf_weights(len(COUNTRIES))
+        self.region_weights = {name: zipf_weights(len(regions), 0.8) for name, _, regions in COUNTRIES}
+        self.violation_weights = zipf_weights(len(VIOLATION_TYPES), 0.9)
+        # Recent incidents, which later reports may describe again
+        self.incidents = deque(maxlen = 1000)
+
+    def account(self, violation_types: List[str], location: dict) -> str:
+        return " ".join(
+            f"{self.rng.choice(SUBJECTS)} {self.rng.choice(ACTIONS[violation_type])} "
+            f"{self.rng.choice(PLACES)} in {location['region']}, {location['country']}."
+            for violation_type in violation_types[:2]
+        )
+
+    def description(self, account: str) -> str:
+        return " ".join([account] + self.rng.sample(SOURCES, self.rng.randint(0, 2)))
+
+    def location(self) -> dict:
+        name, (lng, lat), regions = self.rng.choices(COUNTRIES, self.country_weights)[0]
+        region_index = self.rng.choices(range(len(regions)), self.region_weights[name])[0]
+        # Each region clusters around its own offset from the country centre
+        region_rng = random.Random(f"{name}:{region_index}")
+        centre_lng = lng + region_rng.uniform(-2, 2)
+        centre_lat = lat + region_rng.uniform(-1.5, 1.5)
+        return {
+            "country": name,
+            "region": regions[region_index],
+            "coordinates": {
+                "type": "Point",
+                "coordinates": [
+                    round(max(-180.0, min(180.0, self.rng.gauss(centre_lng, 0.3))), 5),
+                    round(max(-90.0, min(90.0, self.rng.gauss(centre_lat, 0.3))), 5),
+                ],
+            },
+        }
+
+    def violation_types(self) -> List[str]:
+        count = self.rng.choices([1, 2, 3, 4], [55, 28, 12, 5])[0]
+        chosen = set()
+        while len(chosen) < count:
+            chosen.add(self.rng.choices(VIOLATION_TYPES, self.violation_weights)[0])
+        return sorted(chosen)
+
+    def date(self) -> datetime:
+        # Skewed towards recent incidents
+        return self.now - self.span * (self.rng.random() ** 1.5)
+
+    def individual(self, number: int) -> dict:
+        anonymous = self.rng.random() < 0.3
+        created_at = self.date()
+        return {
+            "individual_id": f"SYN-I-{number:08d}",
+            "type": self.rng.choices(["victim", "witness"], [75, 25])[0],
+            "anonymous": anonymous,
+            "pseudonym": f"Person {number}" if anonymous else None,
+            "demographics": {
+                "gender": self.rng.choice(["female", "male", None]),
+                "age": self.rng.randint(8, 85),
+                "ethnicity": None,
+                "occupation": self.rng.choice(OCCUPATIONS),
+            },
+            "contact_info": {
+                "email": None if anonymous else f"person{number}@example.org",
+                "phone": None,
+                "secure_messaging": self.rng.choice(["signal", "whatsapp", None]),
+            },
+            "cases_involved": [],
+            "risk_assessment": {
+                "level": self.rng.choices(["low", "medium", "high"], [60, 30, 10])[0],
+                "threats": [],
+                "protection_needed": self.rng.random() < 0.15,
+            },
+            "support_services": [],
+            "created_at": created_at,
+            "updated_at": created_at,
+        }
+
+    def victim_indexes(self, victims: int) -> List[int]:
+        if not victims:
+            return []
+        count = self.rng.choices([0, 1, 2, 3, 5], [15, 45, 20, 12, 8])[0]
+        # Squaring the draw makes low indexes recur, so some people appear in many cases
+        return sorted({int(victims * self.rng.random() ** 2) for _ in range(count)})
+
+    def case(self, number: int, victim_ids: List[ObjectId]) -> tuple:
+        """A case document and its status history."""
+        case_id = ObjectId()
+        occurred = self.date()
+        reported = min(self.now, occurred + timedelta(days = self.rng.expovariate(1 / 20)))
+        transitions = self.rng.choices([0, 1, 2], [35, 40, 25])[0]
+
+        history = []
+        changed_at = reported
+        for step in range(transitions):
+            changed_at = min(self.now, changed_at + timedelta(days = self.rng.expovariate(1 / 45)))
+            history.append({
+                "case_id": case_id,
+                "previous_status": STATUS_PATH[step],
+                "new_status": STATUS_PATH[step + 1],
+                "changed_at": changed_at,
+                "changed_by": SEED_USER,
+            })
+
+        violation_types = self.violation_types()
+        location = self.location()
+        for row in history:
+            row.update({"country": location["country"], "violation_types": violation_types, "opened_at": reported})
+        case = {
+            "_id": case_id,
+            "case_id": f"SYN-C-{number:08d}",
+            "title": f"{violation_types[0].replace('_', ' ').capitalize()} in {location['region']}",
+            "description": self.description(self.account(violation_types, location)),
+            "violation_types": violation_types,
+            "status": STATUS_PATH[transitions],
+            "priority": self.rng.choices(["low", "medium", "high"], [30, 50, 20])[0],
+            "location": location,
+            "date_occurred": occurred,
+            "date_reported": reported,
+            "victims": victim_ids,
+            "perpetrators": [
+                {"name": f"Unit {self.rng.randint(1, 400)}", "type": self.rng.choice(PERPETRATOR_TYPES)}
+                for _ in range(self.rng.choices([0, 1, 2], [30, 55, 15])[0])
+            ],
+            "created_by": SEED_USER,
+            "is_archived": self.rng.random() < 0.05,
+            "evidence": [],
+        }
+        return case, history
+
+    def incident(self) -> tuple:
+        """
+        Date, location, violation types and description of a report. About one
+        report in seven retells a recent incident in slightly different words.
+        """
+        if self.incidents and self.rng.random() < 0.15:
+            occurred, location, violation_types, account = self.rng.choice(self.incidents)
+            occurred += timedelta(hours = self.rng.uniform(-36, 36))
+        else:
+            occurred = self.date()
+            location = self.location()
+            violation_types = self.violation_types()
+            account = self.account(violation_types, location)
+            self.incidents.append((occurred, location, violation_types, account))
+        return occurred, location, violation_types, self.description(account)
+
+    def report(self, number: int) -> dict:
+        anonymous = self.rng.random() < 0.4
+        occurred, location, violation_types, description = self.incident()
+        return {
+            "report_id": f"SYN-R-{number:08d}",
+            "reporter_type": self.rng.choices(REPORTER_TYPES, [50, 30, 15, 5])[0],
+            "anonymous": anonymous,
+            "contact_info": None if anonymous else {
+                "email": f"reporter{number}@example.org", "phone": None, "preferred_contact": "email",
+            },
+            "incident_details": {
+                "date": occurred,
+                "location": location,
+                "description": description,
+                "violation_types": violation_types,
+            },
+            "evidence": [],
+            "status": self.rng.choices(REPORT_STATUSES, [60, 30, 10])[0],
+            "assigned_to": None,
+            "created_at": min(self.now, occurred + timedelta(days = self.rng.expovariate(1 / 5))),
+        }
+
+
+def batches(total: int, size: int) -> Iterator[range]:
+    for start in range(0, total, size):
+        yield range(start, min(total, start + size))
+
+
+async def write_pipelined(batches_of_writes):
+    """
+    Await each batch's write only after the next batch has been generated,
+    so generating documents overlaps with the database round trip.
+    """
+    pending = None
+    for writes in batches_of_writes:
+        if pending is not None:
+            await pending
+        pending = asyncio.ensure_future(writes)
+        # Let the write reach the driver before generating the next batch
+        await asyncio.sleep(0)
+    if pending is not None:
+        await pending
+
+
+def progress(label: str, done: int, total: int, started: float):
+    rate = done / max(time.perf_counter() - started, 1e-9)
+    print(f"\r{label}: {done}/{total} ({rate:,.0f}/s)", end = "", flush = True)
+
+
+async def seed_individuals(generator: Generator, total: int, batch_size: int) -> List[ObjectId]:
+    collection = Individual.get_motor_collection()
+    ids = []
+    started = time.perf_counter()
+
+    def writes():
+        for numbers in batches(total, batch_size):
+            documents = [generator.individual(number) for number in numbers]
+            for document in documents:
+                document["_id"] = ObjectId()
+                ids.append(document["_id"])
+            progress("individuals", numbers.stop, total, started)
+            yield collection.insert_many(documents, ordered = False)
+
+    await write_pipelined(writes())
+    print()
+    return ids
+
+
+async def seed_cases(generator: Generator, total: int, batch_size: int, victim_ids: List[ObjectId]):
+    cases = Case.get_motor_collection()
+    history = CaseStatusHistory.get_motor_collection()
+    individuals = Individual.get_motor_collection()
+    started = time.perf_counter()
+
+    async def write(documents, history_rows, links):
+        await cases.insert_many(documents, ordered = False)
+        if history_rows:
+            await history.insert_many(history_rows, ordered = False)
+        if links:
+            await individuals.bulk_write(
+                [UpdateOne({"_id": victim}, {"$push": {"cases_involved": {"$each": case_ids}}})
+                 for victim, case_ids in links.items()],
+                ordered = False
+            )
+
+    def writes():
+        for numbers in batches(total, batch_size):
+            documents, history_rows, links = [], [], {}
+            for number in numbers:
+                linked = [victim_ids[index] for index in generator.victim_indexes(len(victim_ids))]
+                case, rows = generator.case(number, linked)
+                documents.append(case)
+                history_rows.extend(rows)
+                for victim in linked:
+                    links.setdefault(victim, []).append(case["_id"])
+            progress("cases", numbers.stop, total, started)
+            yield write(documents, history_rows, links)
+
+    await write_pipelined(writes())
+    print()
+
+
+async def seed_reports(generator: Generator, total: int, batch_size: int):
+    collection = IncidentReport.get_motor_collection()
+    started = time.perf_counter()
+
+    def writes():
+        for numbers in batches(total, batch_size):
+            documents = [generator.report(number) for number in numbers]
+            progress("reports", numbers.stop, total, started)
+            yield collection.insert_many(documents, ordered = False)
+
+    await write_pipelined(writes())
+    print()
+
+
+async def reset():
+    synthetic = {"$regex": "^SYN-"}
+    # Time-series collections only delete by their metaField, which for the
+    # status history is the case _id, so its rows are removed by case id
+    history = CaseStatusHistory.get_motor_collection()
+    history_removed = 0
+    case_ids = [document["_id"] async for document in Case.get_motor_collection().find({"case_id": synthetic}, {"_id": 1})]
+    for start in range(0, len(case_ids), 10000):
+        result = await history.delete_many({"case_id": {"$in": case_ids[start:start + 10000]}})
+        history_removed += result.deleted_count
+
+    results = {
+        "cases": await Case.get_motor_collection().delete_many({"case_id": synthetic}),
+        "reports": await IncidentReport.get_motor_collection().delete_many({"report_id": synthetic}),
+        "individuals": await Individual.get_motor_collection().delete_many({"individual_id": synthetic}),
+    }
+    print(f"Removed {history_removed} synthetic history")
+    for name, result in results.items():
+        print(f"Removed {result.deleted_count} synthetic {name}")
+
+
+async def main(args):
+    client, _ = await init_db(BaseConfig(), wait_for_indexes = True)
+    try:
+        if args.reset:
+            await reset()
+        else:
+            generator = Generator(args.seed, args.years)
+            victim_ids = await seed_individuals(generator, args.victims, args.batch_size)
+            await seed_cases(generator, args.cases, args.batch_size, victim_ids)
+            await seed_reports(generator, args.reports, args.batch_size)
+        print("Rebuilding analytics rollups")
+        await rebuild_rollups()
+        print("Rebuilding near-duplicate signatures")
+        await rebuild_signatures()
+        print("Rebuilding case metrics")
+        await rebuild_case_metrics()
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Seed the database with synthetic data for load testing")
+    parser.add_argument("--cases", type = int, default = 100000)
+    parser.add_argument("--reports", type = int, default = 200000)
+    parser.add_argument("--victims", type = int, default = 50000)
+    parser.add_argument("--years", type = int, default = 5, help = "How far back incident dates go")
+    parser.add_argument("--batch-size", type = int, default = 5000)
+    parser.add_argument("--seed", type = int, default = 42, help = "Random seed, for reproducible data sets")
+    parser.add_argument("--reset", action = "store_true", help = "Remove previously seeded documents instead")
+    asyncio.run(main(parser.parse_args()))
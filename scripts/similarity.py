@@ -0,0 +1,28 @@
+"""
+Maintenance command for the near-duplicate signatures behind
+GET /reports/{report_id}/similar, e.g. after importing data directly.
+
+    python -m scripts.similarity rebuild
+"""
+import argparse
+import asyncio
+
+from config import BaseConfig
+from database import init_db
+from services.similarity import rebuild_signatures
+
+
+async def main(args):
+    client, _ = await init_db(BaseConfig(), wait_for_indexes = True)
+    try:
+        counts = await rebuild_signatures(args.batch_size)
+        print(f"Signatures rebuilt: {counts['report']} reports, {counts['case']} cases")
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Rebuild the near-duplicate signatures of reports and cases")
+    parser.add_argument("command", choices = ["rebuild"])
+    parser.add_argument("--batch-size", type = int, default = 1000)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,58 @@
+from collections import Counter
+from datetime import datetime
+from typing import Iterable, Optional
+
+from pymongo import ReturnDocument, UpdateOne
+
+from models.blob import EvidenceBlob
+from services.storage import StoredFile
+
+
+async def find_blob(sha256: str) -> Optional[EvidenceBlob]:
+    """
+    The already stored file with this hash, if there is one. No reference is
+    taken; the caller does that with retain_blobs once the evidence entry
+    pointing at the file has been saved.
+    """
+    document = await EvidenceBlob.get_motor_collection().find_one({"sha256": sha256})
+    return EvidenceBlob.model_validate(document) if document else None
+
+
+async def register_blob(sha256: str, size: int, stored_file: StoredFile) -> EvidenceBlob:
+    """
+    Record a freshly stored file, without a reference. When another upload of
+    the same bytes finished first, its copy wins and is returned.
+    """
+    document = await EvidenceBlob.get_motor_collection().find_one_and_update(
+        {"sha256": sha256},
+        {"$setOnInsert": {"size": size, "type": stored_file.type, "url": stored_file.url,
+                          "created_at": datetime.utcnow(), "ref_count": 0}},
+        upsert = True,
+        return_document = ReturnDocument.AFTER,
+    )
+    return EvidenceBlob.model_validate(document)
+
+
+async def _adjust(hashes: Iterable[Optional[str]], sign: int, session = None):
+    counts = Counter(sha256 for sha256 in hashes if sha256)
+    if counts:
+        await EvidenceBlob.get_motor_collection().bulk_write(
+            [UpdateOne({"sha256": sha256}, {"$inc": {"ref_count": sign * count}}) for sha256, count in counts.items()],
+            ordered = False,
+            session = session
+        )
+
+
+async def retain_blobs(hashes: Iterable[Optional[str]], session = None):
+    """Take one reference per hash, for evidence entries that now point at the files."""
+    await _adjust(hashes, 1, session = session)
+
+
+async def release_blobs(hashes: Iterable[Optional[str]], session = None):
+    """Drop one reference per hash, for evidence entries that no longer count."""
+    await _adjust(hashes, -1, session = session)
+
+
+def referenced_hashes(evidence: Optional[list]) -> list:
+    """Hashes of the stored files a document's evidence entries hold a reference on."""
+    return [entry.sha256 for entry in evidence or [] if entry.status == "ready" and entry.sha256]
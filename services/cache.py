@@ -0,0 +1,163 @@
+import functools
+import json
+import time
+from collections import OrderedDict
+from datetime import date, datetime
+from typing import Any, Optional
+
+from fastapi.encoders import jsonable_encoder
+
+from config import settings
+
+MISSING = object()
+
+
+class MemoryCache:
+    """
+    In-process LRU cache with a per-entry TTL and a bound on the number of entries.
+    """
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    async def generation(self) -> int:
+        return self._generation
+
+    async def get(self, key: str, generation: int) -> Any:
+        entry = self._entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return MISSING
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    async def set(self, key: str, value: Any, generation: int):
+        # Computed from data read before the last invalidation
+        if generation != self._generation:
+            return
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last = False)
+            self.evictions += 1
+
+    async def invalidate(self):
+        self._generation += 1
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        return {
+            "backend": "memory",
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+class RedisCache:
+    """
+    Cache shared by every worker. Invalidation bumps a generation number that
+    is part of each key, so stale entries are simply never read again and
+    expire through their TTL. Needs the optional `redis` package.
+    """
+
+    def __init__(self, url: str, ttl: float, prefix: str = "hrm:analytics"):
+        try:
+            from redis import asyncio as redis_asyncio
+        except ImportError:
+            raise RuntimeError("CACHE_URL is set but the 'redis' package is not installed")
+
+        self.redis = redis_asyncio.from_url(url)
+        self.ttl = ttl
+        self.prefix = prefix
+        self.hits = 0
+        self.misses = 0
+
+    async def generation(self) -> str:
+        generation = await self.redis.get(f"{self.prefix}:generation") or b"0"
+        return generation.decode()
+
+    def _key(self, key: str, generation: str) -> str:
+        return f"{self.prefix}:{generation}:{key}"
+
+    async def get(self, key: str, generation: str) -> Any:
+        raw = await self.redis.get(self._key(key, generation))
+        if raw is None:
+            self.misses += 1
+            return MISSING
+        self.hits += 1
+        return json.loads(raw)
+
+    async def set(self, key: str, value: Any, generation: str):
+        # A value computed before an invalidation lands in the old generation and is never read
+        await self.redis.set(self._key(key, generation), json.dumps(value), ex = max(1, int(self.ttl)))
+
+    async def invalidate(self):
+        await self.redis.incr(f"{self.prefix}:generation")
+
+    def stats(self) -> dict:
+        return {
+            "backend": "redis",
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": None,
+        }
+
+
+def _normalize(value: Any) -> Any:
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return value
+
+
+def cache_key(name: str, params: dict) -> str:
+    """
+    Key a call on its parameters, ignoring unset ones and argument order.
+    """
+    normalized = {k: _normalize(v) for k, v in sorted(params.items()) if v is not None}
+    return f"{name}:{json.dumps(normalized, sort_keys = True, default = str)}"
+
+
+def cached(cache):
+    """
+    Cache the JSON-ready result of an async endpoint, keyed on its arguments.
+    The cache generation is read before the result is computed, so a result
+    that raced with an invalidation is not served afterwards.
+    """
+    def decorator(func):
+        name = f"{func.__module__}.{func.__qualname__}"
+
+        @functools.wraps(func)
+        async def wrapper(**kwargs):
+            key = cache_key(name, kwargs)
+            generation = await cache.generation()
+            result = await cache.get(key, generation)
+            if result is MISSING:
+                result = jsonable_encoder(await func(**kwargs))
+                await cache.set(key, result, generation)
+            return result
+        return wrapper
+    return decorator
+
+
+def build_cache(url: Optional[str], max_entries: int, ttl: float):
+    if url:
+        return RedisCache(url, ttl)
+    return MemoryCache(max_entries, ttl)
+
+
+analytics_cache = build_cache(settings.CACHE_URL, settings.ANALYTICS_CACHE_SIZE, settings.ANALYTICS_CACHE_TTL)
@@ -0,0 +1,435 @@
+"""
+Case workflow metrics: time to resolution, time spent in each status,
+weekly throughput and the backlog per status.
+
+The metrics are kept up to date as cases change rather than computed from
+the whole history on every query:
+
+- CaseFlowRollup holds, per week, country and violation type, the number of
+  cases entering and leaving each status. It also keeps the sum and a
+  log-scale histogram of the durations, from which means and percentiles are
+  read. Bucket b of a histogram covers durations from 2^(b/4) - 1 to
+  2^((b+1)/4) - 1 hours, so a percentile is within 10% or so of the exact
+  value.
+- CaseBacklog counts the open cases per status and country. On every change
+  the new count is also written to the CaseBacklogSnapshot of the day, so the
+  backlog on any date is the last snapshot before it.
+
+rebuild_case_metrics recomputes all of them from the cases and their history.
+"""
+import math
+from collections import Counter, defaultdict
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from pymongo import InsertOne, ReturnDocument, UpdateOne
+
+from models.case import Case, CaseStatusHistory
+from models.rollup import (BacklogPoint, CaseBacklog, CaseBacklogSnapshot, CaseFlowRollup, CaseThroughput,
+                           DurationStats, TimeInStatus)
+
+RESOLVED = "resolved"
+BUCKETS_PER_DOUBLING = 4
+
+
+def _day(value: datetime) -> datetime:
+    return datetime(value.year, value.month, value.day)
+
+
+def week_start(value: datetime) -> datetime:
+    """Monday of the week of `value`."""
+    day = _day(value)
+    return day - timedelta(days = day.weekday())
+
+
+def duration_bucket(seconds: float) -> int:
+    return int(BUCKETS_PER_DOUBLING * math.log2(1 + max(seconds, 0) / 3600))
+
+
+def _bucket_hours(bucket: float) -> float:
+    return 2 ** (bucket / BUCKETS_PER_DOUBLING) - 1
+
+
+def percentile(histogram: Dict[int, int], fraction: float) -> Optional[float]:
+    """Duration in hours below which `fraction` of the histogram lies, interpolated within its bucket."""
+    total = sum(histogram.values())
+    if not total:
+        return None
+    rank = fraction * total
+    seen = 0
+    for bucket in sorted(histogram):
+        count = histogram[bucket]
+        if seen + count >= rank:
+            return round(_bucket_hours(bucket + (rank - seen) / count), 2)
+        seen += count
+    return round(_bucket_hours(max(histogram) + 1), 2)
+
+
+def duration_stats(seconds: float, histogram: Dict[int, int]) -> dict:
+    count = sum(histogram.values())
+    return {
+        "count": count,
+        "mean_hours": round(seconds / count / 3600, 2) if count else None,
+        "p50_hours": percentile(histogram, 0.5),
+        "p90_hours": percentile(histogram, 0.9),
+        "p95_hours": percentile(histogram, 0.95),
+    }
+
+
+class _Changes:
+    """Increments of the flow rollups and backlog counters, written with as few round trips as possible."""
+
+    def __init__(self):
+        self.flows: Dict[tuple, Counter] = defaultdict(Counter)
+        self.backlog = Counter()
+
+    def flow(self, when: datetime, country: str, violation_types: Iterable[str], status: str, **increments):
+        week = week_start(when)
+        for violation_type in [None, *set(violation_types)]:
+            self.flows[(week, country, violation_type, status)].update(increments)
+
+    def entered(self, when: datetime, country: str, violation_types: List[str], status: str):
+        self.flow(when, country, violation_types, status, entered = 1)
+
+    def left(self, when: datetime, country: str, violation_types: List[str], status: str, seconds: Optional[float]):
+        increments = {"left": 1}
+        if seconds is not None:
+            increments.update({"seconds_in_status": seconds, f"in_status_histogram.{duration_bucket(seconds)}": 1})
+        self.flow(when, country, violation_types, status, **increments)
+
+    def resolved(self, when: datetime, country: str, violation_types: List[str], seconds: float):
+        self.flow(when, country, violation_types, RESOLVED,
+                  **{"resolution_seconds": seconds, f"resolution_histogram.{duration_bucket(seconds)}": 1})
+
+    async def write(self):
+        if self.flows:
+            await CaseFlowRollup.get_motor_collection().bulk_write([
+                UpdateOne(
+                    {"week": week, "country": country, "violation_type": violation_type, "status": status},
+                    {"$inc": dict(increments)},
+                    upsert = True
+                )
+                for (week, country, violation_type, status), increments in self.flows.items()
+            ], ordered = False)
+        await _apply_backlog(self.backlog)
+
+
+async def _apply_backlog(deltas: Counter):
+    """
+    Apply changes in open cases per (country, status) to the counters and
+    write each new count to today's snapshot. A snapshot only takes a count
+    with a higher `seq` than its own, so concurrent changes cannot leave an
+    older count behind.
+    """
+    today = _day(datetime.utcnow())
+    operations = []
+    for (country, status), delta in deltas.items():
+        if not delta:
+            continue
+        counter = await CaseBacklog.get_motor_collection().find_one_and_update(
+            {"country": country, "status": status},
+            {"$inc": {"open_cases": delta, "seq": 1}},
+            upsert = True,
+            return_document = ReturnDocument.AFTER
+        )
+        newer = {"$gt": [counter["seq"], {"$ifNull": ["$seq", 0]}]}
+        operations.append(UpdateOne(
+            {"day": today, "country": country, "status": status},
+            [{"$set": {
+                "open_cases": {"$cond": [newer, counter["open_cases"], "$open_cases"]},
+                "seq": {"$cond": [newer, counter["seq"], "$seq"]},
+            }}],
+            upsert = True
+        ))
+    if operations:
+        await CaseBacklogSnapshot.get_motor_collection().bulk_write(operations, ordered = False)
+
+
+async def record_opened(cases: Iterable[Case]):
+    """Count newly created cases into their initial status."""
+    changes = _Changes()
+    for case in cases:
+        if case.is_archived:
+            continue
+        changes.entered(case.date_reported, case.location.country, case.violation_types, case.status)
+        changes.backlog[(case.location.country, case.status)] += 1
+    await changes.write()
+
+
+async def record_archived(case: Case):
+    """Take a case out of the backlog, with the status it had when it was archived."""
+    changes = _Changes()
+    changes.backlog[(case.location.country, case.status)] -= 1
+    await changes.write()
+
+
+async def _last_changes(case_ids: List) -> Dict:
+    cursor = CaseStatusHistory.get_motor_collection().aggregate([
+        {"$match": {"case_id": {"$in": case_ids}}},
+        {"$group": {"_id": "$case_id", "last": {"$max": "$changed_at"}}},
+    ])
+    return {document["_id"]: document["last"] async for document in cursor}
+
+
+async def log_status_changes(rows: List[CaseStatusHistory], backlog: bool = True):
+    """
+    Store status history rows and add them to the metrics. The time each
+    case spent in its previous status is measured from its last logged change,
+    or from its report date for a first change. Changes to archived cases
+    pass backlog=False: they are logged and counted as flows, but archived
+    cases are not part of the backlog.
+
+    Time-series collections take no writes inside transactions, so callers
+    log the changes once their transaction has committed.
+    """
+    if not rows:
+        return
+    last_changes = await _last_changes(list({row.case_id for row in rows}))
+    changes = _Changes()
+    for row in rows:
+        since = last_changes.get(row.case_id) or row.opened_at
+        if since is not None:
+            row.seconds_in_previous_status = max((row.changed_at - since).total_seconds(), 0)
+
+        country = row.country or "unknown"
+        changes.left(row.changed_at, country, row.violation_types, row.previous_status, row.seconds_in_previous_status)
+        changes.entered(row.changed_at, country, row.violation_types, row.new_status)
+        if row.new_status == RESOLVED and row.opened_at is not None:
+            changes.resolved(row.changed_at, country, row.violation_types,
+                             max((row.changed_at - row.opened_at).total_seconds(), 0))
+        if backlog:
+            changes.backlog[(country, row.previous_status)] -= 1
+            changes.backlog[(country, row.new_status)] += 1
+
+    await CaseStatusHistory.insert_many(rows)
+    await changes.write()
+
+
+def _flow_filter(start_date: Optional[date], end_date: Optional[date], country: Optional[str],
+                 violation_type: Optional[str]) -> dict:
+    criteria = {"violation_type": violation_type}
+    weeks = {}
+    if start_date:
+        weeks["$gte"] = week_start(datetime.combine(start_date, datetime.min.time()))
+    if end_date:
+        weeks["$lte"] = datetime.combine(end_date, datetime.min.time())
+    if weeks:
+        criteria["week"] = weeks
+    if country:
+        criteria["country"] = country
+    return criteria
+
+
+def _histogram(stored: Dict[str, int]) -> Counter:
+    return Counter({int(bucket): count for bucket, count in stored.items()})
+
+
+async def resolution_times(start_date: Optional[date] = None, end_date: Optional[date] = None,
+                           country: Optional[str] = None, violation_type: Optional[str] = None) -> DurationStats:
+    """Time from report to resolution of the cases resolved in the weeks from start_date to end_date."""
+    seconds, histogram = 0.0, Counter()
+    criteria = {**_flow_filter(start_date, end_date, country, violation_type), "status": RESOLVED}
+    async for rollup in CaseFlowRollup.get_motor_collection().find(
+            criteria, {"resolution_seconds": 1, "resolution_histogram": 1}):
+        seconds += rollup.get("resolution_seconds", 0)
+        histogram.update(_histogram(rollup.get("resolution_histogram", {})))
+    return DurationStats(**duration_stats(seconds, histogram))
+
+
+async def time_in_status(start_date: Optional[date] = None, end_date: Optional[date] = None,
+                         country: Optional[str] = None, violation_type: Optional[str] = None) -> List[TimeInStatus]:
+    """Time spent in each status by the cases that left it in the weeks from start_date to end_date."""
+    seconds, histograms = Counter(), defaultdict(Counter)
+    async for rollup in CaseFlowRollup.get_motor_collection().find(
+            _flow_filter(start_date, end_date, country, violation_type),
+            {"status": 1, "seconds_in_status": 1, "in_status_histogram": 1}):
+        seconds[rollup["status"]] += rollup.get("seconds_in_status", 0)
+        histograms[rollup["status"]].update(_histogram(rollup.get("in_status_histogram", {})))
+    return [
+        TimeInStatus(status = status, **duration_stats(seconds[status], histogram))
+        for status, histogram in sorted(histograms.items()) if histogram
+    ]
+
+
+async def throughput(start_date: Optional[date] = None, end_date: Optional[date] = None,
+                     country: Optional[str] = None, violation_type: Optional[str] = None) -> List[CaseThroughput]:
+    """
+    Cases entering each status per week, country and violation type. A case
+    with several violation types counts once under each of them.
+    """
+    criteria = _flow_filter(start_date, end_date, country, violation_type)
+    if violation_type is None:
+        criteria["violation_type"] = {"$ne": None}
+    rows: Dict[tuple, Dict[str, int]] = defaultdict(dict)
+    async for rollup in CaseFlowRollup.get_motor_collection().find(
+            criteria, {"week": 1, "country": 1, "violation_type": 1, "status": 1, "entered": 1}):
+        if rollup.get("entered"):
+            key = (rollup["week"], rollup["country"], rollup["violation_type"])
+            rows[key][rollup["status"]] = rollup["entered"]
+    return [
+        CaseThroughput(week = week.date(), country = country, violation_type = violation_type, entered = entered)
+        for (week, country, violation_type), entered in sorted(rows.items())
+    ]
+
+
+async def backlog(start_date: date, end_date: date, granularity: str = "day",
+                  country: Optional[str] = None) -> List[BacklogPoint]:
+    """
+    Open cases per status at the end of each day or week from start_date to
+    end_date. Reads the last snapshot before start_date of each country and
+    status and the snapshots within the range; nothing older.
+    """
+    start = datetime.combine(start_date, datetime.min.time())
+    end = datetime.combine(end_date, datetime.min.time())
+    criteria = {"country": country} if country else {}
+    collection = CaseBacklogSnapshot.get_motor_collection()
+
+    levels: Dict[Tuple[str, str], int] = {}
+    async for level in collection.aggregate([
+        {"$match": {**criteria, "day": {"$lt": start}}},
+        {"$sort": {"country": 1, "status": 1, "day": -1}},
+        {"$group": {"_id": {"country": "$country", "status": "$status"}, "open_cases": {"$first": "$open_cases"}}},
+    ]):
+        levels[(level["_id"]["country"], level["_id"]["status"])] = level["open_cases"]
+
+    snapshots = await collection.find({**criteria, "day": {"$gte": start, "$lte": end}}).sort("day", 1).to_list(None)
+
+    step = timedelta(days = 7 if granularity == "week" else 1)
+    period = week_start(start) if granularity == "week" else start
+    points = []
+    applied = 0
+    while period <= end:
+        period_end = period + step
+        while applied < len(snapshots) and snapshots[applied]["day"] < period_end:
+            snapshot = snapshots[applied]
+            levels[(snapshot["country"], snapshot["status"])] = snapshot["open_cases"]
+            applied += 1
+        counts = Counter()
+        for (_, status), open_cases in levels.items():
+            counts[status] += open_cases
+        points.append(BacklogPoint(day = period.date(), counts = {status: n for status, n in sorted(counts.items()) if n}))
+        period = period_end
+    return points
+
+
+async def rebuild_case_metrics(batch_size: int = 1000) -> dict:
+    """
+    Recompute the flow rollups, backlog counters and snapshots from the cases
+    and their status history. The initial status of a case is the previous
+    status of its first change, or its current status. Archived cases keep
+    their flows but are left out of the backlog, for which no archiving date
+    is known.
+    """
+    cases = {}
+    async for document in Case.get_motor_collection().find(
+            {}, {"location.country": 1, "violation_types": 1, "date_reported": 1, "status": 1, "is_archived": 1}):
+        cases[document["_id"]] = document
+
+    rows = defaultdict(list)
+    async for row in CaseStatusHistory.get_motor_collection().find({}).sort("changed_at", 1):
+        if row["case_id"] in cases:
+            rows[row["case_id"]].append(row)
+
+    changes = _Changes()
+    # (day, country, status) -> change in open cases
+    daily = Counter()
+    for case_id, case in cases.items():
+        country = case["location"]["country"]
+        violation_types = case.get("violation_types") or []
+        reported = case["date_reported"]
+        history = rows.get(case_id, [])
+        status = history[0]["previous_status"] if history else case["status"]
+        changes.entered(reported, country, violation_types, status)
+        if not case.get("is_archived"):
+            daily[(_day(reported), country, status)] += 1
+
+        since = reported
+        for row in history:
+            changed_at = row["changed_at"]
+            changes.left(changed_at, country, violation_types, row["previous_status"],
+                         max((changed_at - since).total_seconds(), 0))
+            changes.entered(changed_at, country, violation_types, row["new_status"])
+            if row["new_status"] == RESOLVED:
+                changes.resolved(changed_at, country, violation_types, max((changed_at - reported).total_seconds(), 0))
+            if not case.get("is_archived"):
+                daily[(_day(changed_at), country, row["previous_status"])] -= 1
+                daily[(_day(changed_at), country, row["new_status"])] += 1
+            since = changed_at
+
+    for model in (CaseFlowRollup, CaseBacklog, CaseBacklogSnapshot):
+        await model.get_motor_collection().delete_many({})
+
+    flows = list(changes.flows.items())
+    for start in range(0, len(flows), batch_size):
+        await CaseFlowRollup.get_motor_collection().bulk_write([
+            InsertOne({"week": week, "country": country, "violation_type": violation_type, "status": status,
+                       **_nested(increments)})
+            for (week, country, violation_type, status), increments in flows[start:start + batch_size]
+        ], ordered = False)
+
+    levels = Counter()
+    snapshots = []
+    for (day, country, status), delta in sorted(daily.items()):
+        levels[(country, status)] += delta
+        snapshots.append({"day": day, "country": country, "status": status,
+                          "open_cases": levels[(country, status)], "seq": 0})
+    for start in range(0, len(snapshots), batch_size):
+        await CaseBacklogSnapshot.get_motor_collection().insert_many(snapshots[start:start + batch_size], ordered = False)
+    if levels:
+        await CaseBacklog.get_motor_collection().insert_many([
+            {"country": country, "status": status, "open_cases": open_cases, "seq": 0}
+            for (country, status), open_cases in levels.items()
+        ])
+    return {"cases": len(cases), "flows": len(flows), "snapshots": len(snapshots)}
+
+
+async def migrate_history(batch_size: int = 1000) -> Optional[int]:
+    """
+    Move a status history stored in a regular collection into a time-series
+    one: the old collection is renamed to <name>_legacy and its rows are
+    copied with the country, violation types and report date of their case.
+    Returns the number of rows copied, or None when the history already is a
+    time-series collection.
+    """
+    collection = CaseStatusHistory.get_motor_collection()
+    database = collection.database
+    existing = await database.list_collections(filter = {"name": collection.name}).to_list(None)
+    if existing and existing[0].get("type") == "timeseries":
+        return None
+
+    legacy = database[f"{collection.name}_legacy"]
+    if existing:
+        await collection.rename(legacy.name)
+    await database.create_collection(**CaseStatusHistory.Settings.timeseries.build_query(collection.name))
+    await collection.create_indexes(CaseStatusHistory.Settings.indexes)
+
+    copied = 0
+    cursor = legacy.find({}, {"_id": 0}).sort("changed_at", 1)
+    while rows := await cursor.to_list(batch_size):
+        cases = {
+            document["_id"]: document
+            async for document in Case.get_motor_collection().find(
+                {"_id": {"$in": list({row["case_id"] for row in rows})}},
+                {"location.country": 1, "violation_types": 1, "date_reported": 1}
+            )
+        }
+        for row in rows:
+            if (case := cases.get(row["case_id"])) is not None:
+                row.setdefault("country", case["location"]["country"])
+                row.setdefault("violation_types", case.get("violation_types") or [])
+                row.setdefault("opened_at", case.get("date_reported"))
+        await collection.insert_many(rows, ordered = False)
+        copied += len(rows)
+    return copied
+
+
+def _nested(increments: Counter) -> dict:
+    """Turn the dotted histogram keys of a flow increment into sub-documents."""
+    document = {}
+    for key, value in increments.items():
+        field, _, bucket = key.partition(".")
+        if bucket:
+            document.setdefault(field, {})[bucket] = value
+        else:
+            document[key] = value
+    return document
@@ -0,0 +1,33 @@
+"""
+Data of the analytics dashboard in two aggregations run side by side,
+instead of a request per panel: rollups.dashboard_pipeline over the incident
+rollups and queries.case_breakdown_pipeline over the cases. Both share the
+date, country and region filters.
+"""
+import asyncio
+from collections import Counter
+from datetime import date
+from typing import Optional
+
+from models.case import Case
+from models.rollup import IncidentRollup
+from services.queries import case_breakdown_pipeline
+from services.rollups import dashboard_pipeline
+
+
+async def dashboard(granularity: str = "month", start_date: Optional[date] = None, end_date: Optional[date] = None,
+                    country: Optional[str] = None, region: Optional[str] = None) -> dict:
+    incidents, groups = await asyncio.gather(
+        IncidentRollup.aggregate(dashboard_pipeline(granularity, start_date, end_date, country, region)).to_list(),
+        Case.aggregate(case_breakdown_pipeline(start_date, end_date, country, region)).to_list(),
+    )
+
+    by_status, by_priority = Counter(), Counter()
+    for group in groups:
+        by_status[group["_id"]["status"]] += group["count"]
+        by_priority[group["_id"]["priority"]] += group["count"]
+    return {
+        **incidents[0],
+        "case_status": dict(by_status.most_common()),
+        "case_priority": dict(by_priority.most_common()),
+    }
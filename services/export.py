@@ -0,0 +1,255 @@
+import asyncio
+import csv
+import io
+import json
+from datetime import datetime
+from typing import AsyncIterator, Callable, Dict, List, Optional
+
+from models.case import Case
+from models.incident import IncidentReport
+from services.ingest import CSV_COLUMNS as REPORT_CSV_COLUMNS
+from services.serialization import dumps
+
+EXPORT_BATCH_SIZE = 1000
+PARQUET_ROW_GROUP_SIZE = 50000
+# Reporter contact details, only exported when asked for explicitly
+CONTACT_COLUMNS = ["contact_email", "contact_phone", "preferred_contact"]
+
+
+def _coordinates(location: Optional[dict]) -> List[Optional[float]]:
+    try:
+        longitude, latitude = location["coordinates"]["coordinates"][:2]
+        return [float(longitude), float(latitude)]
+    except (KeyError, TypeError, ValueError):
+        return [None, None]
+
+
+def _joined(values: Optional[list]) -> str:
+    return ";".join(str(value) for value in values or [])
+
+
+def flatten_case(document: dict) -> dict:
+    location = document.get("location") or {}
+    longitude, latitude = _coordinates(location)
+    perpetrators = document.get("perpetrators") or []
+    return {
+        "id": str(document["_id"]),
+        "case_id": document.get("case_id"),
+        "title": document.get("title"),
+        "description": document.get("description"),
+        "status": document.get("status"),
+        "priority": document.get("priority"),
+        "violation_types": _joined(document.get("violation_types")),
+        "country": location.get("country"),
+        "region": location.get("region"),
+        "longitude": longitude,
+        "latitude": latitude,
+        "date_occurred": document.get("date_occurred"),
+        "date_reported": document.get("date_reported"),
+        "perpetrator_names": _joined(p.get("name") for p in perpetrators),
+        "perpetrator_types": _joined(p.get("type") for p in perpetrators),
+        "victim_count": len(document.get("victims") or []),
+        "is_archived": document.get("is_archived", False),
+    }
+
+
+def flatten_report(document: dict, contacts: bool = False) -> dict:
+    """
+    One row per report. Contact details are only included with `contacts`,
+    and never for reporters who chose to stay anonymous.
+    """
+    details = document.get("incident_details") or {}
+    location = details.get("location") or {}
+    longitude, latitude = _coordinates(location)
+    row = {
+        "report_id": document.get("report_id"),
+        "reporter_type": document.get("reporter_type"),
+        "anonymous": document.get("anonymous", False),
+        "status": document.get("status"),
+        "date": details.get("date"),
+        "country": location.get("country"),
+        "region": location.get("region"),
+        "longitude": longitude,
+        "latitude": latitude,
+        "description": details.get("description"),
+        "violation_types": _joined(details.get("violation_types")),
+        "created_at": document.get("created_at"),
+    }
+    if contacts:
+        contact = {} if document.get("anonymous", False) else document.get("contact_info") or {}
+        row.update({
+            "contact_email": contact.get("email"),
+            "contact_phone": contact.get("phone"),
+            "preferred_contact": contact.get("preferred_contact"),
+        })
+    return row
+
+
+class ExportSpec:
+    """
+    What to read for an export and how to flatten it into one row per document.
+    `types` gives the Parquet column types: 'string', 'float', 'int', 'bool' or 'timestamp'.
+    """
+
+    def __init__(self, model, projection: dict, flatten: Callable[[dict], dict], types: Dict[str, str]):
+        self.model = model
+        self.projection = projection
+        self.flatten = flatten
+        self.types = types
+
+    @property
+    def columns(self) -> List[str]:
+        return list(self.types)
+
+
+CASES = ExportSpec(
+    Case,
+    projection = {"evidence": 0, "created_by": 0, "revision_id": 0},
+    flatten = flatten_case,
+    types = {
+        "id": "string", "case_id": "string", "title": "string", "description": "string",
+        "status": "string", "priority": "string", "violation_types": "string",
+        "country": "string", "region": "string", "longitude": "float", "latitude": "float",
+        "date_occurred": "timestamp", "date_reported": "timestamp",
+        "perpetrator_names": "string", "perpetrator_types": "string",
+        "victim_count": "int", "is_archived": "bool",
+    },
+)
+
+_REPORT_TYPES = {
+    **{column: "string" for column in REPORT_CSV_COLUMNS},
+    "anonymous": "bool", "date": "timestamp", "longitude": "float", "latitude": "float",
+    "created_at": "timestamp",
+}
+
+REPORTS = ExportSpec(
+    IncidentReport,
+    projection = {"evidence": 0, "assigned_to": 0, "revision_id": 0, "contact_info": 0},
+    flatten = flatten_report,
+    types = {column: kind for column, kind in _REPORT_TYPES.items() if column not in CONTACT_COLUMNS},
+)
+
+REPORTS_WITH_CONTACTS = ExportSpec(
+    IncidentReport,
+    projection = {"evidence": 0, "assigned_to": 0, "revision_id": 0},
+    flatten = lambda document: flatten_report(document, contacts = True),
+    types = _REPORT_TYPES,
+)
+
+
+async def _rows(spec: ExportSpec, query: dict) -> AsyncIterator[dict]:
+    cursor = spec.model.get_motor_collection().find(
+        query, spec.projection, batch_size = EXPORT_BATCH_SIZE
+    ).sort("_id", 1)
+    async for document in cursor:
+        yield spec.flatten(document)
+
+
+async def export_csv(spec: ExportSpec, query: dict) -> AsyncIterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames = spec.columns, extrasaction = "ignore")
+    writer.writeheader()
+    rows = 0
+    async for row in _rows(spec, query):
+        writer.writerow({k: v.isoformat() if isinstance(v, datetime) else v for k, v in row.items()})
+        rows += 1
+        if rows % EXPORT_BATCH_SIZE == 0:
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode()
+
+
+async def export_geojson(spec: ExportSpec, query: dict) -> AsyncIterator[bytes]:
+    """
+    A FeatureCollection with one Point feature per document. Documents
+    without usable coordinates get a null geometry.
+    """
+    yield b'{"type": "FeatureCollection", "features": ['
+    separator = b""
+    async for row in _rows(spec, query):
+        longitude, latitude = row.pop("longitude"), row.pop("latitude")
+        geometry = {"type": "Point", "coordinates": [longitude, latitude]} if longitude is not None else None
+        feature = {"type": "Feature", "geometry": geometry, "properties": row}
+        yield separator + dumps(feature)
+        separator = b","
+    yield b"]}"
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write target for pyarrow that hands back whatever was written since the last drain."""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def parquet_supported() -> bool:
+    try:
+        import pyarrow
+    except ImportError:
+        return False
+    return True
+
+
+async def export_parquet(spec: ExportSpec, query: dict) -> AsyncIterator[bytes]:
+    """
+    Columnar export written one row group at a time. Needs the optional
+    `pyarrow` package.
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("Parquet export needs the 'pyarrow' package")
+
+    arrow_types = {
+        "string": pa.string(), "float": pa.float64(), "int": pa.int64(),
+        "bool": pa.bool_(), "timestamp": pa.timestamp("ms"),
+    }
+    schema = pa.schema([(column, arrow_types[kind]) for column, kind in spec.types.items()])
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema)
+
+    # Converting and compressing a row group takes a while; keep it off the event loop
+    def write_group(rows: List[dict]):
+        columns = {column: [row.get(column) for row in rows] for column in spec.columns}
+        for column, kind in spec.types.items():
+            if kind == "string":
+                columns[column] = [None if value is None else str(value) for value in columns[column]]
+        writer.write_table(pa.table(columns, schema = schema))
+
+    rows = []
+    async for row in _rows(spec, query):
+        rows.append(row)
+        if len(rows) >= PARQUET_ROW_GROUP_SIZE:
+            await asyncio.to_thread(write_group, rows)
+            rows = []
+            yield sink.drain()
+    if rows:
+        await asyncio.to_thread(write_group, rows)
+    await asyncio.to_thread(writer.close)
+    yield sink.drain()
+
+
+EXPORTERS = {
+    "csv": (export_csv, "text/csv"),
+    "geojson": (export_geojson, "application/geo+json"),
+    "parquet": (export_parquet, "application/vnd.apache.parquet"),
+}
@@ -0,0 +1,77 @@
+from typing import List, Optional, Sequence, Type
+
+from fastapi import HTTPException, Query, Response, status
+from pydantic import BaseModel
+
+from services.serialization import dumps
+
+HIDDEN_FIELDS = {"revision_id"}
+
+
+def _field_names(model: Type[BaseModel]) -> List[str]:
+    return [field.alias or name for name, field in model.model_fields.items() if name not in HIDDEN_FIELDS]
+
+
+def model_paths(model: Type[BaseModel], prefix: str = "") -> List[str]:
+    """Dotted paths of a model's fields, descending into nested models."""
+    paths = []
+    for name, field in model.model_fields.items():
+        key = prefix + (field.alias or name)
+        annotation = field.annotation
+        if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+            paths.extend(model_paths(annotation, key + "."))
+        else:
+            paths.append(key)
+    return paths
+
+
+class FieldSelection:
+    """
+    The `fields` query parameter as a MongoDB projection, usable as a FastAPI
+    dependency. Takes a comma-separated list of fields (dotted paths such as
+    location.country are allowed) or 'summary' for the fields of the summary
+    model. `always` fields are returned regardless. Without `fields` the
+    dependency gives None and the endpoint returns full documents.
+    """
+
+    def __init__(self, model: Type[BaseModel], summary: Type[BaseModel], always: Sequence[str] = ("_id",)):
+        self.allowed = set(_field_names(model))
+        self.summary = model_paths(summary)
+        self.always = list(always)
+
+    def __call__(
+        self,
+        fields: Optional[str] = Query(None, description = "Comma-separated fields to return, e.g. case_id,status,location, or 'summary'"),
+    ) -> Optional[dict]:
+        if not fields:
+            return None
+
+        if fields.strip() == "summary":
+            names = self.summary
+        else:
+            names = [name.strip() for name in fields.split(",") if name.strip()]
+            unknown = sorted({name for name in names if name.split(".")[0] not in self.allowed})
+            if unknown:
+                raise HTTPException(
+                    status_code = status.HTTP_400_BAD_REQUEST,
+                    detail = f"Unknown fields: {', '.join(unknown)}."
+                )
+
+        selected = set(names) | set(self.always)
+        # MongoDB rejects a projection holding both a path and one of its sub-paths
+        return {
+            name: 1 for name in sorted(selected)
+            if not any(name.startswith(parent + ".") for parent in selected)
+        }
+
+
+def sparse_response(documents: List[dict], headers: Optional[dict] = None) -> Response:
+    """
+    JSON response for projected documents. They are written as stored,
+    without going through the (full) response model.
+    """
+    return Response(
+        dumps(documents),
+        media_type = "application/json",
+        headers = headers,
+    )
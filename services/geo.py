@@ -0,0 +1,121 @@
+import json
+import math
+from typing import List, Optional
+
+from fastapi import HTTPException, Query, status
+
+EARTH_RADIUS_KM = 6378.1
+# Longest bbox edge along a parallel, in degrees, before it is split
+BBOX_STEP = 1.0
+
+
+def distance_km(a: List[float], b: List[float]) -> float:
+    """Great-circle distance between two [lng, lat] points."""
+    lng1, lat1, lng2, lat2 = map(math.radians, (*a, *b))
+    h = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(h)))
+
+
+class GeoFilter:
+    """
+    Query parameters for spatial filtering, usable as a FastAPI dependency.
+
+    All filters use $geoWithin so they are served by the 2dsphere index and
+    can be combined with the other filters and with any sort order. GeoJSON
+    polygon edges are geodesics, so the bbox polygon gets a vertex every
+    BBOX_STEP degrees along its north and south edges to follow the parallels.
+    """
+
+    def __init__(
+        self,
+        near_lng: Optional[float] = Query(None, ge = -180, le = 180, description = "Longitude of the search centre"),
+        near_lat: Optional[float] = Query(None, ge = -90, le = 90, description = "Latitude of the search centre"),
+        radius_km: Optional[float] = Query(None, gt = 0, le = 20000, description = "Search radius around near_lng/near_lat"),
+        polygon: Optional[str] = Query(None, description = "JSON list of [lng, lat] vertices, e.g. [[35.1,31.8],[35.3,31.8],[35.2,32.0]]"),
+        bbox: Optional[str] = Query(None, description = "min_lng,min_lat,max_lng,max_lat"),
+    ):
+        self.near = None
+        self.radius_km = radius_km
+        self.polygon = self._parse_polygon(polygon) if polygon else None
+        self.bbox = self._parse_bbox(bbox) if bbox else None
+
+        if near_lng is not None or near_lat is not None or radius_km is not None:
+            if near_lng is None or near_lat is None or radius_km is None:
+                raise HTTPException(
+                    status_code = status.HTTP_400_BAD_REQUEST,
+                    detail = "near_lng, near_lat and radius_km must be given together."
+                )
+            self.near = [near_lng, near_lat]
+
+    @staticmethod
+    def _check_point(lng: float, lat: float, name: str):
+        if not (math.isfinite(lng) and math.isfinite(lat) and -180 <= lng <= 180 and -90 <= lat <= 90):
+            raise HTTPException(
+                status_code = status.HTTP_400_BAD_REQUEST,
+                detail = f"{name} coordinates must be finite, with longitudes within ±180 and latitudes within ±90."
+            )
+
+    @staticmethod
+    def _parse_polygon(raw: str) -> List[List[float]]:
+        try:
+            ring = [[float(lng), float(lat)] for lng, lat in json.loads(raw)]
+        except (ValueError, TypeError):
+            raise HTTPException(
+                status_code = status.HTTP_400_BAD_REQUEST,
+                detail = "polygon must be a JSON list of [lng, lat] pairs."
+            )
+        for lng, lat in ring:
+            GeoFilter._check_point(lng, lat, "polygon")
+        if ring and ring[0] != ring[-1]:
+            ring.append(ring[0])
+        if len(ring) < 4:
+            raise HTTPException(
+                status_code = status.HTTP_400_BAD_REQUEST,
+                detail = "polygon needs at least three distinct vertices."
+            )
+        return ring
+
+    @staticmethod
+    def _parse_bbox(raw: str) -> List[float]:
+        try:
+            min_lng, min_lat, max_lng, max_lat = (float(part) for part in raw.split(","))
+        except ValueError:
+            raise HTTPException(
+                status_code = status.HTTP_400_BAD_REQUEST,
+                detail = "bbox must be min_lng,min_lat,max_lng,max_lat."
+            )
+        GeoFilter._check_point(min_lng, min_lat, "bbox")
+        GeoFilter._check_point(max_lng, max_lat, "bbox")
+        if min_lng >= max_lng or min_lat >= max_lat:
+            raise HTTPException(
+                status_code = status.HTTP_400_BAD_REQUEST,
+                detail = "bbox minimums must be smaller than its maximums."
+            )
+        return [min_lng, min_lat, max_lng, max_lat]
+
+    def queries(self, field: str) -> List[dict]:
+        """
+        Mongo filter documents for the requested spatial constraints on `field`.
+        """
+        result = []
+        if self.near:
+            result.append({field: {"$geoWithin": {
+                "$centerSphere": [self.near, self.radius_km / EARTH_RADIUS_KM]
+            }}})
+        if self.polygon:
+            result.append({field: {"$geoWithin": {
+                "$geometry": {"type": "Polygon", "coordinates": [self.polygon]}
+            }}})
+        if self.bbox:
+            result.append({field: {"$geoWithin": {
+                "$geometry": {"type": "Polygon", "coordinates": [self._bbox_ring()]}
+            }}})
+        return result
+
+    def _bbox_ring(self) -> List[List[float]]:
+        min_lng, min_lat, max_lng, max_lat = self.bbox
+        steps = max(1, math.ceil((max_lng - min_lng) / BBOX_STEP))
+        lngs = [min_lng + (max_lng - min_lng) * i / steps for i in range(steps + 1)]
+        south = [[lng, min_lat] for lng in lngs]
+        north = [[lng, max_lat] for lng in reversed(lngs)]
+        return south + north + [south[0]]
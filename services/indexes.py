@@ -0,0 +1,73 @@
+import logging
+from contextlib import contextmanager
+from typing import Dict, List, Type
+
+from beanie import Document
+from pymongo import IndexModel
+
+logger = logging.getLogger(__name__)
+
+
+@contextmanager
+def deferred_index_builds(document_models: List[Type[Document]]):
+    """
+    Hide the declared `Settings.indexes` from init_beanie so that it does not
+    block startup building them. Yields the declarations so they can be built
+    afterwards with build_indexes.
+    """
+    declared = {}
+    for model in document_models:
+        settings_class = getattr(model, "Settings", None)
+        declared[model] = list(getattr(settings_class, "indexes", []) or [])
+        if settings_class is not None:
+            settings_class.indexes = []
+    try:
+        yield declared
+    finally:
+        for model, indexes in declared.items():
+            if hasattr(model, "Settings"):
+                model.Settings.indexes = indexes
+
+
+async def build_indexes(declared: Dict[Type[Document], List[IndexModel]]):
+    """
+    Create the declared indexes one at a time. Existing indexes with the same
+    specification are left untouched by MongoDB, and an index that fails to
+    build is logged without holding up the others.
+    """
+    for model, indexes in declared.items():
+        collection = model.get_motor_collection()
+        for index in indexes:
+            name = index.document["name"]
+            try:
+                await collection.create_indexes([index])
+                logger.info("Index ready on %s: %s", collection.name, name)
+            except Exception:
+                logger.exception("Index build failed on %s: %s", collection.name, name)
+
+
+async def index_report(document_models: List[Type[Document]]) -> List[dict]:
+    """
+    Compare declared indexes with the ones present on each collection.
+
+    `missing` are declared but not built (yet), `unused` exist but have not
+    served a single operation since the server last started, and
+    `undeclared` exist on the collection without being declared on the model.
+    """
+    report = []
+    for model in document_models:
+        collection = model.get_motor_collection()
+        declared = {index.document["name"] for index in getattr(model.Settings, "indexes", [])}
+
+        existing = await collection.index_information()
+        stats = await collection.aggregate([{"$indexStats": {}}]).to_list(length = None)
+        usage = {stat["name"]: stat["accesses"]["ops"] for stat in stats}
+
+        report.append({
+            "collection": collection.name,
+            "missing": sorted(declared - existing.keys()),
+            "unused": sorted(name for name in existing if name != "_id_" and usage.get(name, 0) == 0),
+            "undeclared": sorted(name for name in existing if name != "_id_" and name not in declared),
+            "usage": usage,
+        })
+    return report
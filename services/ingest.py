@@ -0,0 +1,243 @@
+import csv
+import json
+from typing import AsyncIterator, List, Optional, Tuple
+
+from pydantic import ValidationError
+from pymongo.errors import BulkWriteError
+
+from config import settings
+from models.incident import BulkIngestError, BulkIngestResult, IncidentReport
+from services import rollups, similarity
+from services.cache import analytics_cache
+from services.search import REPORTS, search_backend
+
+# (line number, parsed record, parse error)
+Record = Tuple[int, Optional[dict], Optional[str]]
+
+CSV_COLUMNS = [
+    "report_id", "reporter_type", "anonymous", "status", "date", "country", "region",
+    "longitude", "latitude", "description", "violation_types",
+    "contact_email", "contact_phone", "preferred_contact",
+]
+
+
+class UndecodableLine(str):
+    """A line that is not valid UTF-8, standing in for it with the decode error."""
+
+
+def _decode(line: bytes) -> str:
+    try:
+        return line.decode("utf-8").rstrip("\r")
+    except UnicodeDecodeError as e:
+        return UndecodableLine(f"Invalid UTF-8: {e}")
+
+
+async def iter_text_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """
+    Split a stream of byte chunks (a request body or a file) into text lines.
+    Only each new chunk is split; the unfinished last line is carried over.
+    Lines that are not valid UTF-8 come out as UndecodableLine.
+    """
+    tail: List[bytes] = []
+    async for chunk in chunks:
+        *lines, last = chunk.split(b"\n")
+        if lines:
+            lines[0] = b"".join(tail) + lines[0]
+            tail = []
+            for line in lines:
+                yield _decode(line)
+        tail.append(last)
+    if pending := b"".join(tail):
+        yield _decode(pending)
+
+
+async def ndjson_records(lines: AsyncIterator[str]) -> AsyncIterator[Record]:
+    line_number = 0
+    async for line in lines:
+        line_number += 1
+        if isinstance(line, UndecodableLine):
+            yield line_number, None, line
+            continue
+        if not line.strip():
+            continue
+        try:
+            yield line_number, json.loads(line), None
+        except ValueError as e:
+            yield line_number, None, f"Invalid JSON: {e}"
+
+
+def csv_row_to_record(row: dict) -> dict:
+    """
+    Turn a flat CSV row into the nested IncidentReport layout.
+    violation_types are separated by ';'.
+    """
+    record = {
+        "report_id": row.get("report_id"),
+        "incident_details": {
+            "date": row.get("date"),
+            "location": {
+                "country": row.get("country"),
+                "region": row.get("region"),
+                "coordinates": {
+                    "type": "Point",
+                    "coordinates": [float(row.get("longitude")), float(row.get("latitude"))],
+                },
+            },
+            "description": row.get("description"),
+            "violation_types": [v.strip() for v in (row.get("violation_types") or "").split(";") if v.strip()],
+        },
+    }
+    if row.get("reporter_type"):
+        record["reporter_type"] = row["reporter_type"]
+    if row.get("anonymous"):
+        record["anonymous"] = row["anonymous"].strip().lower() in ("1", "true", "yes")
+    if row.get("status"):
+        record["status"] = row["status"]
+    if row.get("contact_email") or row.get("contact_phone"):
+        record["contact_info"] = {
+            "email": row.get("contact_email") or None,
+            "phone": row.get("contact_phone") or None,
+            "preferred_contact": row.get("preferred_contact") or "email",
+        }
+    return record
+
+
+async def csv_records(lines: AsyncIterator[str]) -> AsyncIterator[Record]:
+    """
+    Parse CSV with a header row. Quoted fields may span several lines.
+    """
+    header = None
+    pending: List[str] = []
+    start_line = line_number = 0
+    async for line in lines:
+        line_number += 1
+        if not pending:
+            start_line = line_number
+        if isinstance(line, UndecodableLine):
+            # The record the line belongs to cannot be parsed, nor a header from it
+            pending = []
+            if header is None:
+                header = []
+            yield start_line, None, line
+            continue
+        pending.append(line)
+        # An odd number of quotes means a quoted field continues on the next line
+        if sum(part.count('"') for part in pending) % 2:
+            continue
+
+        text = "\n".join(pending)
+        pending = []
+        if not text.strip():
+            continue
+
+        values = next(csv.reader([text]))
+        if header is None:
+            header = [column.strip() for column in values]
+            continue
+
+        try:
+            yield start_line, csv_row_to_record(dict(zip(header, values))), None
+        except (TypeError, ValueError) as e:
+            yield start_line, None, f"Invalid row: {e}"
+
+    if pending:
+        yield start_line, None, "Unterminated quoted field"
+
+
+class _Ingest:
+    def __init__(self, chunk_size: int):
+        self.chunk_size = chunk_size
+        self.result = BulkIngestResult()
+        self.collection = IncidentReport.get_motor_collection()
+
+    def error(self, line: int, report_id: Optional[str], message: str):
+        if len(self.result.errors) < settings.INGEST_MAX_ERRORS:
+            self.result.errors.append(BulkIngestError(line = line, report_id = report_id, error = message))
+        else:
+            self.result.errors_truncated = True
+
+    async def flush(self, batch: List[Tuple[int, IncidentReport]]):
+        unique = {}
+        for line, report in batch:
+            if report.report_id in unique:
+                self.result.duplicates += 1
+                self.error(line, report.report_id, f"Duplicate report_id, first seen on line {unique[report.report_id][0]}")
+            else:
+                unique[report.report_id] = (line, report)
+
+        existing = self.collection.find({"report_id": {"$in": list(unique)}}, {"report_id": 1, "_id": 0})
+        async for document in existing:
+            line, _ = unique.pop(document["report_id"])
+            self.result.duplicates += 1
+            self.error(line, document["report_id"], "report_id already exists")
+
+        pending = list(unique.values())
+        if not pending:
+            return
+
+        documents = [report.model_dump(exclude = {"id", "revision_id"}) for _, report in pending]
+        failed = set()
+        try:
+            await self.collection.insert_many(documents, ordered = False)
+        except BulkWriteError as e:
+            for write_error in e.details.get("writeErrors", []):
+                failed.add(write_error["index"])
+                line, report = pending[write_error["index"]]
+                if write_error.get("code") == 11000:
+                    self.result.duplicates += 1
+                    self.error(line, report.report_id, "report_id already exists")
+                else:
+                    self.result.invalid += 1
+                    self.error(line, report.report_id, write_error.get("errmsg", "Write failed"))
+
+        # insert_many set the _id of each stored document
+        for (_, report), document in zip(pending, documents):
+            report.id = document["_id"]
+        inserted = [report for index, (_, report) in enumerate(pending) if index not in failed]
+        self.result.inserted += len(inserted)
+        await rollups.record_reports(inserted)
+        await similarity.record_reports(inserted)
+        search_backend.index(REPORTS, [document for index, document in enumerate(documents) if index not in failed])
+
+    async def run(self, records: AsyncIterator[Record]) -> BulkIngestResult:
+        batch = []
+        async for line, record, parse_error in records:
+            self.result.received += 1
+            if parse_error:
+                self.result.invalid += 1
+                self.error(line, None, parse_error)
+                continue
+
+            try:
+                report = IncidentReport.model_validate(record)
+            except ValidationError as e:
+                self.result.invalid += 1
+                report_id = record.get("report_id") if isinstance(record, dict) else None
+                self.error(line, report_id, "; ".join(
+                    f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors()
+                ))
+                continue
+
+            batch.append((line, report))
+            if len(batch) >= self.chunk_size:
+                await self.flush(batch)
+                batch = []
+
+        if batch:
+            await self.flush(batch)
+        if self.result.inserted:
+            await analytics_cache.invalidate()
+        return self.result
+
+
+async def ingest_reports(chunks: AsyncIterator[bytes], file_format: str, chunk_size: int) -> BulkIngestResult:
+    """
+    Validate and insert incident reports streamed as NDJSON or CSV.
+
+    Reports are inserted with unordered insert_many in chunks of chunk_size,
+    after one $in lookup per chunk to skip report_ids that already exist.
+    Problems are reported per input line instead of failing the whole upload.
+    """
+    lines = iter_text_lines(chunks)
+    records = csv_records(lines) if file_format == "csv" else ndjson_records(lines)
+    return await _Ingest(chunk_size).run(records)
@@ -0,0 +1,291 @@
+import asyncio
+import hashlib
+import logging
+import tempfile
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple, Type
+
+from beanie import Document, PydanticObjectId
+from fastapi import UploadFile
+from motor.motor_asyncio import AsyncIOMotorGridFSBucket
+from pydantic import BaseModel
+from pymongo import ReturnDocument
+from starlette.datastructures import Headers
+
+from config import settings
+from models.job import EvidenceJob
+from services.blobs import find_blob, register_blob, release_blobs, retain_blobs
+from services.storage import evidence_storage, resource_type_for
+
+logger = logging.getLogger(__name__)
+
+SPOOL_BUCKET = "evidence_spool"
+
+
+def _spool_bucket() -> AsyncIOMotorGridFSBucket:
+    database = EvidenceJob.get_motor_collection().database
+    return AsyncIOMotorGridFSBucket(database, bucket_name = SPOOL_BUCKET)
+
+
+class SpooledFile(BaseModel):
+    file_id: PydanticObjectId
+    sha256: str
+    size: int
+    filename: Optional[str] = None
+    content_type: Optional[str] = None
+
+
+async def prepare_evidence(upload: UploadFile, evidence_model: Type[BaseModel], **fields) -> Tuple[BaseModel, Optional[SpooledFile]]:
+    """
+    Stream an upload into the GridFS spool while hashing it.
+
+    If a file with the same SHA-256 is already stored, the spool is dropped
+    and a ready evidence entry pointing at the existing file is returned; the
+    caller takes the reference with retain_blobs when it saves the entry.
+    Otherwise the entry is 'pending' and the spooled file must be handed to
+    enqueue_evidence once the entry has been saved.
+    """
+    bucket = _spool_bucket()
+    grid_in = bucket.open_upload_stream(
+        upload.filename or "evidence",
+        metadata = {"content_type": upload.content_type},
+    )
+    digest = hashlib.sha256()
+    size = 0
+    while chunk := await upload.read(settings.EVIDENCE_CHUNK_SIZE):
+        digest.update(chunk)
+        size += len(chunk)
+        await grid_in.write(chunk)
+    await grid_in.close()
+    sha256 = digest.hexdigest()
+
+    if (blob := await find_blob(sha256)) is not None:
+        await bucket.delete(grid_in._id)
+        evidence = evidence_model(type = blob.type, url = blob.url, sha256 = sha256, size = size, **fields)
+        return evidence, None
+
+    evidence = evidence_model(
+        type = resource_type_for(upload.content_type),
+        status = "pending",
+        job_id = PydanticObjectId(),
+        sha256 = sha256,
+        size = size,
+        **fields
+    )
+    spooled = SpooledFile(
+        file_id = grid_in._id,
+        sha256 = sha256,
+        size = size,
+        filename = upload.filename,
+        content_type = upload.content_type,
+    )
+    return evidence, spooled
+
+
+def reset_client_evidence(entries: Optional[list]) -> Optional[list]:
+    """
+    Drop the stored-file fields of evidence entries taken from a request
+    body. Only prepare_evidence links an entry to a stored file, so a client
+    can neither claim someone else's file nor take a reference on it.
+    """
+    if not entries:
+        return entries
+    return [
+        entry.model_copy(update = {"sha256": None, "size": None, "job_id": None, "status": "ready"})
+        for entry in entries
+    ]
+
+
+async def discard_spooled(spooled: Optional[SpooledFile]):
+    """Delete a spooled upload whose evidence entry could not be saved."""
+    if spooled is not None:
+        await _spool_bucket().delete(spooled.file_id)
+
+
+async def enqueue_evidence(spooled: SpooledFile, target: Type[Document], target_id: PydanticObjectId,
+                           evidence, folder: str) -> EvidenceJob:
+    """
+    Record a pending upload job for a spooled file. The caller stores the
+    pending `evidence` entry on the target document first; the job reuses its
+    evidence_id and job_id. If the job cannot be recorded, the entry and the
+    spooled file are removed again before the error is raised, so no entry is
+    left pending without a job.
+    """
+    job = EvidenceJob(
+        id = evidence.job_id,
+        target = target.get_collection_name(),
+        target_id = target_id,
+        evidence_id = evidence.evidence_id,
+        file_id = spooled.file_id,
+        sha256 = spooled.sha256,
+        size = spooled.size,
+        filename = spooled.filename,
+        content_type = spooled.content_type,
+        folder = folder,
+    )
+    try:
+        await job.create()
+    except Exception:
+        await target.get_motor_collection().update_one(
+            {"_id": target_id}, {"$pull": {"evidence": {"evidence_id": evidence.evidence_id}}}
+        )
+        await discard_spooled(spooled)
+        raise
+    evidence_queue.notify()
+    return job
+
+
+class EvidenceQueue:
+    """
+    Worker pool that moves spooled evidence files to evidence storage.
+
+    Jobs live in the evidence_jobs collection and are claimed atomically with
+    a lease, so several API workers can share the queue and jobs held by a
+    worker that died are picked up again once the lease expires. Failed
+    uploads are retried with exponential backoff.
+    """
+
+    def __init__(self, workers: int, max_attempts: int, retry_delay: float, lease: float, poll_interval: float):
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.lease = lease
+        self.poll_interval = poll_interval
+        self._wakeup = asyncio.Event()
+        self._tasks: List[asyncio.Task] = []
+
+    def start(self):
+        self._tasks = [asyncio.create_task(self._run()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions = True)
+        self._tasks = []
+
+    def notify(self):
+        self._wakeup.set()
+
+    async def _claim(self) -> Optional[EvidenceJob]:
+        now = datetime.utcnow()
+        document = await EvidenceJob.get_motor_collection().find_one_and_update(
+            {"$or": [
+                {"status": "pending", "next_attempt_at": {"$lte": now}},
+                {"status": "running", "locked_until": {"$lt": now}},
+            ]},
+            {"$set": {"status": "running", "locked_until": now + timedelta(seconds = self.lease)},
+             "$inc": {"attempts": 1}},
+            sort = [("next_attempt_at", 1)],
+            return_document = ReturnDocument.AFTER,
+        )
+        return EvidenceJob.model_validate(document) if document else None
+
+    async def _run(self):
+        while True:
+            try:
+                job = await self._claim()
+            except Exception:
+                logger.exception("Could not claim an evidence job")
+                job = None
+
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout = self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            try:
+                await self._process(job)
+            except Exception:
+                # The job stays 'running' and is claimed again once its lease expires
+                logger.exception("Evidence job %s failed unexpectedly", job.id)
+
+    async def _process(self, job: EvidenceJob):
+        bucket = _spool_bucket()
+        # An identical file may have been stored since this job was queued
+        if job.sha256 and (blob := await find_blob(job.sha256)) is not None:
+            await self._complete(job, blob.url, blob.type)
+            return
+
+        try:
+            with tempfile.SpooledTemporaryFile(max_size = settings.EVIDENCE_CHUNK_SIZE) as spooled:
+                grid_out = await bucket.open_download_stream(job.file_id)
+                while chunk := await grid_out.read(settings.EVIDENCE_CHUNK_SIZE):
+                    spooled.write(chunk)
+                spooled.seek(0)
+
+                upload = UploadFile(
+                    spooled,
+                    filename = job.filename,
+                    headers = Headers({"content-type": job.content_type or "application/octet-stream"}),
+                )
+                stored_file = await evidence_storage.save(upload, folder = job.folder)
+        except Exception as e:
+            await self._fail(job, e)
+            return
+
+        if job.sha256:
+            blob = await register_blob(job.sha256, job.size, stored_file)
+            await self._complete(job, blob.url, blob.type)
+        else:
+            await self._complete(job, stored_file.url, stored_file.type)
+
+    async def _complete(self, job: EvidenceJob, url: str, resource_type: str):
+        await self._ready_evidence(job, url, resource_type)
+        await EvidenceJob.get_motor_collection().update_one(
+            {"_id": job.id},
+            {"$set": {"status": "done", "finished_at": datetime.utcnow(), "locked_until": None, "last_error": None}}
+        )
+        await _spool_bucket().delete(job.file_id)
+
+    async def _fail(self, job: EvidenceJob, error: Exception):
+        logger.warning("Evidence job %s failed (attempt %s): %s", job.id, job.attempts, error)
+        update = {"last_error": str(error), "locked_until": None}
+        if job.attempts >= self.max_attempts:
+            # The spooled file is kept so the upload can be retried by hand
+            update.update(status = "failed", finished_at = datetime.utcnow())
+            await self._patch_evidence(job, {"status": "failed"})
+        else:
+            delay = self.retry_delay * 2 ** (job.attempts - 1)
+            update.update(status = "pending", next_attempt_at = datetime.utcnow() + timedelta(seconds = delay))
+        await EvidenceJob.get_motor_collection().update_one({"_id": job.id}, {"$set": update})
+
+    async def _ready_evidence(self, job: EvidenceJob, url: str, resource_type: str):
+        """
+        Point the pending entry at the stored file and take its blob reference.
+        The reference is taken first and released again when no entry of a
+        live owner was readied: the entry was already completed by an earlier
+        attempt, the owner is gone or archived, or the patch failed.
+        """
+        hashes = [job.sha256]
+        await retain_blobs(hashes)
+        try:
+            document = await EvidenceJob.get_motor_collection().database[job.target].find_one_and_update(
+                {"_id": job.target_id, "evidence": {"$elemMatch": {"evidence_id": job.evidence_id, "status": "pending"}}},
+                {"$set": {"evidence.$.url": url, "evidence.$.type": resource_type, "evidence.$.status": "ready"}},
+                projection = {"is_archived": 1},
+            )
+        except Exception:
+            await release_blobs(hashes)
+            raise
+        if document is None or document.get("is_archived"):
+            await release_blobs(hashes)
+
+    @staticmethod
+    async def _patch_evidence(job: EvidenceJob, fields: dict):
+        collection = EvidenceJob.get_motor_collection().database[job.target]
+        await collection.update_one(
+            {"_id": job.target_id, "evidence.evidence_id": job.evidence_id},
+            {"$set": {f"evidence.$.{key}": value for key, value in fields.items()}}
+        )
+
+
+evidence_queue = EvidenceQueue(
+    workers = settings.EVIDENCE_WORKERS,
+    max_attempts = settings.EVIDENCE_MAX_ATTEMPTS,
+    retry_delay = settings.EVIDENCE_RETRY_DELAY,
+    lease = settings.EVIDENCE_JOB_LEASE,
+    poll_interval = settings.EVIDENCE_POLL_INTERVAL,
+)
@@ -0,0 +1,50 @@
+from typing import Dict, Iterable, Set
+
+from beanie import PydanticObjectId
+from pymongo import UpdateMany
+
+from models.victim import Individual
+
+
+async def missing_individuals(individual_ids: Iterable[PydanticObjectId], session = None) -> Set[PydanticObjectId]:
+    """
+    Return the ids that match no Individual, using a single $in query.
+    """
+    wanted = set(individual_ids)
+    if not wanted:
+        return set()
+
+    found = Individual.get_motor_collection().find(
+        {"_id": {"$in": list(wanted)}}, {"_id": 1}, session = session
+    )
+    return wanted - {document["_id"] async for document in found}
+
+
+async def apply_victim_links(
+    added: Dict[PydanticObjectId, Iterable[PydanticObjectId]],
+    removed: Dict[PydanticObjectId, Iterable[PydanticObjectId]] = None,
+    session = None,
+):
+    """
+    Add and remove case references on Individual.cases_involved for any number
+    of cases with one bulk write: an $addToSet and a $pull per case.
+    Both arguments map a case id to the individuals to link or unlink.
+    """
+    operations = []
+    for case_id, individual_ids in added.items():
+        individual_ids = list(individual_ids)
+        if individual_ids:
+            operations.append(UpdateMany(
+                {"_id": {"$in": individual_ids}},
+                {"$addToSet": {"cases_involved": case_id}}
+            ))
+    for case_id, individual_ids in (removed or {}).items():
+        individual_ids = list(individual_ids)
+        if individual_ids:
+            operations.append(UpdateMany(
+                {"_id": {"$in": individual_ids}},
+                {"$pull": {"cases_involved": case_id}}
+            ))
+
+    if operations:
+        await Individual.get_motor_collection().bulk_write(operations, ordered = False, session = session)
@@ -0,0 +1,57 @@
+import base64
+import json
+from datetime import datetime
+from typing import Any, AsyncIterator, Optional, Tuple
+
+from bson import ObjectId
+from fastapi import HTTPException, status
+
+from services.serialization import dumps
+
+
+def encode_cursor(sort_value: datetime, document_id: ObjectId) -> str:
+    """
+    Build an opaque cursor pointing at the last document of a page.
+    """
+    payload = json.dumps({"v": sort_value.isoformat(), "id": str(document_id)})
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, ObjectId]:
+    """
+    Reverse of encode_cursor. Raises a 400 if the cursor was tampered with.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(payload["v"]), ObjectId(payload["id"])
+    except Exception:
+        raise HTTPException(
+            status_code = status.HTTP_400_BAD_REQUEST,
+            detail = "Invalid pagination cursor."
+        )
+
+
+def keyset_filter(sort_field: str, cursor: Optional[str]) -> Optional[dict]:
+    """
+    Filter selecting the documents that come after the cursor when sorting
+    by (sort_field, _id) in descending order.
+    """
+    if not cursor:
+        return None
+
+    sort_value, document_id = decode_cursor(cursor)
+    return {
+        "$or": [
+            {sort_field: {"$lt": sort_value}},
+            {sort_field: sort_value, "_id": {"$lt": document_id}},
+        ]
+    }
+
+
+async def stream_ndjson(motor_cursor) -> AsyncIterator[bytes]:
+    """
+    Write each document of a Motor cursor as one JSON line as soon as it arrives.
+    """
+    async for document in motor_cursor:
+        yield dumps(document) + b"\n"
@@ -0,0 +1,236 @@
+import contextvars
+import json
+import logging
+import random
+import time
+from collections import Counter as CountMap
+from typing import Dict, List, Optional, Tuple
+
+from pymongo import monitoring
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+# Where each command keeps the part that decides its plan
+FILTER_FIELDS = {
+    "find": "filter",
+    "count": "query",
+    "distinct": "query",
+    "findAndModify": "query",
+    "aggregate": "pipeline",
+    "update": "updates",
+    "delete": "deletes",
+}
+EXPLAINABLE = set(FILTER_FIELDS)
+# Session and cluster fields the driver adds, which explain does not accept
+DRIVER_FIELDS = {"lsid", "txnNumber", "autocommit", "startTransaction", "readConcern", "writeConcern"}
+EXPLAIN_CACHE_SIZE = 1000
+
+
+def _shape(value):
+    """Replace values with '?' so queries differing only in values compare equal."""
+    if isinstance(value, dict):
+        return {key: _shape(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        if any(isinstance(item, (dict, list, tuple)) for item in value):
+            return [_shape(item) for item in value]
+        return "?"
+    return "?"
+
+
+def command_collection(command_name: str, command: dict) -> str:
+    if command_name == "getMore":
+        return command.get("collection", "")
+    target = command.get(command_name)
+    return target if isinstance(target, str) else ""
+
+
+def query_shape(command_name: str, command: dict) -> str:
+    collection = command_collection(command_name, command)
+    field = FILTER_FIELDS.get(command_name)
+    if field is None:
+        return f"{command_name} {collection}"
+    return f"{command_name} {collection} {json.dumps(_shape(command.get(field, {})), sort_keys = True, default = str)}"
+
+
+def has_collscan(plan) -> bool:
+    if isinstance(plan, dict):
+        return plan.get("stage") == "COLLSCAN" or any(has_collscan(value) for value in plan.values())
+    if isinstance(plan, list):
+        return any(has_collscan(value) for value in plan)
+    return False
+
+
+class ProfiledCommand:
+    __slots__ = ("shape", "command_name", "database", "command", "duration_ms", "failed")
+
+    def __init__(self, shape: str, command_name: str, database: str, command: dict, duration_ms: float, failed: bool):
+        self.shape = shape
+        self.command_name = command_name
+        self.database = database
+        self.command = command
+        self.duration_ms = duration_ms
+        self.failed = failed
+
+
+class RequestProfile:
+    def __init__(self, method: str, path: str):
+        self.method = method
+        self.path = path
+        self.started = time.perf_counter()
+        self.commands: List[ProfiledCommand] = []
+        self.collscans: List[str] = []
+
+    def repeated_shapes(self, threshold: int) -> Dict[str, int]:
+        counts = CountMap(command.shape for command in self.commands)
+        return {shape: count for shape, count in counts.items() if count >= threshold}
+
+    def summary(self, threshold: int) -> dict:
+        return {
+            "method": self.method,
+            "path": self.path,
+            "commands": len(self.commands),
+            "mongo_ms": round(sum(command.duration_ms for command in self.commands), 2),
+            "request_ms": round((time.perf_counter() - self.started) * 1000, 2),
+            "n_plus_one": self.repeated_shapes(threshold),
+            "collscans": self.collscans,
+        }
+
+
+current_profile: contextvars.ContextVar[Optional[RequestProfile]] = contextvars.ContextVar("current_profile", default = None)
+
+
+class QueryProfiler(monitoring.CommandListener):
+    """
+    Records every command into the profile of the request that issued it
+    (Motor runs the driver with the caller's context, so the request's
+    context variable is visible here) and logs commands slower than
+    slow_query_ms, with values stripped, whether or not profiling is on.
+    """
+
+    def __init__(self, slow_query_ms: float):
+        self.slow_query_ms = slow_query_ms
+        self._pending: Dict[Tuple, Tuple[dict, str]] = {}
+
+    def started(self, event: monitoring.CommandStartedEvent):
+        if event.command_name != "explain":
+            self._pending[(event.connection_id, event.request_id)] = (event.command, event.database_name)
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent):
+        self._finish(event, failed = False)
+
+    def failed(self, event: monitoring.CommandFailedEvent):
+        self._finish(event, failed = True)
+
+    def _finish(self, event, failed: bool):
+        pending = self._pending.pop((event.connection_id, event.request_id), None)
+        if pending is None:
+            return
+        command, database = pending
+        duration_ms = event.duration_micros / 1000
+        profile = current_profile.get()
+        slow = self.slow_query_ms and duration_ms >= self.slow_query_ms
+        if profile is None and not slow:
+            return
+
+        shape = query_shape(event.command_name, command)
+        if profile is not None:
+            profile.commands.append(ProfiledCommand(shape, event.command_name, database, command, duration_ms, failed))
+        if slow:
+            logger.warning("slow query %s", json.dumps({
+                "shape": shape,
+                "database": database,
+                "duration_ms": round(duration_ms, 2),
+                "failed": failed,
+                "path": profile.path if profile else None,
+            }))
+
+
+class QueryExplainer:
+    """
+    Runs `explain` (queryPlanner only, nothing is executed) for a sample of
+    the query shapes seen in a request. Verdicts are remembered per shape.
+    """
+
+    def __init__(self, sample_rate: float):
+        self.sample_rate = sample_rate
+        self._verdicts: Dict[str, bool] = {}
+
+    async def collscans(self, client, profile: RequestProfile) -> List[str]:
+        found = []
+        seen = set()
+        for command in profile.commands:
+            if command.shape in seen or command.command_name not in EXPLAINABLE or command.failed:
+                continue
+            seen.add(command.shape)
+
+            verdict = self._verdicts.get(command.shape)
+            if verdict is None:
+                if random.random() >= self.sample_rate:
+                    continue
+                verdict = await self._explain(client, command)
+                if verdict is None:
+                    continue
+                if len(self._verdicts) >= EXPLAIN_CACHE_SIZE:
+                    self._verdicts.clear()
+                self._verdicts[command.shape] = verdict
+            if verdict:
+                found.append(command.shape)
+        return found
+
+    @staticmethod
+    async def _explain(client, command: ProfiledCommand) -> Optional[bool]:
+        explained = {key: value for key, value in command.command.items()
+                     if not key.startswith("$") and key not in DRIVER_FIELDS}
+        try:
+            plan = await client[command.database].command({"explain": explained, "verbosity": "queryPlanner"})
+        except Exception as e:
+            logger.debug("Could not explain %s: %s", command.shape, e)
+            return None
+        return has_collscan(plan)
+
+
+class QueryProfilingMiddleware:
+    """
+    Development and staging aid: profiles the MongoDB commands of each
+    request and adds the summary as an X-Query-Profile header and a log line.
+    Sampled explains run before the response starts, so enabling them adds
+    latency.
+    """
+
+    def __init__(self, app, get_client, n_plus_one_threshold: int, explainer: QueryExplainer):
+        self.app = app
+        self.get_client = get_client
+        self.n_plus_one_threshold = n_plus_one_threshold
+        self.explainer = explainer
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        profile = RequestProfile(scope["method"], scope["path"])
+        token = current_profile.set(profile)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                if self.explainer.sample_rate > 0:
+                    profile.collscans = await self.explainer.collscans(self.get_client(), profile)
+                summary = profile.summary(self.n_plus_one_threshold)
+                header = (f"commands={summary['commands']}; mongo_ms={summary['mongo_ms']}; "
+                          f"n_plus_one={len(summary['n_plus_one'])}; collscan={len(summary['collscans'])}")
+                message = {**message, "headers": [*message.get("headers", []), (b"x-query-profile", header.encode())]}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            current_profile.reset(token)
+            summary = profile.summary(self.n_plus_one_threshold)
+            level = logging.WARNING if summary["n_plus_one"] or summary["collscans"] else logging.INFO
+            logger.log(level, "query profile %s", json.dumps(summary))
+
+
+query_profiler = QueryProfiler(settings.SLOW_QUERY_MS)
+query_explainer = QueryExplainer(settings.PROFILE_EXPLAIN_SAMPLE_RATE)
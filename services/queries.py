@@ -0,0 +1,128 @@
+from datetime import date, datetime
+from typing import List, Optional
+
+from services.geo import GeoFilter
+from services.pagination import keyset_filter
+
+# Newest first, with _id as the tie-breaker used by the keyset cursor
+CASE_SORT = [("date_occurred", -1), ("_id", -1)]
+
+
+def _day_start(value: date) -> datetime:
+    return datetime.combine(value, datetime.min.time())
+
+
+def _date_range(start_date: Optional[date], end_date: Optional[date]) -> dict:
+    date_range = {}
+    if start_date:
+        date_range["$gte"] = _day_start(start_date)
+    if end_date:
+        date_range["$lte"] = _day_start(end_date)
+    return date_range
+
+
+def _combine(criteria: List[dict]) -> dict:
+    return criteria[0] if len(criteria) == 1 else {"$and": criteria}
+
+
+def case_list_filter(
+    status: Optional[str] = None,
+    priority: Optional[str] = None,
+    violation_type: Optional[str] = None,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    country: Optional[str] = None,
+    region: Optional[str] = None,
+    geo: Optional[GeoFilter] = None,
+    cursor: Optional[str] = None,
+) -> dict:
+    """
+    Filter used by GET /cases/, to be sorted by CASE_SORT. Every combination
+    should be served by one of the compound indexes on Case; see
+    tests/test_query_plans.py.
+    """
+    criteria = [{"is_archived": False}]
+    if status:
+        criteria.append({"status": status})
+    if priority:
+        criteria.append({"priority": priority})
+    if violation_type:
+        criteria.append({"violation_types": {"$in": [violation_type]}})
+    if date_range := _date_range(start_date, end_date):
+        criteria.append({"date_occurred": date_range})
+    if country:
+        criteria.append({"location.country": country})
+    if region:
+        criteria.append({"location.region": region})
+    if geo is not None:
+        criteria.extend(geo.queries("location.coordinates"))
+    if (after_cursor := keyset_filter("date_occurred", cursor)) is not None:
+        criteria.append(after_cursor)
+    return _combine(criteria)
+
+
+def case_breakdown_pipeline(
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    country: Optional[str] = None,
+    region: Optional[str] = None,
+) -> List[dict]:
+    """
+    Open cases per status and priority, for the analytics dashboard. A single
+    $group on both fields gives either breakdown by summing over the other;
+    without a place or date filter the (is_archived, status, priority, ...)
+    index covers it.
+    """
+    return [
+        {"$match": case_list_filter(start_date = start_date, end_date = end_date, country = country, region = region)},
+        {"$group": {"_id": {"status": "$status", "priority": "$priority"}, "count": {"$sum": 1}}},
+    ]
+
+
+def report_list_filter(
+    status: Optional[str] = None,
+    country: Optional[str] = None,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    geo: Optional[GeoFilter] = None,
+    violation_type: Optional[str] = None,
+) -> dict:
+    """Filter used by GET /reports/."""
+    criteria = []
+    if status:
+        criteria.append({"status": status})
+    if country:
+        criteria.append({"incident_details.location.country": country})
+    if violation_type:
+        criteria.append({"incident_details.violation_types": violation_type})
+    if date_range := _date_range(start_date, end_date):
+        criteria.append({"incident_details.date": date_range})
+    if geo is not None:
+        criteria.extend(geo.queries("incident_details.location.coordinates"))
+    return _combine(criteria) if criteria else {}
+
+
+def case_search_filter(
+    text: str,
+    status: Optional[str] = None,
+    country: Optional[str] = None,
+    violation_type: Optional[str] = None,
+) -> dict:
+    """Filter used by GET /search/ on cases; needs the case_text index."""
+    return {
+        "$text": {"$search": text},
+        **case_list_filter(status = status, country = country, violation_type = violation_type),
+    }
+
+
+def report_search_filter(
+    text: str,
+    status: Optional[str] = None,
+    country: Optional[str] = None,
+    violation_type: Optional[str] = None,
+) -> dict:
+    """Filter used by GET /search/ on reports; needs the report_text index."""
+    return {
+        "$text": {"$search": text},
+        **report_list_filter(status = status, country = country, violation_type = violation_type),
+    }
@@ -0,0 +1,316 @@
+import logging
+from collections import Counter
+from datetime import date, datetime, timedelta, timezone
+from typing import Iterable, List, Optional
+
+from bson import ObjectId
+from pymongo import DeleteOne, UpdateOne
+
+from models.incident import IncidentReport
+from models.rollup import IncidentRollup
+
+logger = logging.getLogger(__name__)
+
+# Reports stored this long before a rebuild started are reconciled after it,
+# to allow for clock differences between API servers
+REBUILD_MARGIN = timedelta(minutes = 5)
+
+
+def _day(value: datetime) -> datetime:
+    """The UTC day of a datetime, as the rebuild pipeline buckets it."""
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc)
+    return datetime(value.year, value.month, value.day)
+
+
+def _bucket_keys(report: IncidentReport):
+    details = report.incident_details
+    base = (details.location.country, details.location.region, _day(details.date))
+    yield (None, *base)
+    for violation_type in set(details.violation_types):
+        yield (violation_type, *base)
+
+
+async def record_reports(reports: Iterable[IncidentReport]):
+    """
+    Add newly stored reports to the rollups with one bulk $inc upsert per bucket.
+    """
+    counts = Counter()
+    coordinates = {}
+    for report in reports:
+        for key in _bucket_keys(report):
+            counts[key] += 1
+            coordinates.setdefault(key, report.incident_details.location.coordinates)
+
+    if not counts:
+        return
+
+    operations = [
+        UpdateOne(
+            {"violation_type": violation_type, "country": country, "region": region, "day": day},
+            {"$inc": {"total": count},
+             "$setOnInsert": {"coordinates": coordinates[(violation_type, country, region, day)]}},
+            upsert = True
+        )
+        for (violation_type, country, region, day), count in counts.items()
+    ]
+    await IncidentRollup.get_motor_collection().bulk_write(operations, ordered = False)
+
+
+async def record_report(report: IncidentReport):
+    await record_reports([report])
+
+
+def _rollup_pipeline() -> List[dict]:
+    """
+    Recompute every bucket from the incident_reports collection.
+    """
+    day = {"$dateFromParts": {
+        "year": {"$year": "$incident_details.date"},
+        "month": {"$month": "$incident_details.date"},
+        "day": {"$dayOfMonth": "$incident_details.date"},
+    }}
+    location = {
+        "country": "$incident_details.location.country",
+        "region": "$incident_details.location.region",
+        "day": day,
+    }
+    return [
+        {"$project": {
+            "keys": {"$concatArrays": [
+                [None],
+                {"$setUnion": [{"$ifNull": ["$incident_details.violation_types", []]}]},
+            ]},
+            "location": location,
+            "coordinates": "$incident_details.location.coordinates",
+        }},
+        {"$unwind": "$keys"},
+        {"$group": {
+            "_id": {
+                "violation_type": "$keys",
+                "country": "$location.country",
+                "region": "$location.region",
+                "day": "$location.day",
+            },
+            "total": {"$sum": 1},
+            "coordinates": {"$first": "$coordinates"},
+        }},
+        {"$project": {
+            "_id": 0,
+            "violation_type": "$_id.violation_type",
+            "country": "$_id.country",
+            "region": "$_id.region",
+            "day": "$_id.day",
+            "total": 1,
+            "coordinates": 1,
+        }},
+    ]
+
+
+async def rebuild_rollups():
+    """
+    Replace the rollup collection with a fresh aggregation. $out swaps the
+    collection atomically and keeps its indexes.
+
+    Increments made while the aggregation runs go to the collection being
+    replaced, so the buckets of reports stored since the rebuild started are
+    reconciled afterwards.
+    """
+    started = ObjectId.from_datetime(datetime.now(timezone.utc) - REBUILD_MARGIN)
+    pipeline = _rollup_pipeline() + [{"$out": IncidentRollup.get_collection_name()}]
+    await IncidentReport.aggregate(pipeline).to_list()
+
+    places = set()
+    async for report in IncidentReport.get_motor_collection().find(
+            {"_id": {"$gte": started}}, {"incident_details.location": 1, "incident_details.date": 1}):
+        details = report["incident_details"]
+        places.add((details["location"]["country"], details["location"]["region"], _day(details["date"])))
+    if places:
+        await reconcile_rollups(places = places)
+
+
+async def ensure_rollups():
+    """
+    Build the rollups of an existing database on startup, when the rollup
+    collection is still empty but reports are not.
+    """
+    try:
+        if await IncidentRollup.get_motor_collection().find_one({}, {"_id": 1}) is not None:
+            return
+        if await IncidentReport.get_motor_collection().find_one({}, {"_id": 1}) is None:
+            return
+        logger.info("Incident rollups are empty, rebuilding them")
+        await rebuild_rollups()
+        logger.info("Incident rollups rebuilt")
+    except Exception:
+        logger.exception("Could not build the incident rollups; run `python -m scripts.rollups rebuild`")
+
+
+def _places_criteria(places: Iterable[tuple]) -> tuple:
+    """Report and rollup filters selecting the (country, region, day) buckets."""
+    reports, buckets = [], []
+    for country, region, day in places:
+        reports.append({
+            "incident_details.location.country": country,
+            "incident_details.location.region": region,
+            "incident_details.date": {"$gte": day, "$lt": day + timedelta(days = 1)},
+        })
+        buckets.append({"country": country, "region": region, "day": day})
+    return {"$or": reports}, {"$or": buckets}
+
+
+async def reconcile_rollups(apply: bool = True, places: Optional[Iterable[tuple]] = None) -> List[dict]:
+    """
+    Compare the stored buckets with a fresh aggregation and return the ones
+    that drifted. When apply is set the drifted buckets are corrected. With
+    places, only the buckets of those (country, region, day) are compared.
+    """
+    pipeline, stored_filter = _rollup_pipeline(), {}
+    if places is not None:
+        if not (places := list(places)):
+            return []
+        report_filter, stored_filter = _places_criteria(places)
+        pipeline = [{"$match": report_filter}] + pipeline
+
+    expected = {}
+    async for bucket in IncidentReport.aggregate(pipeline):
+        key = (bucket["violation_type"], bucket["country"], bucket["region"], bucket["day"])
+        expected[key] = bucket
+
+    stored = {}
+    async for bucket in IncidentRollup.get_motor_collection().find(stored_filter, {"_id": 0}):
+        key = (bucket["violation_type"], bucket["country"], bucket["region"], bucket["day"])
+        stored[key] = bucket
+
+    drift = []
+    operations = []
+    for key in expected.keys() | stored.keys():
+        expected_count = expected[key]["total"] if key in expected else 0
+        stored_count = stored[key]["total"] if key in stored else 0
+        if expected_count == stored_count:
+            continue
+
+        violation_type, country, region, day = key
+        bucket_filter = {"violation_type": violation_type, "country": country, "region": region, "day": day}
+        drift.append({**bucket_filter, "expected": expected_count, "stored": stored_count})
+        if expected_count == 0:
+            operations.append(DeleteOne(bucket_filter))
+        else:
+            operations.append(UpdateOne(
+                bucket_filter,
+                {"$set": {"total": expected_count},
+                 "$setOnInsert": {"coordinates": expected[key]["coordinates"]}},
+                upsert = True
+            ))
+
+    if apply and operations:
+        await IncidentRollup.get_motor_collection().bulk_write(operations, ordered = False)
+    return drift
+
+
+def _violation_stages() -> List[dict]:
+    return [
+        {"$match": {"violation_type": {"$ne": None}}},
+        {"$group": {"_id": "$violation_type", "count": {"$sum": "$total"}}},
+        {"$sort": {"count": -1}},
+    ]
+
+
+async def violation_counts() -> List[dict]:
+    return await IncidentRollup.aggregate(_violation_stages()).to_list()
+
+
+def _place_criteria(country: Optional[str], region: Optional[str]) -> dict:
+    criteria = {}
+    if country:
+        criteria["country"] = country
+    if region:
+        criteria["region"] = region
+    return criteria
+
+
+def _day_range(start_date: Optional[date], end_date: Optional[date]) -> dict:
+    day_range = {}
+    if start_date:
+        day_range["$gte"] = datetime.combine(start_date, datetime.min.time())
+    if end_date:
+        day_range["$lte"] = datetime.combine(end_date, datetime.min.time())
+    return {"day": day_range} if day_range else {}
+
+
+def _geo_stages() -> List[dict]:
+    return [
+        {"$group": {
+            "_id": {"country": "$country", "region": "$region"},
+            "coordinates": {"$first": "$coordinates"},
+            "count": {"$sum": "$total"},
+        }},
+        {"$project": {
+            "country": "$_id.country",
+            "region": "$_id.region",
+            "coordinates": 1,
+            "count": 1,
+            "_id": 0,
+        }},
+        {"$sort": {"count": -1, "country": 1, "region": 1}},
+    ]
+
+
+def geo_distribution_pipeline(country: Optional[str] = None, region: Optional[str] = None) -> List[dict]:
+    match_criteria = {"violation_type": None, **_place_criteria(country, region)}
+    return [{"$match": match_criteria}] + _geo_stages()
+
+
+async def geo_distribution(country: Optional[str] = None, region: Optional[str] = None) -> List[dict]:
+    return await IncidentRollup.aggregate(geo_distribution_pipeline(country, region)).to_list()
+
+
+def _timeline_stages(granularity: str) -> List[dict]:
+    group_id = {"year": {"$year": "$day"}}
+    if granularity in ("month", "day"):
+        group_id["month"] = {"$month": "$day"}
+    if granularity == "day":
+        group_id["day"] = {"$dayOfMonth": "$day"}
+
+    return [
+        {"$group": {"_id": group_id, "count": {"$sum": "$total"}}},
+        {"$sort": {f"_id.{part}": 1 for part in group_id}},
+        {"$project": {
+            "period": {
+                "$concat": [
+                    {"$toString": "$_id.year"},
+                    {"$cond": {"if": {"$ne": [{"$ifNull": ["$_id.month", None]}, None]}, "then": {"$concat": ["-", {"$toString": "$_id.month"}]}, "else": ""}},
+                    {"$cond": {"if": {"$ne": [{"$ifNull": ["$_id.day", None]}, None]}, "then": {"$concat": ["-", {"$toString": "$_id.day"}]}, "else": ""}}
+                ]
+            },
+            "count": 1,
+            "_id": 0
+        }},
+    ]
+
+
+def timeline_pipeline(granularity: str, start_date: Optional[date] = None, end_date: Optional[date] = None) -> List[dict]:
+    match_criteria = {"violation_type": None, **_day_range(start_date, end_date)}
+    return [{"$match": match_criteria}] + _timeline_stages(granularity)
+
+
+async def timeline(granularity: str, start_date: Optional[date] = None, end_date: Optional[date] = None) -> List[dict]:
+    return await IncidentRollup.aggregate(timeline_pipeline(granularity, start_date, end_date)).to_list()
+
+
+def dashboard_pipeline(granularity: str, start_date: Optional[date] = None, end_date: Optional[date] = None,
+                       country: Optional[str] = None, region: Optional[str] = None) -> List[dict]:
+    """
+    Violation counts, geographic distribution and timeline in one pass over
+    the rollups: one $match on the shared filters, then a $facet running the
+    stages of violation_counts, geo_distribution and timeline.
+    """
+    every_report = {"$match": {"violation_type": None}}
+    return [
+        {"$match": {**_day_range(start_date, end_date), **_place_criteria(country, region)}},
+        {"$facet": {
+            "violations": _violation_stages(),
+            "geodata": [every_report] + _geo_stages(),
+            "timeline": [every_report] + _timeline_stages(granularity),
+        }},
+    ]
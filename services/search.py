@@ -0,0 +1,506 @@
+import asyncio
+import heapq
+import html
+import logging
+import math
+import re
+from abc import ABC, abstractmethod
+from collections import Counter, defaultdict
+from typing import Callable, Dict, Hashable, Iterable, List, Optional, Set, Tuple, Type
+
+from beanie import Document
+
+from config import settings
+from models.case import CASE_TEXT_WEIGHTS, Case
+from models.incident import REPORT_TEXT_WEIGHTS, IncidentReport
+from models.search import SearchHit, SearchResults
+from services.queries import case_search_filter, report_search_filter
+
+logger = logging.getLogger(__name__)
+
+WORD = re.compile(r"\w+")
+PHRASE = re.compile(r'"([^"]*)"')
+
+STOP_WORDS = frozenset("""
+a an and are as at be but by for from had has have he her his in into is it its of on or she that the
+their them there they this to was were which who will with
+""".split())
+
+
+def stem(word: str) -> str:
+    """
+    Light English suffix stripping, so that 'attacks', 'attacked' and
+    'attacking' meet. Close to, but simpler than, the Snowball stemmer
+    MongoDB uses for its text indexes.
+    """
+    word = word.lower()
+    if len(word) <= 4:
+        return word
+    if word.endswith("ies") or word.endswith("ied"):
+        return word[:-3] + "y"
+    for suffix in ("ing", "ed", "ly"):
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            word = word[:-len(suffix)]
+            break
+    else:
+        if word.endswith("es") and word[-3] in "sxz":
+            word = word[:-2]
+        elif word.endswith("s") and word[-2] not in "su":
+            word = word[:-1]
+    # 'torture', 'tortured' and 'tortures' all become 'tortur'
+    if word.endswith("e") and len(word) > 4:
+        word = word[:-1]
+    return word
+
+
+def terms(text: str) -> List[str]:
+    return [stem(word) for word in WORD.findall(text) if word.lower() not in STOP_WORDS]
+
+
+class ParsedQuery:
+    """
+    A search string in MongoDB's $search syntax: words match any of them,
+    "quoted phrases" must all be present and -words exclude a document.
+    """
+
+    def __init__(self, text: str):
+        self.text = text
+        phrases = PHRASE.findall(text)
+        words = PHRASE.sub(" ", text).split()
+
+        phrase_terms = [term for phrase in phrases for term in terms(phrase)]
+        self.required = set(phrase_terms)
+        self.excluded = {term for word in words if word.startswith("-") for term in terms(word[1:])}
+        self.terms = list(dict.fromkeys(
+            [term for word in words if not word.startswith("-") for term in terms(word)] + phrase_terms
+        ))
+
+    def __bool__(self):
+        return bool(self.terms)
+
+
+def highlight(text: str, stems: Set[str], snippets: int = 3, context: int = 8) -> List[str]:
+    """
+    Up to `snippets` extracts of `text` around words whose stem is in `stems`,
+    with `context` words either side. The text is HTML-escaped and matches
+    are wrapped in <mark> tags.
+    """
+    words = list(WORD.finditer(text))
+    matches = [i for i, word in enumerate(words) if stem(word.group()) in stems]
+
+    windows = []
+    for i in matches:
+        low, high = max(0, i - context), min(len(words) - 1, i + context)
+        if windows and low <= windows[-1][1] + 1:
+            windows[-1][1] = high
+        elif len(windows) < snippets:
+            windows.append([low, high])
+
+    marked = set(matches)
+    extracts = []
+    for low, high in windows:
+        parts = ["…" if low > 0 else ""]
+        position = words[low].start() if low > 0 else 0
+        for i in range(low, high + 1):
+            word = words[i]
+            parts.append(html.escape(text[position:word.start()]))
+            token = html.escape(word.group())
+            parts.append(f"<mark>{token}</mark>" if i in marked else token)
+            position = word.end()
+        parts.append("…" if high < len(words) - 1 else html.escape(text[position:]))
+        extracts.append("".join(parts))
+    return extracts
+
+
+def _values(document: dict, path: str) -> List:
+    """Values at a dotted path, descending into lists of subdocuments."""
+    values = [document]
+    for key in path.split("."):
+        found = []
+        for value in values:
+            if isinstance(value, list):
+                found.extend(item.get(key) for item in value if isinstance(item, dict))
+            elif isinstance(value, dict):
+                found.append(value.get(key))
+        values = [value for value in found if value is not None]
+    return [item for value in values for item in (value if isinstance(value, list) else [value])]
+
+
+def _first(document: dict, path: Optional[str]):
+    values = _values(document, path) if path else []
+    return values[0] if values else None
+
+
+class SearchSource:
+    """
+    How one collection is searched: its weighted text fields and where the
+    filterable and displayed values of a hit are stored.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        model: Type[Document],
+        weights: Dict[str, int],
+        ref: str,
+        status: str,
+        country: str,
+        violation_types: str,
+        date: str,
+        build_filter: Callable[..., dict],
+        title: Optional[str] = None,
+        searchable: Callable[[dict], bool] = lambda document: True,
+    ):
+        self.name = name
+        self.model = model
+        self.weights = weights
+        self.ref = ref
+        self.status = status
+        self.country = country
+        self.violation_types = violation_types
+        self.date = date
+        self.build_filter = build_filter
+        self.title = title
+        self.searchable = searchable
+        paths = [*weights, ref, status, country, violation_types, date] + ([title] if title else [])
+        self.projection = {path: 1 for path in paths}
+        # Top-level fields holding them, as kept by the in-process index
+        self.stored = {path.split(".")[0] for path in paths} | {"_id"}
+
+    def facets(self, document: dict) -> List[str]:
+        """Filter values of a document, as terms of the in-process index."""
+        facets = [f"collection:{self.name}"]
+        facets += [f"status:{value}" for value in _values(document, self.status)]
+        facets += [f"country:{value}" for value in _values(document, self.country)]
+        facets += [f"violation_type:{value}" for value in _values(document, self.violation_types)]
+        return facets
+
+    def hit(self, document: dict, score: float, stems: Set[str]) -> SearchHit:
+        highlights = {}
+        for path in self.weights:
+            extracts = [extract for value in _values(document, path) if isinstance(value, str)
+                        for extract in highlight(value, stems)]
+            if extracts:
+                highlights[path] = extracts
+        return SearchHit(
+            collection = self.name,
+            id = document["_id"],
+            ref = _first(document, self.ref),
+            title = _first(document, self.title),
+            status = _first(document, self.status),
+            country = _first(document, self.country),
+            date = _first(document, self.date),
+            score = round(score, 4),
+            highlights = highlights,
+        )
+
+
+CASES = SearchSource(
+    "cases", Case, CASE_TEXT_WEIGHTS,
+    ref = "case_id", title = "title", status = "status", country = "location.country",
+    violation_types = "violation_types", date = "date_occurred",
+    build_filter = case_search_filter,
+    searchable = lambda document: not document.get("is_archived", False),
+)
+
+REPORTS = SearchSource(
+    "reports", IncidentReport, REPORT_TEXT_WEIGHTS,
+    ref = "report_id", status = "status", country = "incident_details.location.country",
+    violation_types = "incident_details.violation_types", date = "incident_details.date",
+    build_filter = report_search_filter,
+)
+
+SOURCES = {source.name: source for source in (CASES, REPORTS)}
+
+
+class SearchBackend(ABC):
+    """
+    Interface of the /search backends. `index` and `remove` are called by
+    the routers whenever a searchable document changes; backends that query
+    the database directly leave them as no-ops.
+    """
+
+    @abstractmethod
+    async def search(self, query: ParsedQuery, sources: List[SearchSource], filters: dict,
+                     offset: int, limit: int) -> Tuple[List[SearchHit], bool]:
+        """One page of hits and whether more follow."""
+
+    async def rebuild(self):
+        pass
+
+    def index(self, source: SearchSource, documents: Iterable[dict]):
+        pass
+
+    def remove(self, source: SearchSource, document_ids: Iterable):
+        pass
+
+
+class MongoTextSearch(SearchBackend):
+    """
+    Searches with the text indexes on cases and incident reports. The filters
+    are part of the same $text query, and each collection returns no more than
+    offset + limit + 1 documents, ranked by MongoDB's textScore; the two lists
+    are then merged on that score.
+    """
+
+    async def _search_source(self, source: SearchSource, query: ParsedQuery, filters: dict, limit: int) -> List[dict]:
+        cursor = source.model.get_motor_collection().find(
+            source.build_filter(query.text, **filters),
+            {**source.projection, "score": {"$meta": "textScore"}},
+            sort = [("score", {"$meta": "textScore"})],
+            limit = limit,
+        )
+        return [(document["score"], source, document) async for document in cursor]
+
+    async def search(self, query: ParsedQuery, sources: List[SearchSource], filters: dict,
+                     offset: int, limit: int) -> Tuple[List[SearchHit], bool]:
+        found = await asyncio.gather(*(
+            self._search_source(source, query, filters, offset + limit + 1) for source in sources
+        ))
+        ranked = heapq.nlargest(offset + limit + 1, (hit for hits in found for hit in hits), key = lambda hit: hit[0])
+        stems = set(query.terms)
+        page = [source.hit(document, score, stems) for score, source, document in ranked[offset:offset + limit]]
+        return page, len(ranked) > offset + limit
+
+
+class InvertedIndex:
+    """
+    In-process inverted index ranked with BM25 over field-weighted term
+    frequencies. Filter values are kept as posting sets too, so a selective
+    filter only scores the documents that pass it.
+
+    Otherwise the postings of each query term are read best first, from a
+    copy sorted by BM25 impact, until no unread document can enter the top
+    `limit` (Fagin's threshold algorithm); common words then cost about as
+    much as rare ones. Documents changed since a term was sorted are scored
+    separately, and the sorted copy is rebuilt once they exceed 5% of it.
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings: Dict[str, Dict[Hashable, float]] = defaultdict(dict)
+        self.facets: Dict[str, Set[Hashable]] = defaultdict(set)
+        self.lengths: Dict[Hashable, float] = {}
+        self.entries: Dict[Hashable, Tuple[List[str], List[str]]] = {}
+        self.total_length = 0.0
+        # Length normalisation uses the average taken when the document count
+        # last moved by more than 10%, so that sorted impacts stay valid
+        self.average_length = 1.0
+        self._normalised_at = 0
+        self._impacts: Dict[str, List[Tuple[float, Hashable]]] = {}
+        self._changed: Dict[str, Set[Hashable]] = defaultdict(set)
+
+    def __len__(self):
+        return len(self.lengths)
+
+    def _touch(self, term: str, key: Hashable):
+        impacts = self._impacts.get(term)
+        if impacts is not None:
+            changed = self._changed[term]
+            changed.add(key)
+            if len(changed) > max(64, len(impacts) // 20):
+                del self._impacts[term]
+                del self._changed[term]
+
+    def add(self, key: Hashable, weighted_terms: Counter, facets: List[str]):
+        self.remove(key)
+        for term, frequency in weighted_terms.items():
+            self.postings[term][key] = frequency
+            self._touch(term, key)
+        for facet in facets:
+            self.facets[facet].add(key)
+        length = sum(weighted_terms.values())
+        self.lengths[key] = length
+        self.total_length += length
+        self.entries[key] = (list(weighted_terms), facets)
+
+    def remove(self, key: Hashable):
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return
+        for term in entry[0]:
+            postings = self.postings[term]
+            postings.pop(key, None)
+            self._touch(term, key)
+            if not postings:
+                del self.postings[term]
+        for facet in entry[1]:
+            self.facets[facet].discard(key)
+        self.total_length -= self.lengths.pop(key)
+
+    def _normalise(self):
+        count = len(self.lengths)
+        if count and abs(count - self._normalised_at) > self._normalised_at // 10:
+            self.average_length = self.total_length / count or 1.0
+            self._normalised_at = count
+            self._impacts.clear()
+            self._changed.clear()
+
+    def _impact(self, term: str, key: Hashable) -> float:
+        """BM25 term-frequency component of `term` in a document."""
+        frequency = self.postings[term].get(key)
+        if frequency is None:
+            return 0.0
+        norm = self.k1 * (1 - self.b + self.b * self.lengths[key] / self.average_length)
+        return frequency * (self.k1 + 1) / (frequency + norm)
+
+    def _sorted(self, term: str) -> List[Tuple[float, Hashable]]:
+        impacts = self._impacts.get(term)
+        if impacts is None:
+            impacts = sorted(((self._impact(term, key), key) for key in self.postings[term]),
+                             key = lambda entry: entry[0], reverse = True)
+            self._impacts[term] = impacts
+            self._changed.pop(term, None)
+        return impacts
+
+    def search(self, query: ParsedQuery, facet_groups: List[List[str]], limit: int) -> List[Tuple[float, Hashable]]:
+        """Best `limit` (score, key) pairs among documents with one facet of every group."""
+        self._normalise()
+        count = len(self.lengths)
+        idf = {
+            term: math.log(1 + (count - len(self.postings[term]) + 0.5) / (len(self.postings[term]) + 0.5))
+            for term in query.terms if term in self.postings
+        }
+        groups = sorted(
+            ([self.facets.get(facet, set()) for facet in group] for group in facet_groups),
+            key = lambda sets: sum(map(len, sets))
+        )
+        if not idf or any(not any(sets) for sets in groups):
+            return []
+
+        def accept(key) -> bool:
+            return (all(any(key in members for members in sets) for sets in groups)
+                    and all(key in self.postings.get(term, ()) for term in query.required)
+                    and not any(key in self.postings.get(term, ()) for term in query.excluded))
+
+        def score(key) -> float:
+            return sum(weight * self._impact(term, key) for term, weight in idf.items())
+
+        # Reading postings best first finds `limit` hits after about
+        # limit / selectivity entries; score a smaller filter's documents directly
+        if groups:
+            selectivity = math.prod(sum(map(len, sets)) / count for sets in groups)
+            reads = min(sum(len(self.postings[term]) for term in idf), limit / max(selectivity, 1e-9))
+        if groups and sum(map(len, groups[0])) < reads:
+            candidates = set().union(*groups[0])
+            return heapq.nlargest(limit, ((score(key), key) for key in candidates
+                                          if any(key in self.postings[term] for term in idf) and accept(key)),
+                                  key = lambda hit: hit[0])
+        return self._top(idf, accept, score, limit)
+
+    def _top(self, idf: Dict[str, float], accept, score, limit: int) -> List[Tuple[float, Hashable]]:
+        best = []  # min-heap of (score, key)
+        seen = set()
+
+        def consider(key):
+            if key in seen:
+                return
+            seen.add(key)
+            if key in self.lengths and accept(key):
+                value = score(key)
+                if value <= 0:
+                    return
+                if len(best) < limit:
+                    heapq.heappush(best, (value, key))
+                elif value > best[0][0]:
+                    heapq.heapreplace(best, (value, key))
+
+        lists = [(weight, self._sorted(term)) for term, weight in idf.items()]
+        for term in idf:
+            for key in list(self._changed.get(term, ())):
+                consider(key)
+
+        position = 0
+        while True:
+            threshold = 0.0
+            exhausted = True
+            for weight, impacts in lists:
+                if position < len(impacts):
+                    exhausted = False
+                    impact, key = impacts[position]
+                    consider(key)
+                    threshold += weight * impact
+            if exhausted or len(best) >= limit and best[0][0] >= threshold:
+                break
+            position += 1
+
+        return sorted(best, key = lambda hit: hit[0], reverse = True)
+
+
+class MemorySearch(SearchBackend):
+    """
+    Keeps an InvertedIndex of all searchable documents in this process, for
+    offline use and for deployments without text indexes. It is filled from
+    MongoDB at startup and kept current by the routers, so it only suits a
+    single worker. The text fields of each document are kept for highlighting.
+    """
+
+    def __init__(self):
+        self.inverted = InvertedIndex()
+        self.documents: Dict[Hashable, Tuple[SearchSource, dict]] = {}
+
+    async def rebuild(self):
+        for source in SOURCES.values():
+            async for document in source.model.get_motor_collection().find({}, {**source.projection, "is_archived": 1}):
+                self.index(source, [document])
+        logger.info("Search index ready: %d documents", len(self.inverted))
+
+    def index(self, source: SearchSource, documents: Iterable[dict]):
+        for document in documents:
+            key = (source.name, str(document["_id"]))
+            if not source.searchable(document):
+                self._remove(key)
+                continue
+            weighted_terms = Counter()
+            for path, weight in source.weights.items():
+                for value in _values(document, path):
+                    if isinstance(value, str):
+                        for term in terms(value):
+                            weighted_terms[term] += weight
+            self.inverted.add(key, weighted_terms, source.facets(document))
+            self.documents[key] = (source, {field: document[field] for field in source.stored if field in document})
+
+    def _remove(self, key: Hashable):
+        self.inverted.remove(key)
+        self.documents.pop(key, None)
+
+    def remove(self, source: SearchSource, document_ids: Iterable):
+        for document_id in document_ids:
+            self._remove((source.name, str(document_id)))
+
+    async def search(self, query: ParsedQuery, sources: List[SearchSource], filters: dict,
+                     offset: int, limit: int) -> Tuple[List[SearchHit], bool]:
+        facet_groups = []
+        if len(sources) < len(SOURCES):
+            facet_groups.append([f"collection:{source.name}" for source in sources])
+        facet_groups += [[f"{name}:{value}"] for name, value in filters.items() if value is not None]
+        ranked = self.inverted.search(query, facet_groups, offset + limit + 1)
+        stems = set(query.terms)
+        page = []
+        for score, key in ranked[offset:offset + limit]:
+            source, stored = self.documents[key]
+            page.append(source.hit(stored, score, stems))
+        return page, len(ranked) > offset + limit
+
+
+def build_search_backend() -> SearchBackend:
+    if settings.SEARCH_BACKEND == "mongo":
+        return MongoTextSearch()
+    if settings.SEARCH_BACKEND == "memory":
+        return MemorySearch()
+    raise RuntimeError(f"Unknown SEARCH_BACKEND '{settings.SEARCH_BACKEND}'")
+
+
+search_backend = build_search_backend()
+
+
+async def search(text: str, collections: List[str], offset: int, limit: int, **filters) -> SearchResults:
+    """Ranked hits across `collections` for a search string, `filters` being status, country and violation_type."""
+    query = ParsedQuery(text)
+    hits, has_more = [], False
+    if query:
+        hits, has_more = await search_backend.search(
+            query, [SOURCES[name] for name in collections], filters, offset, limit
+        )
+    return SearchResults(query = text, offset = offset, limit = limit, has_more = has_more, hits = hits)
@@ -0,0 +1,56 @@
+import json
+from datetime import datetime
+from functools import lru_cache
+from typing import Any, List, Optional, Type
+
+from bson import ObjectId
+from fastapi import Response
+from pydantic import BaseModel, TypeAdapter
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def json_default(value: Any) -> Any:
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _orjson_default(value: Any) -> Any:
+    if isinstance(value, ObjectId):
+        return str(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(content: Any) -> bytes:
+    """
+    Encode raw MongoDB documents as JSON. Uses orjson when it is installed,
+    which writes datetimes natively in the same ISO format as pydantic.
+    """
+    if orjson is not None:
+        return orjson.dumps(content, default = _orjson_default)
+    return json.dumps(content, default = json_default).encode()
+
+
+@lru_cache(maxsize = None)
+def _list_adapter(model: Type[BaseModel]) -> TypeAdapter:
+    return TypeAdapter(List[model])
+
+
+def models_response(model: Type[BaseModel], items: List[BaseModel], headers: Optional[dict] = None) -> Response:
+    """
+    JSON response for documents loaded through Beanie, which were validated
+    when they were read. FastAPI's response_model path would dump, validate
+    and serialize them again before encoding; here pydantic-core writes the
+    JSON bytes in one pass. The output is the same, aliases included.
+    """
+    return Response(
+        _list_adapter(model).dump_json(items, by_alias = True),
+        media_type = "application/json",
+        headers = headers,
+    )
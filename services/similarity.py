@@ -0,0 +1,240 @@
+"""
+Near-duplicate detection for incident reports and cases with MinHash and
+locality-sensitive hashing.
+
+Each text gets a NUM_PERM-value MinHash signature over its word 3-shingles.
+The signature is cut into BANDS bands of ROWS values, and each band is hashed
+into a key. Two texts with Jaccard similarity s share at least one key with
+probability 1 - (1 - s^ROWS)^BANDS: about 0.12 at s = 0.3, 0.64 at s = 0.5,
+0.89 at s = 0.6 and 0.9998 at s = 0.8. A lookup is therefore one indexed $in
+query on the keys, narrowed by date and distance, followed by comparing a
+bounded number of signatures.
+
+Computing signatures is pure-Python CPU work, so the API computes them on a
+worker thread and the event loop keeps serving requests meanwhile.
+"""
+import asyncio
+import hashlib
+import random
+import re
+import struct
+import zlib
+from datetime import timedelta
+from typing import Iterable, List, Optional, Set
+
+from pymongo import InsertOne, ReplaceOne
+
+from models.case import Case
+from models.incident import IncidentReport
+from models.similarity import SimilaritySignature, SimilarRecord, SimilarRecords
+from services.geo import EARTH_RADIUS_KM, distance_km
+
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+SHINGLE_SIZE = 3
+# Signatures compared by a lookup at most; shared boilerplate can put many
+# documents in the same buckets
+MAX_CANDIDATES = 2000
+
+WORD = re.compile(r"\w+")
+_PRIME = (1 << 61) - 1
+_MASK = (1 << 32) - 1
+_SIGNATURE = struct.Struct(f"<{NUM_PERM}I")
+# Per 32-bit lane of a signature read as one integer: the low 31 bits, the top bit
+_LOW_BITS = int.from_bytes(b"\xff\xff\xff\x7f" * NUM_PERM, "little")
+_TOP_BITS = int.from_bytes(b"\x00\x00\x00\x80" * NUM_PERM, "little")
+# Fixed seed: signatures stored by any process must stay comparable
+_rng = random.Random(0x5EED)
+PERMUTATIONS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(NUM_PERM)]
+
+
+def shingles(text: str) -> Set[int]:
+    words = [word.lower() for word in WORD.findall(text)]
+    if len(words) <= SHINGLE_SIZE:
+        grams = [" ".join(words)] if words else []
+    else:
+        grams = [" ".join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)]
+    return {zlib.crc32(gram.encode()) for gram in grams}
+
+
+def minhash(text: str) -> Optional[bytes]:
+    """Packed MinHash signature of a text, or None when it has no words."""
+    hashes = shingles(text)
+    if not hashes:
+        return None
+    return _SIGNATURE.pack(*(
+        min((a * value + b) % _PRIME for value in hashes) & _MASK for a, b in PERMUTATIONS
+    ))
+
+
+def band_keys(signature: bytes) -> List[int]:
+    row_bytes = ROWS * 4
+    return [
+        int.from_bytes(hashlib.blake2b(bytes([band]) + signature[band * row_bytes:(band + 1) * row_bytes],
+                                       digest_size = 8).digest(), "little", signed = True)
+        for band in range(BANDS)
+    ]
+
+
+def similarity(a: bytes, b: bytes) -> float:
+    """
+    Estimated Jaccard similarity: the share of equal MinHash values. Equal
+    values leave a zero lane in a XOR b, and the top bit of
+    ((lane & LOW) + LOW) | lane is clear only for a zero lane, so all lanes
+    are compared at once without unpacking.
+    """
+    difference = int.from_bytes(a, "little") ^ int.from_bytes(b, "little")
+    nonzero = ((difference & _LOW_BITS) + _LOW_BITS) | difference
+    return (NUM_PERM - (nonzero & _TOP_BITS).bit_count()) / NUM_PERM
+
+
+def signature_entry(kind: str, source_id, ref: str, text: str, date, coordinates: Optional[dict]) -> Optional[dict]:
+    signature = minhash(text)
+    if signature is None:
+        return None
+    return {
+        "kind": kind,
+        "source_id": source_id,
+        "ref": ref,
+        "bands": band_keys(signature),
+        "signature": signature,
+        "date": date,
+        "coordinates": coordinates,
+    }
+
+
+def report_entry(report: IncidentReport) -> Optional[dict]:
+    details = report.incident_details
+    return signature_entry("report", report.id, report.report_id, details.description, details.date,
+                  details.location.coordinates)
+
+
+def case_entry(case: Case) -> Optional[dict]:
+    return signature_entry("case", case.id, case.case_id, f"{case.title}. {case.description or ''}", case.date_occurred,
+                  case.location.coordinates)
+
+
+async def _entries(to_entry, items: Iterable) -> List[Optional[dict]]:
+    items = list(items)
+    return await asyncio.to_thread(lambda: [to_entry(item) for item in items])
+
+
+async def _record(entries: Iterable[Optional[dict]]):
+    operations = [
+        ReplaceOne({"source_id": entry["source_id"], "kind": entry["kind"]}, entry, upsert = True)
+        for entry in entries if entry is not None
+    ]
+    if operations:
+        await SimilaritySignature.get_motor_collection().bulk_write(operations, ordered = False)
+
+
+async def record_reports(reports: Iterable[IncidentReport]):
+    """Add or refresh the signatures of stored reports with one bulk write."""
+    await _record(await _entries(report_entry, reports))
+
+
+async def record_cases(cases: Iterable[Case]):
+    await _record(await _entries(case_entry, cases))
+
+
+async def rebuild_signatures(batch_size: int = 1000) -> dict:
+    """Recompute the signature of every report and case."""
+    collection = SimilaritySignature.get_motor_collection()
+    await collection.delete_many({})
+    counts = {}
+    for kind, model, to_entry in (("report", IncidentReport, report_entry), ("case", Case, case_entry)):
+        counts[kind] = 0
+        cursor = model.get_motor_collection().find({}, batch_size = batch_size)
+        while documents := await cursor.to_list(batch_size):
+            entries = await _entries(to_entry, map(model.model_validate, documents))
+            batch = [InsertOne(entry) for entry in entries if entry is not None]
+            if batch:
+                await collection.bulk_write(batch, ordered = False)
+                counts[kind] += len(batch)
+    return counts
+
+
+def candidate_filter(entry: dict, window_days: int, max_km: Optional[float]) -> dict:
+    """
+    Signatures sharing a band key with `entry`, within `window_days` of its
+    date and max_km of its location. Served by the bands/date index.
+    """
+    window = timedelta(days = window_days)
+    query = {
+        "bands": {"$in": entry["bands"]},
+        "date": {"$gte": entry["date"] - window, "$lte": entry["date"] + window},
+    }
+    origin = (entry.get("coordinates") or {}).get("coordinates")
+    if max_km and origin:
+        query["coordinates"] = {"$geoWithin": {"$centerSphere": [origin, max_km / EARTH_RADIUS_KM]}}
+    return query
+
+
+def _score(value: float, days: float, window_days: int, km: Optional[float], max_km: Optional[float]) -> float:
+    score = value * (1 - 0.5 * days / window_days if window_days else 1.0)
+    if km is not None and max_km:
+        score *= 1 - 0.5 * min(km, max_km) / max_km
+    return round(score, 4)
+
+
+async def similar_to_report(
+    report: IncidentReport,
+    window_days: int,
+    max_km: Optional[float],
+    min_similarity: float,
+    limit: int,
+) -> SimilarRecords:
+    """
+    Reports and cases whose text is close to the report's description, that
+    happened within `window_days` of it and, when max_km is set, within max_km
+    of its location. Archived cases are left out. At most MAX_CANDIDATES
+    signatures, those sharing the most band keys, are compared; `truncated`
+    tells when more matched.
+    """
+    result = SimilarRecords(report_id = report.report_id)
+    collection = SimilaritySignature.get_motor_collection()
+    entry = await collection.find_one({"source_id": report.id, "kind": "report"}) or (await _entries(report_entry, [report]))[0]
+    if entry is None:
+        return result
+
+    origin = (entry.get("coordinates") or {}).get("coordinates")
+    matches = {"report": [], "case": []}
+    # Texts sharing more bands are likelier to be similar, so when boilerplate
+    # fills the buckets the cap drops the weakest candidates, not arbitrary ones
+    candidates = await collection.aggregate([
+        {"$match": {**candidate_filter(entry, window_days, max_km),
+                    "$nor": [{"kind": "report", "source_id": report.id}]}},
+        {"$project": {"kind": 1, "source_id": 1, "ref": 1, "signature": 1, "date": 1, "coordinates": 1,
+                      "shared": {"$size": {"$filter": {"input": "$bands", "cond": {"$in": ["$$this", entry["bands"]]}}}}}},
+        {"$sort": {"shared": -1, "_id": 1}},
+        {"$limit": MAX_CANDIDATES + 1},
+    ]).to_list(None)
+    result.truncated = len(candidates) > MAX_CANDIDATES
+    for candidate in candidates[:MAX_CANDIDATES]:
+        value = similarity(entry["signature"], candidate["signature"])
+        if value < min_similarity:
+            continue
+        days = abs((candidate["date"] - entry["date"]).total_seconds()) / 86400
+        point = (candidate.get("coordinates") or {}).get("coordinates")
+        km = distance_km(origin, point) if origin and point else None
+        matches[candidate["kind"]].append(SimilarRecord(
+            kind = candidate["kind"],
+            id = candidate["source_id"],
+            ref = candidate["ref"],
+            similarity = round(value, 4),
+            days_apart = round(days, 1),
+            distance_km = round(km, 1) if km is not None else None,
+            score = _score(value, days, window_days, km, max_km),
+        ))
+
+    if matches["case"]:
+        open_cases = Case.get_motor_collection().find(
+            {"_id": {"$in": [match.id for match in matches["case"]]}, "is_archived": False}, {"_id": 1}
+        )
+        open_ids = {document["_id"] async for document in open_cases}
+        matches["case"] = [match for match in matches["case"] if match.id in open_ids]
+
+    result.similar_reports = sorted(matches["report"], key = lambda match: match.score, reverse = True)[:limit]
+    result.candidate_cases = sorted(matches["case"], key = lambda match: match.score, reverse = True)[:limit]
+    return result
@@ -0,0 +1,131 @@
+import asyncio
+import os
+import uuid
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+import cloudinary
+import cloudinary.uploader
+from fastapi import UploadFile
+from fastapi.staticfiles import StaticFiles
+from pydantic import BaseModel
+
+from config import settings
+
+
+class StoredFile(BaseModel):
+    type: str
+    url: str
+
+
+def resource_type_for(content_type: Optional[str]) -> str:
+    """Map a MIME type onto the same categories Cloudinary reports."""
+    if content_type:
+        if content_type.startswith("image/"):
+            return "image"
+        if content_type.startswith("video/") or content_type.startswith("audio/"):
+            return "video"
+    return "raw"
+
+
+class EvidenceStorage(ABC):
+    """
+    Interface of the evidence file stores used by the cases and incidents routers.
+    """
+
+    @abstractmethod
+    async def save(self, upload: UploadFile, folder: str) -> StoredFile:
+        """Store an uploaded file under folder and return where it can be fetched."""
+
+
+class CloudinaryStorage(EvidenceStorage):
+    """
+    Uploads to Cloudinary from a dedicated thread pool so the blocking SDK never
+    runs on the event loop. The file is sent in chunks with upload_large, and a
+    semaphore caps the uploads in flight; extra requests wait for a free slot.
+    """
+
+    def __init__(self, max_concurrency: int, chunk_size: int):
+        cloudinary.config(
+            cloud_name = settings.CLOUDINARY_CLOUD_NAME,
+            api_key = settings.CLOUDINARY_API_KEY,
+            api_secret = settings.CLOUDINARY_SECRET_KEY,
+        )
+        self.chunk_size = chunk_size
+        self._executor = ThreadPoolExecutor(max_workers = max_concurrency, thread_name_prefix = "evidence-upload")
+        self._slots = asyncio.Semaphore(max_concurrency)
+
+    def _upload(self, upload: UploadFile, folder: str) -> dict:
+        return cloudinary.uploader.upload_large(
+            upload.file,
+            resource_type = "auto",
+            folder = folder,
+            chunk_size = self.chunk_size,
+            filename = upload.filename,
+        )
+
+    async def save(self, upload: UploadFile, folder: str) -> StoredFile:
+        async with self._slots:
+            loop = asyncio.get_running_loop()
+            result = await loop.run_in_executor(self._executor, self._upload, upload, folder)
+
+        return StoredFile(
+            type = result.get("resource_type", "raw"),
+            url = result.get("secure_url"),
+        )
+
+
+class LocalStorage(EvidenceStorage):
+    """
+    Writes evidence under a local directory, for tests and air-gapped deployments.
+    Files are served back from `base_url`.
+    """
+
+    def __init__(self, root: str, base_url: str, chunk_size: int):
+        self.root = root
+        self.base_url = base_url.rstrip("/")
+        self.chunk_size = chunk_size
+
+    async def save(self, upload: UploadFile, folder: str) -> StoredFile:
+        extension = os.path.splitext(upload.filename or "")[1]
+        relative_path = os.path.join(folder, f"{uuid.uuid4().hex}{extension}")
+        path = os.path.join(self.root, relative_path)
+        await asyncio.to_thread(os.makedirs, os.path.dirname(path), exist_ok = True)
+
+        destination = await asyncio.to_thread(open, path, "wb")
+        try:
+            while chunk := await upload.read(self.chunk_size):
+                await asyncio.to_thread(destination.write, chunk)
+        finally:
+            await asyncio.to_thread(destination.close)
+
+        return StoredFile(
+            type = resource_type_for(upload.content_type),
+            url = f"{self.base_url}/{relative_path.replace(os.sep, '/')}",
+        )
+
+
+class EvidenceFiles(StaticFiles):
+    """
+    Serves LocalStorage files as downloads. Uploads are user content, so an
+    HTML or SVG file must never render, or run scripts, on the API origin.
+    """
+
+    def file_response(self, *args, **kwargs):
+        response = super().file_response(*args, **kwargs)
+        response.headers["Content-Disposition"] = "attachment"
+        response.headers["X-Content-Type-Options"] = "nosniff"
+        response.headers["Content-Security-Policy"] = "default-src 'none'; sandbox"
+        return response
+
+
+def build_storage() -> EvidenceStorage:
+    if settings.EVIDENCE_STORAGE == "local":
+        return LocalStorage(settings.EVIDENCE_LOCAL_PATH, settings.EVIDENCE_BASE_URL, settings.EVIDENCE_CHUNK_SIZE)
+    if settings.EVIDENCE_STORAGE == "cloudinary":
+        return CloudinaryStorage(settings.EVIDENCE_UPLOAD_CONCURRENCY, settings.EVIDENCE_CHUNK_SIZE)
+    raise RuntimeError(f"Unknown EVIDENCE_STORAGE '{settings.EVIDENCE_STORAGE}'")
+
+
+evidence_storage = build_storage()
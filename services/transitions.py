@@ -0,0 +1,135 @@
+"""
+Bulk case status changes.
+
+A change takes the same few round trips whatever the number of cases: one
+bulk_write of pipeline updates, one read of the cases it changed and one
+update clearing the marker, then one insert_many of history rows. Each update
+copies the status it replaces into `status_transition` on the case, in the
+same atomic document write as the change itself, so the history rows record
+the status each case actually left even when other requests change the same
+cases concurrently. Without a transaction, a process that dies before
+clearing its markers leaves them behind; the next change clears markers
+older than STALE_MARKER_AGE.
+"""
+from datetime import datetime, timedelta, timezone
+from typing import List, Sequence, Tuple
+
+from bson import ObjectId
+from pymongo import UpdateMany
+
+from models.case import BulkStatusResult, Case, CaseStatusHistory, StatusTransitionOutcome
+from services.search import CASES
+
+# Case ids per update in the bulk write
+CHUNK_SIZE = 1000
+# Far longer than any transition takes, and than MongoDB lets a transaction run
+STALE_MARKER_AGE = timedelta(minutes = 10)
+
+
+def _chunks(items: list, size: int):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _pending(new_status: str) -> dict:
+    """Open cases that are not in new_status yet."""
+    return {"is_archived": False, "status": {"$ne": new_status}}
+
+
+async def select_cases(criteria: dict, new_status: str, limit: int, session = None) -> List[ObjectId]:
+    """
+    Ids of the cases matching a GET /cases/ filter that a change to
+    new_status would update, at most limit + 1 of them so callers can tell
+    when the filter selects too many.
+    """
+    cursor = Case.get_motor_collection().find(
+        {"$and": [criteria, _pending(new_status)]}, {"_id": 1}, limit = limit + 1, session = session
+    )
+    return [document["_id"] async for document in cursor]
+
+
+async def transition_cases(
+    case_ids: Sequence[ObjectId],
+    new_status: str,
+    session = None,
+) -> Tuple[BulkStatusResult, List[dict]]:
+    """
+    Move cases to new_status. Returns the per-case outcomes, in the order of
+    case_ids, and the changed cases with the fields of the search index and
+    their previous status in `status_transition`, for history_rows.
+    """
+    collection = Case.get_motor_collection()
+    ids = list(dict.fromkeys(case_ids))
+    batch = ObjectId()
+    await clear_stale_markers(session = session)
+    stamp = [{"$set": {
+        "status_transition": {"batch": batch, "previous_status": "$status"},
+        "status": new_status,
+    }}]
+    if ids:
+        await collection.bulk_write(
+            [UpdateMany({**_pending(new_status), "_id": {"$in": chunk}}, stamp) for chunk in _chunks(ids, CHUNK_SIZE)],
+            ordered = False,
+            session = session
+        )
+
+    changed = await collection.find(
+        {"status_transition.batch": batch},
+        {**CASES.projection, "case_id": 1, "is_archived": 1, "date_reported": 1, "status_transition": 1},
+        session = session
+    ).to_list(None)
+
+    outcomes = {}
+    if changed:
+        await collection.update_many(
+            {"status_transition.batch": batch}, {"$unset": {"status_transition": ""}}, session = session
+        )
+        for document in changed:
+            outcomes[document["_id"]] = StatusTransitionOutcome(
+                id = document["_id"],
+                case_id = document.get("case_id"),
+                outcome = "updated",
+                previous_status = document["status_transition"]["previous_status"]
+            )
+
+    remaining = [case_id for case_id in ids if case_id not in outcomes]
+    if remaining:
+        # Open cases left alone were already in new_status; the rest are missing or archived
+        async for document in collection.find(
+            {"_id": {"$in": remaining}, "is_archived": False}, {"case_id": 1, "status": 1}, session = session
+        ):
+            outcomes[document["_id"]] = StatusTransitionOutcome(
+                id = document["_id"], case_id = document.get("case_id"), outcome = "unchanged"
+            )
+
+    result = BulkStatusResult(new_status = new_status)
+    for case_id in ids:
+        outcome = outcomes.get(case_id) or StatusTransitionOutcome(id = case_id, outcome = "not_found")
+        setattr(result, outcome.outcome, getattr(result, outcome.outcome) + 1)
+        result.outcomes.append(outcome)
+    return result, changed
+
+
+async def clear_stale_markers(session = None):
+    """Remove the markers of changes that were interrupted before clearing them."""
+    stale = ObjectId.from_datetime(datetime.now(timezone.utc) - STALE_MARKER_AGE)
+    await Case.get_motor_collection().update_many(
+        {"status_transition.batch": {"$lt": stale}}, {"$unset": {"status_transition": ""}}, session = session
+    )
+
+
+def history_rows(changed: List[dict], new_status: str, changed_by: ObjectId) -> List[CaseStatusHistory]:
+    changed_at = datetime.utcnow()
+    return [
+        CaseStatusHistory(
+            case_id = document["_id"],
+            previous_status = document["status_transition"]["previous_status"],
+            new_status = new_status,
+            changed_at = changed_at,
+            changed_by = changed_by,
+            country = document["location"]["country"],
+            violation_types = document.get("violation_types") or [],
+            opened_at = document.get("date_reported")
+        )
+        for document in changed
+    ]
@@ -0,0 +1,43 @@
+"""
+Tests of the duration histograms behind the case metrics, which need no
+database.
+
+    python -m pytest tests/test_case_metrics.py
+"""
+import os
+import random
+from collections import Counter
+from datetime import datetime
+
+os.environ.setdefault("SECRET_KEY", "case-metrics-tests")
+
+from services.case_metrics import _nested, duration_bucket, duration_stats, percentile, week_start
+
+
+def test_week_start_is_monday():
+    assert week_start(datetime(2024, 5, 15, 13, 30)) == datetime(2024, 5, 13)
+    assert week_start(datetime(2024, 5, 13)) == datetime(2024, 5, 13)
+    assert week_start(datetime(2024, 5, 19, 23, 59)) == datetime(2024, 5, 13)
+
+
+def test_percentiles_close_to_exact():
+    rng = random.Random(3)
+    hours = sorted(rng.lognormvariate(5, 1.2) for _ in range(20000))
+    histogram = Counter(duration_bucket(value * 3600) for value in hours)
+    for fraction in (0.5, 0.9, 0.95):
+        exact = hours[int(fraction * len(hours))]
+        assert abs(percentile(histogram, fraction) - exact) / exact < 0.1
+
+
+def test_duration_stats():
+    histogram = Counter({duration_bucket(3600): 2})
+    stats = duration_stats(2 * 3600, histogram)
+    assert stats["count"] == 2 and stats["mean_hours"] == 1.0
+    assert duration_stats(0, Counter()) == {
+        "count": 0, "mean_hours": None, "p50_hours": None, "p90_hours": None, "p95_hours": None
+    }
+
+
+def test_nested_histogram_keys():
+    increments = Counter({"left": 2, "seconds_in_status": 30.0, "in_status_histogram.3": 2})
+    assert _nested(increments) == {"left": 2, "seconds_in_status": 30.0, "in_status_histogram": {"3": 2}}
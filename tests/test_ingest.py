@@ -0,0 +1,103 @@
+"""
+Tests of the bulk ingest parsers, which need no database.
+
+    python -m pytest tests/test_ingest.py
+"""
+import asyncio
+import os
+
+os.environ.setdefault("SECRET_KEY", "ingest-tests")
+
+import pytest
+
+from services.ingest import UndecodableLine, csv_records, iter_text_lines, ndjson_records
+
+
+async def _stream(chunks):
+    for chunk in chunks:
+        yield chunk
+
+
+def lines(data: bytes, chunk_size: int = 3) -> list:
+    chunks = [data[start:start + chunk_size] for start in range(0, len(data), chunk_size)]
+
+    async def collect():
+        return [line async for line in iter_text_lines(_stream(chunks))]
+    return asyncio.run(collect())
+
+
+def records(parser, data: bytes) -> list:
+    async def collect():
+        return [record async for record in parser(iter_text_lines(_stream([data])))]
+    return asyncio.run(collect())
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 5, 1024])
+def test_lines_split_across_chunks(chunk_size):
+    data = 'first\r\nsecond line\n\nthird – ünïcode\nlast'.encode()
+    assert lines(data, chunk_size) == ["first", "second line", "", "third – ünïcode", "last"]
+
+
+def test_trailing_newline_adds_no_line():
+    assert lines(b"a\nb\n") == ["a", "b"]
+
+
+def test_multibyte_character_split_between_chunks():
+    assert lines("é\n".encode(), chunk_size = 1) == ["é"]
+
+
+def test_invalid_utf8_becomes_undecodable_line():
+    result = lines(b"ok\nbad \xff byte\nok again")
+    assert result[0] == "ok" and result[2] == "ok again"
+    assert isinstance(result[1], UndecodableLine)
+    assert result[1].startswith("Invalid UTF-8")
+
+
+def test_ndjson_records():
+    data = b'{"report_id": "R-1"}\n\n   \nnot json\n\xff\n{"report_id": "R-2"}'
+    result = records(ndjson_records, data)
+    assert result[0] == (1, {"report_id": "R-1"}, None)
+    assert result[1][0] == 4 and result[1][1] is None and result[1][2].startswith("Invalid JSON")
+    assert result[2][0] == 5 and result[2][2].startswith("Invalid UTF-8")
+    assert result[3] == (6, {"report_id": "R-2"}, None)
+    assert len(result) == 4
+
+
+CSV_HEADER = b"report_id,date,country,region,longitude,latitude,description,violation_types,anonymous,contact_email\n"
+
+
+def test_csv_record_layout():
+    data = CSV_HEADER + b'R-1,2024-01-01,Syria,Aleppo,37.1,36.2,Shelling,torture; detention ;,yes,a@example.org\n'
+    [(line, record, error)] = records(csv_records, data)
+    assert (line, error) == (2, None)
+    assert record["report_id"] == "R-1"
+    details = record["incident_details"]
+    assert details["location"]["coordinates"] == {"type": "Point", "coordinates": [37.1, 36.2]}
+    assert details["violation_types"] == ["torture", "detention"]
+    assert record["anonymous"] is True
+    assert record["contact_info"]["email"] == "a@example.org"
+
+
+def test_csv_header_names_are_stripped():
+    header = b", ".join(column.strip() for column in CSV_HEADER.split(b",")) + b"\n"
+    [(_, record, error)] = records(csv_records, header + b"R-1,2024-01-01,Syria,Aleppo,1,2,d,torture,,\n")
+    assert error is None
+    assert record["report_id"] == "R-1"
+    assert record["incident_details"]["location"]["region"] == "Aleppo"
+    assert "contact_info" not in record and "anonymous" not in record
+
+
+def test_csv_quoted_field_spans_lines():
+    data = CSV_HEADER + b'R-1,2024-01-01,Syria,Aleppo,37.1,36.2,"Line one\nline two",torture,,\nR-2,2024-01-02,Syria,Aleppo,37,36,Other,torture,,\n'
+    result = records(csv_records, data)
+    assert [(line, error) for line, _, error in result] == [(2, None), (4, None)]
+    assert result[0][1]["incident_details"]["description"] == "Line one\nline two"
+
+
+def test_csv_errors_are_reported_per_row():
+    data = CSV_HEADER + b'R-1,2024-01-01,Syria,Aleppo,east,36.2,d,torture,,\nR-2,\xff\nR-3,2024-01-01,Syria,Aleppo,1,2,"open\n'
+    result = records(csv_records, data)
+    assert [(line, record) for line, record, _ in result] == [(2, None), (3, None), (4, None)]
+    assert result[0][2].startswith("Invalid row")
+    assert result[1][2].startswith("Invalid UTF-8")
+    assert result[2][2] == "Unterminated quoted field"
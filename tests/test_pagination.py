@@ -0,0 +1,82 @@
+"""
+Tests of the keyset pagination cursors, which need no database.
+
+    python -m pytest tests/test_pagination.py
+"""
+import base64
+import json
+import os
+from datetime import datetime, timedelta
+
+os.environ.setdefault("SECRET_KEY", "pagination-tests")
+
+import pytest
+from bson import ObjectId
+from fastapi import HTTPException
+
+from services.pagination import decode_cursor, encode_cursor, keyset_filter
+
+
+def matches(document: dict, criteria: dict) -> bool:
+    """Evaluate the subset of MongoDB filters that keyset_filter produces."""
+    if "$or" in criteria:
+        return any(matches(document, branch) for branch in criteria["$or"])
+    for field, condition in criteria.items():
+        if isinstance(condition, dict):
+            if not document[field] < condition["$lt"]:
+                return False
+        elif document[field] != condition:
+            return False
+    return True
+
+
+def page_through(documents: list, page_size: int) -> list:
+    """Read documents page by page the way GET /cases/ does."""
+    ordered = sorted(documents, key = lambda document: (document["date_occurred"], document["_id"]), reverse = True)
+    seen, cursor = [], None
+    while True:
+        criteria = keyset_filter("date_occurred", cursor)
+        page = [document for document in ordered if criteria is None or matches(document, criteria)][:page_size]
+        if not page:
+            return seen
+        seen.extend(page)
+        cursor = encode_cursor(page[-1]["date_occurred"], page[-1]["_id"])
+
+
+def test_cursor_round_trip():
+    value, document_id = datetime(2024, 3, 1, 12, 30, 15, 250000), ObjectId()
+    assert decode_cursor(encode_cursor(value, document_id)) == (value, document_id)
+
+
+@pytest.mark.parametrize("cursor", [
+    "not a cursor",
+    "",
+    base64.urlsafe_b64encode(b'{"v": "yesterday", "id": "0"}').decode(),
+    base64.urlsafe_b64encode(json.dumps({"v": "2024-01-01T00:00:00"}).encode()).decode(),
+    base64.urlsafe_b64encode(json.dumps({"v": "2024-01-01T00:00:00", "id": "xyz"}).encode()).decode(),
+])
+def test_invalid_cursor_is_a_400(cursor):
+    with pytest.raises(HTTPException) as error:
+        decode_cursor(cursor)
+    assert error.value.status_code == 400
+
+
+def test_tampered_cursor_is_a_400():
+    cursor = encode_cursor(datetime(2024, 1, 1), ObjectId())
+    with pytest.raises(HTTPException) as error:
+        keyset_filter("date_occurred", cursor[:-3] + "!!!")
+    assert error.value.status_code == 400
+
+
+def test_no_cursor_no_filter():
+    assert keyset_filter("date_occurred", None) is None
+
+
+@pytest.mark.parametrize("page_size", [1, 2, 3, 7])
+def test_pages_cover_ties_exactly_once(page_size):
+    day = datetime(2024, 1, 1)
+    documents = [{"_id": ObjectId(), "date_occurred": day} for _ in range(5)]
+    documents += [{"_id": ObjectId(), "date_occurred": day + timedelta(days = offset)} for offset in (-1, 1, 1)]
+    seen = page_through(documents, page_size)
+    assert len(seen) == len(documents)
+    assert {document["_id"] for document in seen} == {document["_id"] for document in documents}
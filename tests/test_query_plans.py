@@ -0,0 +1,314 @@
+"""
+Query-plan regression tests for the list and analytics endpoints.
+
+Each test builds the exact filter or pipeline an endpoint would run for one
+combination of parameters, explains it against a seeded MongoDB and checks
+that the winning plan uses an index and that the documents examined stay
+within EXAMINED_PER_RETURNED x returned (+ EXAMINED_SLACK).
+
+Needs a local mongod; the tests are skipped when it cannot be reached.
+
+    TEST_MONGO_URL=mongodb://localhost:27017 python -m pytest tests/test_query_plans.py
+"""
+import os
+from datetime import date, timedelta
+
+import pytest
+
+os.environ.setdefault("SECRET_KEY", "query-plan-tests")
+
+from bson import ObjectId
+from pymongo import MongoClient
+from pymongo.errors import PyMongoError
+
+from models.case import Case
+from models.incident import IncidentReport
+from models.rollup import IncidentRollup
+from models.similarity import SimilaritySignature
+from scripts.seed import Generator
+from services.geo import GeoFilter
+from services.pagination import encode_cursor
+from services.queries import (CASE_SORT, case_breakdown_pipeline, case_list_filter, case_search_filter, report_list_filter,
+                             report_search_filter)
+from services.rollups import _rollup_pipeline, dashboard_pipeline, geo_distribution_pipeline, timeline_pipeline
+from services.similarity import candidate_filter, signature_entry
+
+MONGO_URL = os.environ.get("TEST_MONGO_URL", "mongodb://localhost:27017")
+DATABASE = "hrm_query_plan_tests"
+CASES = 20000
+REPORTS = 20000
+PAGE = 51  # list_cases fetches limit + 1 documents
+
+EXAMINED_PER_RETURNED = 10
+EXAMINED_SLACK = 200
+INDEX_STAGES = {"IXSCAN", "EXPRESS_IXSCAN", "IDHACK", "COUNT_SCAN", "DISTINCT_SCAN"}
+
+TODAY = date.today()
+
+
+@pytest.fixture(scope = "module")
+def db():
+    client = MongoClient(MONGO_URL, serverSelectionTimeoutMS = 1000)
+    try:
+        client.admin.command("ping")
+    except PyMongoError:
+        pytest.skip(f"no MongoDB reachable at {MONGO_URL}")
+
+    client.drop_database(DATABASE)
+    database = client[DATABASE]
+    for model in (Case, IncidentReport, IncidentRollup, SimilaritySignature):
+        database[model.Settings.name].create_indexes(model.Settings.indexes)
+
+    generator = Generator(seed = 7, years = 5)
+    for start in range(0, CASES, 5000):
+        database[Case.Settings.name].insert_many(
+            [generator.case(number, [])[0] for number in range(start, min(CASES, start + 5000))]
+        )
+    for start in range(0, REPORTS, 5000):
+        database[IncidentReport.Settings.name].insert_many(
+            [generator.report(number) for number in range(start, min(REPORTS, start + 5000))]
+        )
+    database[IncidentReport.Settings.name].aggregate(
+        _rollup_pipeline() + [{"$out": IncidentRollup.Settings.name}]
+    )
+
+    yield database
+    client.drop_database(DATABASE)
+    client.close()
+
+
+@pytest.fixture(scope = "module")
+def sample(db):
+    """Values taken from the seeded data: a point to search around and a page cursor."""
+    cases = db[Case.Settings.name]
+    first_page = list(cases.find({"is_archived": False}, sort = CASE_SORT, limit = PAGE))
+    last = first_page[-1]
+    return {
+        "point": first_page[0]["location"]["coordinates"]["coordinates"],
+        "cursor": encode_cursor(last["date_occurred"], last["_id"]),
+    }
+
+
+def geo_filter(near = None, radius_km = None, polygon = None, bbox = None) -> GeoFilter:
+    return GeoFilter(
+        near_lng = near[0] if near else None,
+        near_lat = near[1] if near else None,
+        radius_km = radius_km,
+        polygon = polygon,
+        bbox = bbox,
+    )
+
+
+def _walk(node):
+    if isinstance(node, dict):
+        yield node
+        for value in node.values():
+            yield from _walk(value)
+    elif isinstance(node, list):
+        for value in node:
+            yield from _walk(value)
+
+
+def winning_stages(explain: dict) -> set:
+    return {
+        node["stage"]
+        for plan in _walk(explain) if "winningPlan" in plan
+        for node in _walk(plan["winningPlan"]) if "stage" in node
+    }
+
+
+def execution_stats(explain: dict) -> dict:
+    return next(node["executionStats"] for node in _walk(explain)
+                if isinstance(node.get("executionStats"), dict) and "totalDocsExamined" in node["executionStats"])
+
+
+def assert_efficient(explain: dict, returned: int):
+    stages = winning_stages(explain)
+    assert "COLLSCAN" not in stages, f"collection scan in winning plan: {stages}"
+    assert stages & INDEX_STAGES, f"no index used by winning plan: {stages}"
+
+    examined = execution_stats(explain)["totalDocsExamined"]
+    budget = EXAMINED_PER_RETURNED * returned + EXAMINED_SLACK
+    assert examined <= budget, f"examined {examined} documents to return {returned} (budget {budget})"
+
+
+def explain_find(db, collection: str, query: dict, sort = None, limit: int = 0) -> dict:
+    command = {"find": collection, "filter": query}
+    if sort:
+        command["sort"] = dict(sort)
+    if limit:
+        command["limit"] = limit
+    return db.command({"explain": command, "verbosity": "executionStats"})
+
+
+def explain_pipeline(db, collection: str, pipeline: list) -> dict:
+    return db.command({
+        "explain": {"aggregate": collection, "pipeline": pipeline, "cursor": {}},
+        "verbosity": "executionStats",
+    })
+
+
+CASE_MATRIX = {
+    "no_filter": lambda s: {},
+    "status": lambda s: {"status": "under_investigation"},
+    "status_priority": lambda s: {"status": "resolved", "priority": "high"},
+    "priority": lambda s: {"priority": "low"},
+    "violation_common": lambda s: {"violation_type": "arbitrary_detention"},
+    "violation_rare": lambda s: {"violation_type": "child_recruitment"},
+    "violation_dates": lambda s: {"violation_type": "torture", "start_date": TODAY - timedelta(days = 365)},
+    "country_common": lambda s: {"country": "Syria"},
+    "country_rare": lambda s: {"country": "Mali"},
+    "country_region": lambda s: {"country": "Syria", "region": "Idlib"},
+    "country_status": lambda s: {"country": "Yemen", "status": "new"},
+    "date_from": lambda s: {"start_date": TODAY - timedelta(days = 90)},
+    "date_range": lambda s: {"start_date": TODAY - timedelta(days = 900), "end_date": TODAY - timedelta(days = 600)},
+    "cursor": lambda s: {"cursor": s["cursor"]},
+    "cursor_status_priority": lambda s: {"status": "new", "priority": "medium", "cursor": s["cursor"]},
+    "near": lambda s: {"geo": geo_filter(near = s["point"], radius_km = 10)},
+    "near_status": lambda s: {"status": "new", "geo": geo_filter(near = s["point"], radius_km = 25)},
+    "bbox": lambda s: {"geo": geo_filter(bbox = "{},{},{},{}".format(
+        s["point"][0] - 0.2, s["point"][1] - 0.2, s["point"][0] + 0.2, s["point"][1] + 0.2))},
+}
+
+REPORT_MATRIX = {
+    "status_recent": lambda s: {"status": "verified", "start_date": TODAY - timedelta(days = 30)},
+    "status_range": lambda s: {"status": "new", "start_date": TODAY - timedelta(days = 400),
+                               "end_date": TODAY - timedelta(days = 300)},
+    "country": lambda s: {"country": "Mali"},
+    "country_dates": lambda s: {"country": "Syria", "start_date": TODAY - timedelta(days = 60)},
+    "country_status": lambda s: {"country": "Sudan", "status": "linked_to_case"},
+    "date_from": lambda s: {"start_date": TODAY - timedelta(days = 14)},
+    "near": lambda s: {"geo": geo_filter(near = s["point"], radius_km = 10)},
+}
+
+GEODATA_MATRIX = {
+    "all": {},
+    "country": {"country": "Syria"},
+    "country_region": {"country": "Palestine", "region": "Gaza"},
+}
+
+SEARCH_MATRIX = {
+    "cases_word": (Case, case_search_filter, {"text": "torture"}),
+    "cases_words_filtered": (Case, case_search_filter, {"text": "checkpoint journalist", "status": "new", "country": "Syria"}),
+    "cases_phrase_violation": (Case, case_search_filter, {"text": '"night raid"', "violation_type": "arbitrary_detention"}),
+    "reports_word": (IncidentReport, report_search_filter, {"text": "abducted"}),
+    "reports_filtered": (IncidentReport, report_search_filter, {"text": "shelling market", "country": "Yemen", "status": "verified"}),
+}
+
+TIMELINE_MATRIX = {
+    "year": {"granularity": "year"},
+    "month_from": {"granularity": "month", "start_date": TODAY - timedelta(days = 365)},
+    "day_range": {"granularity": "day", "start_date": TODAY - timedelta(days = 60), "end_date": TODAY - timedelta(days = 30)},
+}
+
+
+# Without any filter the dashboard reads every rollup, which needs no index
+DASHBOARD_MATRIX = {
+    "dates": {"start_date": TODAY - timedelta(days = 90)},
+    "country": {"country": "Syria"},
+    "country_region_dates": {"country": "Palestine", "region": "Gaza", "start_date": TODAY - timedelta(days = 365)},
+}
+
+CASE_BREAKDOWN_MATRIX = {
+    "all": {},
+    "dates": {"start_date": TODAY - timedelta(days = 90)},
+    "country": {"country": "Syria"},
+    "country_region_dates": {"country": "Palestine", "region": "Gaza", "start_date": TODAY - timedelta(days = 365)},
+}
+
+
+@pytest.mark.parametrize("params", CASE_MATRIX.values(), ids = CASE_MATRIX.keys())
+def test_list_cases_plan(db, sample, params):
+    query = case_list_filter(**params(sample))
+    explain = explain_find(db, Case.Settings.name, query, sort = CASE_SORT, limit = PAGE)
+    assert_efficient(explain, execution_stats(explain)["nReturned"])
+
+
+@pytest.mark.parametrize("params", REPORT_MATRIX.values(), ids = REPORT_MATRIX.keys())
+def test_list_reports_plan(db, sample, params):
+    query = report_list_filter(**params(sample))
+    explain = explain_find(db, IncidentReport.Settings.name, query)
+    assert_efficient(explain, execution_stats(explain)["nReturned"])
+
+
+def _matched(db, pipeline: list) -> int:
+    """Grouping pipelines return few rows; bound the work by what $match selects."""
+    return db[IncidentRollup.Settings.name].count_documents(pipeline[0]["$match"])
+
+
+@pytest.mark.parametrize("params", GEODATA_MATRIX.values(), ids = GEODATA_MATRIX.keys())
+def test_geodata_plan(db, params):
+    pipeline = geo_distribution_pipeline(**params)
+    explain = explain_pipeline(db, IncidentRollup.Settings.name, pipeline)
+    assert_efficient(explain, _matched(db, pipeline))
+
+
+@pytest.mark.parametrize("params", TIMELINE_MATRIX.values(), ids = TIMELINE_MATRIX.keys())
+def test_timeline_plan(db, params):
+    pipeline = timeline_pipeline(**params)
+    explain = explain_pipeline(db, IncidentRollup.Settings.name, pipeline)
+    assert_efficient(explain, _matched(db, pipeline))
+
+
+@pytest.mark.parametrize("model, build_filter, params", SEARCH_MATRIX.values(), ids = SEARCH_MATRIX.keys())
+def test_search_plan(db, model, build_filter, params):
+    """The text index serves every search; filters may not widen what it reads."""
+    query = build_filter(**params)
+    explain = explain_find(db, model.Settings.name, query)
+    stages = winning_stages(explain)
+    assert "COLLSCAN" not in stages, f"collection scan in winning plan: {stages}"
+    assert "TEXT_MATCH" in stages or "TEXT_OR" in stages, f"text index not used: {stages}"
+
+    text_matches = db[model.Settings.name].count_documents({"$text": query["$text"]})
+    assert execution_stats(explain)["totalDocsExamined"] <= text_matches
+
+
+@pytest.fixture(scope = "module")
+def signatures(db):
+    """Signatures of the seeded reports, as services.similarity stores them."""
+    entries = [
+        signature_entry("report", report["_id"], report["report_id"], report["incident_details"]["description"],
+                        report["incident_details"]["date"], report["incident_details"]["location"]["coordinates"])
+        for report in db[IncidentReport.Settings.name].find({}, limit = 5000)
+    ]
+    db[SimilaritySignature.Settings.name].insert_many(entries)
+    return entries
+
+
+@pytest.mark.parametrize("window_days, max_km", [(30, None), (30, 50), (365, None)], ids = ["month", "month_50km", "year"])
+def test_similar_reports_plan(db, signatures, window_days, max_km):
+    entry = signatures[len(signatures) // 2]
+    query = candidate_filter(entry, window_days, max_km)
+    explain = explain_find(db, SimilaritySignature.Settings.name, query)
+    assert_efficient(explain, execution_stats(explain)["nReturned"])
+
+
+def test_status_transition_marker_plan(db):
+    """services.transitions reads back and clears the cases of a bulk status change by their marker."""
+    collection = db[Case.Settings.name]
+    batch = ObjectId()
+    ids = [document["_id"] for document in collection.find({}, {"_id": 1}, limit = 500)]
+    collection.update_many(
+        {"_id": {"$in": ids}},
+        [{"$set": {"status_transition": {"batch": batch, "previous_status": "$status"}}}]
+    )
+    try:
+        explain = explain_find(db, Case.Settings.name, {"status_transition.batch": batch})
+        assert_efficient(explain, len(ids))
+        assert execution_stats(explain)["totalDocsExamined"] == len(ids)
+    finally:
+        collection.update_many({"status_transition.batch": batch}, {"$unset": {"status_transition": ""}})
+
+
+@pytest.mark.parametrize("params", DASHBOARD_MATRIX.values(), ids = DASHBOARD_MATRIX.keys())
+def test_dashboard_plan(db, params):
+    pipeline = dashboard_pipeline("month", **params)
+    explain = explain_pipeline(db, IncidentRollup.Settings.name, pipeline)
+    assert_efficient(explain, _matched(db, pipeline))
+
+
+@pytest.mark.parametrize("params", CASE_BREAKDOWN_MATRIX.values(), ids = CASE_BREAKDOWN_MATRIX.keys())
+def test_case_breakdown_plan(db, params):
+    pipeline = case_breakdown_pipeline(**params)
+    explain = explain_pipeline(db, Case.Settings.name, pipeline)
+    assert_efficient(explain, db[Case.Settings.name].count_documents(pipeline[0]["$match"]))
@@ -0,0 +1,123 @@
+"""
+Tests of the text handling and the in-process search backend, which need no
+database.
+
+    python -m pytest tests/test_search.py
+"""
+import asyncio
+import os
+from datetime import datetime
+
+os.environ.setdefault("SECRET_KEY", "search-tests")
+
+from bson import ObjectId
+
+from services.search import CASES, REPORTS, InvertedIndex, MemorySearch, ParsedQuery, highlight, stem, terms
+
+
+def case(title, description = "", status = "new", country = "Syria", violation_types = ("torture",),
+         perpetrators = (), is_archived = False):
+    return {
+        "_id": ObjectId(), "case_id": f"C-{title}", "title": title, "description": description,
+        "status": status, "location": {"country": country, "region": "Aleppo"},
+        "violation_types": list(violation_types), "date_occurred": datetime(2024, 1, 1),
+        "perpetrators": [{"name": name, "type": "militia"} for name in perpetrators],
+        "is_archived": is_archived,
+    }
+
+
+def report(description, status = "new", country = "Syria", violation_types = ("torture",)):
+    return {
+        "_id": ObjectId(), "report_id": f"R-{description[:10]}", "status": status,
+        "incident_details": {
+            "date": datetime(2024, 1, 1), "description": description,
+            "location": {"country": country, "region": "Aleppo"},
+            "violation_types": list(violation_types),
+        },
+    }
+
+
+def run_search(backend, text, collections = ("cases", "reports"), offset = 0, limit = 10, **filters):
+    sources = [{"cases": CASES, "reports": REPORTS}[name] for name in collections]
+    filters = {"status": None, "country": None, "violation_type": None, **filters}
+    return asyncio.run(backend.search(ParsedQuery(text), sources, filters, offset, limit))
+
+
+def test_stem_joins_inflections():
+    assert len({stem(word) for word in ["torture", "tortured", "tortures"]}) == 1
+    assert len({stem(word) for word in ["attack", "attacks", "attacked", "attacking"]}) == 1
+    assert stem("witnesses") == stem("witness")
+    assert stem("bodies") == stem("body")
+
+
+def test_terms_drop_stop_words():
+    assert terms("The shelling of the market") == [stem("shelling"), stem("market")]
+
+
+def test_parsed_query():
+    query = ParsedQuery('checkpoint "night raid" -Aleppo')
+    assert query.terms == [stem("checkpoint"), stem("night"), stem("raid")]
+    assert query.required == {stem("night"), stem("raid")}
+    assert query.excluded == {stem("aleppo")}
+    assert not ParsedQuery("the of")
+
+
+def test_highlight_marks_and_escapes():
+    text = "A <b>journalist</b> was detained. " + "Nothing else happened here at all today. " * 4 + "Journalists protested."
+    extracts = highlight(text, {stem("journalist")}, context = 2)
+    assert extracts[0] == "A &lt;b&gt;<mark>journalist</mark>&lt;/b&gt; was…"
+    assert extracts[1] == "…all today. <mark>Journalists</mark> protested."
+
+
+def test_inverted_index_ranks_by_bm25():
+    index = InvertedIndex()
+    index.add("a", {"shell": 1, "market": 1}, ["status:new"])
+    index.add("b", {"shell": 3}, ["status:new"])
+    index.add("c", {"market": 1}, ["status:closed"])
+    query = ParsedQuery("shell market")
+
+    assert [key for _, key in index.search(query, [], 10)] == ["a", "b", "c"]
+    assert [key for _, key in index.search(query, [["status:closed"]], 10)] == ["c"]
+    assert index.search(query, [["status:missing"]], 10) == []
+
+    index.remove("a")
+    assert [key for _, key in index.search(query, [], 10)] == ["b", "c"]
+    assert len(index) == 2
+
+
+def test_memory_search_across_collections():
+    backend = MemorySearch()
+    backend.index(CASES, [
+        case("Torture in custody", "Beaten during interrogation", perpetrators = ["Unit 12"]),
+        case("Shelling of the market", violation_types = ["attack_on_civilians"], country = "Yemen"),
+        case("Archived torture case", is_archived = True),
+    ])
+    backend.index(REPORTS, [report("A farmer was tortured at a checkpoint", status = "verified")])
+
+    hits, has_more = run_search(backend, "torture")
+    assert [hit.collection for hit in hits] == ["cases", "reports"]
+    assert hits[0].title == "Torture in custody"
+    assert hits[0].highlights == {"title": ["<mark>Torture</mark> in custody"]}
+    assert hits[1].highlights == {"incident_details.description": ["A farmer was <mark>tortured</mark> at a checkpoint"]}
+    assert not has_more
+
+    assert [hit.ref for hit in run_search(backend, "unit 12")[0]] == ["C-Torture in custody"]
+    assert run_search(backend, "torture", collections = ["reports"])[0][0].status == "verified"
+    assert run_search(backend, "torture", status = "verified")[0][0].collection == "reports"
+    assert run_search(backend, "shelling torture", country = "Yemen")[0][0].country == "Yemen"
+    assert run_search(backend, "torture", violation_type = "attack_on_civilians")[0] == []
+
+
+def test_memory_search_paging_and_updates():
+    backend = MemorySearch()
+    documents = [case(f"Detention {i}") for i in range(5)]
+    backend.index(CASES, documents)
+
+    first, has_more = run_search(backend, "detention", limit = 3)
+    second, more_after = run_search(backend, "detention", offset = 3, limit = 3)
+    assert has_more and not more_after
+    assert len({hit.id for hit in first + second}) == 5
+
+    backend.index(CASES, [{**documents[0], "is_archived": True}])
+    backend.remove(CASES, [documents[1]["_id"]])
+    assert len(run_search(backend, "detention")[0]) == 3